@@ -0,0 +1,405 @@
+# Benchmark untuk rutinitas inti bot (contoh.py) tanpa koneksi ke Telegram.
+#
+# Contoh:
+#   python benchmark.py --rows 10000                   # generate data lalu jalankan semua benchmark
+#   python benchmark.py --rows 10000,1000000 --only count,text
+#   python benchmark.py --rows 10000 --handlers        # jalankan juga alur handler lengkap dengan bot tiruan
+#   python benchmark.py --rows 10000 --json hasil.json
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import resource
+import shutil
+import subprocess
+from pathlib import Path
+from types import SimpleNamespace
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+# contoh.py membutuhkan token saat diimport; benchmark tidak pernah menghubungi Telegram
+os.environ.setdefault('BOT_API_TOKEN', 'benchmark:offline')
+os.environ.setdefault('ALLOWED_USERNAMES', 'benchmark')
+
+FORMATS = ['txt', 'csv', 'xlsx', 'xls', 'xlsb', 'ods', 'vcf', 'pdf']
+XLS_MAX_ROWS = 65535
+PDF_ROWS_PER_PAGE = 35
+
+FIRST_NAMES = ['Andi', 'Budi', 'Citra', 'Dewi', 'Eko', 'Fitri', 'Gita', 'Hadi', 'Indah', 'Joko', 'Kartika', 'Lestari',
+               'Made', 'Nur', 'Putri', 'Rizky', 'Sari', 'Teguh', 'Wahyu', 'Yuni']
+LAST_NAMES = ['Pratama', 'Saputra', 'Wijaya', 'Hidayat', 'Santoso', 'Kusuma', 'Nugroho', 'Siregar', 'Lubis', 'Putra',
+              'Wati', 'Setiawan', 'Rahmawati', 'Gunawan', 'Halim']
+OPERATOR_PREFIXES = ['811', '812', '813', '821', '822', '852', '853', '857', '858', '877', '878', '881', '895', '896']
+
+# Nomor dibuat dalam beberapa bentuk (08..., +62..., 62...) seperti daftar kontak sungguhan
+def contact_rows(rows: int, seed: int = 11):
+    rng = random.Random(seed)
+    for i in range(rows):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}"
+        local = f"{rng.choice(OPERATOR_PREFIXES)}{rng.randrange(10 ** 7, 10 ** 9)}"
+        style = rng.random()
+        if style < 0.6:
+            number = '0' + local
+        elif style < 0.85:
+            number = '+62' + local
+        else:
+            number = '62' + local
+        yield name, number
+
+def generate_txt(path: Path, rows: int) -> None:
+    with open(path, 'w', buffering=1024 * 1024) as f:
+        f.write('NAMA\tNOMOR\n')
+        for name, number in contact_rows(rows):
+            f.write(f"{name}\t{number}\n")
+
+def generate_csv(path: Path, rows: int) -> None:
+    with open(path, 'w', buffering=1024 * 1024) as f:
+        f.write('NAMA,NOMOR\n')
+        for name, number in contact_rows(rows):
+            f.write(f"{name},{number}\n")
+
+def generate_xlsx(path: Path, rows: int) -> None:
+    import openpyxl
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(['NAMA', 'NOMOR'])
+    for row in contact_rows(rows):
+        ws.append(row)
+    wb.save(path)
+
+# Format xls dibatasi 65.535 baris; butuh xlwt
+def generate_xls(path: Path, rows: int) -> None:
+    import xlwt
+    if rows > XLS_MAX_ROWS:
+        raise RuntimeError(f"xls maksimal {XLS_MAX_ROWS} baris")
+    wb = xlwt.Workbook()
+    ws = wb.add_sheet('Kontak')
+    ws.write(0, 0, 'NAMA')
+    ws.write(0, 1, 'NOMOR')
+    for index, (name, number) in enumerate(contact_rows(rows), 1):
+        ws.write(index, 0, name)
+        ws.write(index, 1, number)
+    wb.save(str(path))
+
+# Tidak ada library Python untuk menulis xlsb, jadi dikonversi dari xlsx dengan LibreOffice jika tersedia
+def generate_xlsb(path: Path, rows: int) -> None:
+    soffice = shutil.which('soffice') or shutil.which('libreoffice')
+    if soffice is None:
+        raise RuntimeError("butuh LibreOffice (soffice) untuk membuat xlsb")
+    source = path.with_suffix('.src.xlsx')
+    generate_xlsx(source, rows)
+    try:
+        subprocess.run([soffice, '--headless', '--convert-to', 'xlsb:Calc MS Excel 2007 Binary', '--outdir', str(path.parent), str(source)],
+                       check=True, capture_output=True)
+        path.with_suffix('.src.xlsb').replace(path)
+    finally:
+        source.unlink(missing_ok=True)
+
+def generate_ods(path: Path, rows: int) -> None:
+    import pandas as pd
+    pd.DataFrame(contact_rows(rows), columns=['NAMA', 'NOMOR']).to_excel(path, index=False, engine='odf')
+
+def generate_vcf(path: Path, rows: int) -> None:
+    with open(path, 'w', buffering=1024 * 1024) as f:
+        for name, number in contact_rows(rows):
+            f.write(f"BEGIN:VCARD\nVERSION:3.0\nFN:{name}\nTEL;TYPE=CELL:{number}\nEND:VCARD\n")
+
+# PDF ditulis langsung (tanpa library) per halaman: tabel bergaris dengan header di setiap halaman,
+# sehingga pdfplumber.extract_tables() menemukannya seperti pada hasil ekspor sungguhan
+def generate_pdf(path: Path, rows: int) -> None:
+    def page_content(page_rows):
+        ops = ['0.5 w']
+        for r, row in enumerate([('NAMA', 'NOMOR')] + page_rows):
+            y = 800 - (r + 1) * 20
+            for c, value in enumerate(row):
+                ops.append(f"{50 + c * 220} {y} 220 20 re S")
+                ops.append(f"BT /F1 10 Tf {54 + c * 220} {y + 6} Td ({value}) Tj ET")
+        return '\n'.join(ops).encode('latin-1')
+
+    all_rows = contact_rows(rows)
+    page_count = max(1, -(-rows // PDF_ROWS_PER_PAGE))
+    offsets = {}
+    with open(path, 'wb') as f:
+        def write_object(number, body):
+            offsets[number] = f.tell()
+            f.write(b'%d 0 obj\n' % number + body + b'\nendobj\n')
+
+        f.write(b'%PDF-1.4\n')
+        write_object(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+        kids = ' '.join(f"{4 + 2 * i} 0 R" for i in range(page_count)).encode()
+        write_object(2, b'<< /Type /Pages /Kids [' + kids + b'] /Count %d >>' % page_count)
+        write_object(3, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>')
+        for i in range(page_count):
+            page_rows = [next(all_rows) for _ in range(min(PDF_ROWS_PER_PAGE, rows - i * PDF_ROWS_PER_PAGE))]
+            content = page_content(page_rows)
+            write_object(4 + 2 * i, b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+                                    b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % (5 + 2 * i))
+            write_object(5 + 2 * i, b'<< /Length %d >>\nstream\n' % len(content) + content + b'\nendstream')
+
+        xref = f.tell()
+        total = 3 + 2 * page_count
+        f.write(b'xref\n0 %d\n0000000000 65535 f \n' % (total + 1))
+        for number in range(1, total + 1):
+            f.write(b'%010d 00000 n \n' % offsets[number])
+        f.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (total + 1, xref))
+
+GENERATORS = {
+    'txt': generate_txt,
+    'csv': generate_csv,
+    'xlsx': generate_xlsx,
+    'xls': generate_xls,
+    'xlsb': generate_xlsb,
+    'ods': generate_ods,
+    'vcf': generate_vcf,
+    'pdf': generate_pdf,
+}
+
+# Generate file hanya jika belum ada; mengembalikan {format: path} untuk format yang berhasil dibuat
+def generate_files(data_dir: Path, rows: int, formats: list) -> dict:
+    files = {}
+    for file_format in formats:
+        path = data_dir / f"kontak_{rows}.{file_format}"
+        if not path.exists():
+            started = time.perf_counter()
+            tmp = path.with_name(f".{path.name}.tmp{path.suffix}")
+            try:
+                GENERATORS[file_format](tmp, rows)
+                tmp.replace(path)
+            except Exception as e:
+                tmp.unlink(missing_ok=True)
+                print(f"  lewati {path.name}: {e}")
+                continue
+            print(f"  dibuat {path.name} ({path.stat().st_size / 1e6:.1f} MB) dalam {time.perf_counter() - started:.1f} s")
+        files[file_format] = path
+    return files
+
+def peak_rss_mb() -> float:
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) / 1024
+
+# Satu kasus benchmark dijalankan di proses baru, agar peak RSS hanya milik kasus tersebut
+def run_case(case: dict) -> dict:
+    import contoh
+    work_dir = Path(case['work_dir'])
+    work_dir.mkdir(parents=True, exist_ok=True)
+    source = Path(case['path'])
+    input_path = work_dir / source.name
+    shutil.copyfile(source, input_path)
+    baseline = peak_rss_mb()
+
+    started = time.perf_counter()
+    command = case['command']
+    if command == 'count':
+        result = contoh.count_contacts(input_path, input_path.name)
+    elif command in ('excel', 'text'):
+        extension = '.xlsx' if command == 'excel' else '.txt'
+        if case['format'] == 'pdf':
+            async def convert():
+                try:
+                    return await contoh.convert_pdf(input_path, input_path.name, extension, work_dir)
+                finally:
+                    await contoh.post_shutdown(None)
+            result = asyncio.run(convert())
+        else:
+            result = contoh.convert_job(input_path, input_path.name, extension, work_dir)
+    elif command == 'pecah':
+        result = contoh.split_file_job(input_path, input_path.name, case['split_size'], work_dir, case.get('zip', False))
+    elif command == 'sisa':
+        result = contoh.extract_numbers_job(input_path, input_path.name, work_dir / 'nomor.txt')
+    elif command == 'gabung':
+        # File yang sama dua kali: salinan kedua seluruhnya duplikat dan menguji pencarian di index
+        sources = [(input_path, input_path.name)] * 2
+        result = contoh.merge_numbers_job(sources, work_dir, 'gabung.txt')
+    else:
+        raise ValueError(f"Perintah tidak dikenal: {command}")
+    elapsed = time.perf_counter() - started
+
+    return {
+        'seconds': elapsed,
+        'peak_rss_mb': peak_rss_mb(),
+        'baseline_rss_mb': baseline,
+        'result': str(result)[:80],
+    }
+
+# Rutinitas inti yang diuji untuk setiap perintah, beserta format input yang didukung
+COMMANDS = {
+    'count': ['txt', 'csv', 'xlsx', 'xls', 'vcf'],
+    'excel': ['txt', 'csv', 'xls', 'xlsb', 'ods', 'pdf'],
+    'text': ['csv', 'xlsx', 'xls', 'xlsb', 'ods', 'pdf'],
+    'pecah': ['txt', 'xlsx'],
+    'sisa': ['csv', 'vcf'],
+    'gabung': ['txt', 'csv', 'xlsx', 'vcf'],
+}
+
+def build_cases(files: dict, rows: int, commands: list, work_dir: Path, split_size: int) -> list:
+    cases = []
+    for command in commands:
+        for file_format in COMMANDS[command]:
+            if file_format not in files:
+                continue
+            case = {
+                'command': command,
+                'format': file_format,
+                'rows': rows,
+                'path': str(files[file_format]),
+                'work_dir': str(work_dir / f"{command}_{file_format}_{rows}"),
+                'split_size': split_size,
+            }
+            cases.append(case)
+            if command == 'pecah':
+                cases.append(dict(case, zip=True, work_dir=case['work_dir'] + '_zip'))
+    return cases
+
+# Bot tiruan: mencatat dokumen dan pesan yang dikirim handler, dan "mendownload" dengan menyalin file lokal
+class StandInBot:
+    def __init__(self):
+        self.documents = []
+        self.messages = []
+        self.files = {}
+
+    def add_file(self, path: Path) -> SimpleNamespace:
+        file_id = f"file-{len(self.files)}"
+        self.files[file_id] = path
+        return SimpleNamespace(file_id=file_id, file_unique_id=f"unique-{path.name}-{time.time_ns()}", file_name=path.name,
+                               file_size=path.stat().st_size)
+
+    async def get_file(self, file_id: str):
+        source = self.files[file_id]
+
+        async def download_to_drive(custom_path):
+            shutil.copyfile(source, custom_path)
+
+        async def download_to_memory(out):
+            out.write(source.read_bytes())
+        return SimpleNamespace(file_id=file_id, file_size=source.stat().st_size, download_to_drive=download_to_drive,
+                               download_to_memory=download_to_memory)
+
+    async def send_document(self, chat_id, document, filename=None, **kwargs):
+        size = len(document.read()) if hasattr(document, 'read') else len(document)
+        self.documents.append((chat_id, filename, size))
+        return SimpleNamespace(document=SimpleNamespace(file_id=f"sent-{len(self.documents)}"))
+
+    async def send_media_group(self, chat_id, media, **kwargs):
+        messages = []
+        for item in media:
+            # item.media berupa file_id (str) atau InputFile berisi data yang diupload
+            document = item.media if isinstance(item.media, str) else item.media.input_file_content
+            messages.append(await self.send_document(chat_id, document, getattr(item.media, 'filename', None)))
+        return messages
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.messages.append((chat_id, text))
+        return SimpleNamespace(text=text)
+
+class StandInMessage:
+    def __init__(self, bot: StandInBot, text: str = None, document=None):
+        self.bot = bot
+        self.text = text
+        self.document = document
+        self.from_user = SimpleNamespace(id=1, username='benchmark')
+        self.chat_id = 1
+
+    async def reply_text(self, text, **kwargs):
+        return await self.bot.send_message(self.chat_id, text)
+
+async def send_update(bot: StandInBot, context, handler, text: str = None, document=None) -> None:
+    message = StandInMessage(bot, text, document)
+    context.args = text.split()[1:] if text and text.startswith('/') else []
+    update = SimpleNamespace(message=message, effective_chat=SimpleNamespace(id=1), effective_user=message.from_user)
+    await handler(update, context)
+
+# Alur handler lengkap (perintah -> file -> /done) dengan bot tiruan, termasuk antrean upload dan cache
+async def run_handler_flows(files: dict, split_size: int) -> list:
+    import contoh
+    bot = StandInBot()
+    contoh.send_queue.start(bot)
+    flows = []
+    for file_format, path in files.items():
+        if file_format in COMMANDS['excel']:
+            flows.append(('excel', file_format, [(contoh.excel, '/excel'), (contoh.handle_file, path), (contoh.done, '/done')]))
+        if file_format in COMMANDS['text']:
+            flows.append(('text', file_format, [(contoh.text, '/text'), (contoh.handle_file, path), (contoh.done, '/done')]))
+        if file_format in COMMANDS['count']:
+            flows.append(('jumlah', file_format, [(contoh.jumlah, '/jumlah'), (contoh.handle_file, path), (contoh.done, '/done')]))
+        if file_format in COMMANDS['sisa']:
+            flows.append(('sisa', file_format, [(contoh.sisa, '/sisa'), (contoh.handle_file, path), (contoh.done, '/done'),
+                                                 (contoh.handle_text, 'hasil_benchmark')]))
+        if file_format in COMMANDS['gabung']:
+            flows.append(('gabung', file_format, [(contoh.gabung, '/gabung'), (contoh.handle_file, path), (contoh.handle_file, path),
+                                                   (contoh.done, '/done'), (contoh.handle_text, 'gabung_benchmark')]))
+        if file_format in COMMANDS['pecah']:
+            flows.append(('pecah', file_format, [(contoh.pecah, '/pecah'), (contoh.handle_file, path),
+                                                  (contoh.handle_text, f"{split_size} zip")]))
+
+    results = []
+    try:
+        for command, file_format, steps in flows:
+            context = SimpleNamespace(user_data={}, bot=bot, args=[])
+            started = time.perf_counter()
+            for handler, value in steps:
+                if isinstance(value, Path):
+                    await send_update(bot, context, handler, document=bot.add_file(value))
+                else:
+                    await send_update(bot, context, handler, text=value)
+            results.append({'command': command, 'format': file_format, 'seconds': time.perf_counter() - started,
+                            'last_message': bot.messages[-1][1][:60] if bot.messages else ''})
+    finally:
+        await contoh.post_shutdown(None)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark konversi bot tanpa koneksi ke Telegram")
+    parser.add_argument('--rows', default='10000', help="jumlah baris, pisahkan dengan koma (contoh: 10000,1000000,10000000)")
+    parser.add_argument('--formats', default=','.join(FORMATS), help="format file yang dibuat")
+    parser.add_argument('--only', default=','.join(COMMANDS), help="perintah yang diuji: count,excel,text,pecah,sisa,gabung")
+    parser.add_argument('--split-size', type=int, default=100, help="jumlah kontak per bagian untuk /pecah")
+    parser.add_argument('--data-dir', default='bench_data', help="folder untuk file uji dan hasil")
+    parser.add_argument('--handlers', action='store_true', help="jalankan juga alur handler lengkap dengan bot tiruan")
+    parser.add_argument('--json', help="simpan hasil ke file JSON")
+    args = parser.parse_args()
+
+    data_dir = Path(args.data_dir).resolve()
+    json_path = Path(args.json).resolve() if args.json else None
+    data_dir.mkdir(parents=True, exist_ok=True)
+    # Folder cache milik contoh.py dibuat relatif terhadap direktori kerja
+    os.chdir(data_dir)
+
+    formats = [f for f in args.formats.split(',') if f]
+    commands = [c for c in args.only.split(',') if c]
+    report = []
+
+    for rows in (int(r) for r in args.rows.split(',')):
+        print(f"\n== {rows:,} baris ==")
+        files = generate_files(data_dir, rows, formats)
+        cases = build_cases(files, rows, commands, data_dir / 'work', args.split_size)
+
+        print(f"{'perintah':<10}{'format':<8}{'detik':>10}{'baris/s':>14}{'peak RSS MB':>14}")
+        for case in cases:
+            context = multiprocessing.get_context('forkserver')
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                try:
+                    result = pool.submit(run_case, case).result()
+                except Exception as e:
+                    print(f"{case['command']:<10}{case['format']:<8} gagal: {e}")
+                    continue
+            shutil.rmtree(case['work_dir'], ignore_errors=True)
+            label = case['format'] + ('+zip' if case.get('zip') else '')
+            throughput = rows / result['seconds'] if result['seconds'] else 0
+            print(f"{case['command']:<10}{label:<8}{result['seconds']:>10.3f}{throughput:>14,.0f}{result['peak_rss_mb']:>14.1f}")
+            report.append(dict(case, **result, rows_per_second=throughput))
+
+        if args.handlers:
+            print("\nAlur handler (bot tiruan):")
+            for result in asyncio.run(run_handler_flows(files, args.split_size)):
+                print(f"{result['command']:<10}{result['format']:<8}{result['seconds']:>10.3f}  {result['last_message']}")
+                report.append(dict(result, rows=rows, handler_flow=True))
+
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == '__main__':
+    main()
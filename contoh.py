@@ -1,12 +1,54 @@
+from __future__ import annotations
 import os
-import pandas as pd
-import pdfplumber
-from telegram import Update, ReplyKeyboardMarkup, KeyboardButton
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
+import io
+import importlib
+from telegram import Update, ReplyKeyboardMarkup, KeyboardButton, InputMediaDocument
+from telegram.error import BadRequest, RetryAfter
+from telegram.ext import Application, BaseUpdateProcessor, CommandHandler, MessageHandler, filters, ContextTypes
 from dotenv import load_dotenv
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import asyncio
+import functools
+import hashlib
+import json
+import csv
+import pickle
+import shutil
+import tempfile
+import zipfile
+import time
+import contextvars
+from contextlib import ExitStack, contextmanager, asynccontextmanager
+from itertools import chain, islice
+from collections import OrderedDict, Counter, defaultdict, deque, namedtuple
 import logging
 import re
+import secrets
+import signal
+import socket
+import sqlite3
+import sys
+import threading
+from xml.etree import ElementTree
+
+# Modul berat baru diimport saat pertama kali dipakai agar bot bisa mulai polling dalam hitungan milidetik.
+# Parsing file berjalan di process pool, sehingga proses utama bot biasanya tidak pernah memuat pandas sama sekali.
+class LazyModule:
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr: str):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+pd = LazyModule('pandas')
+np = LazyModule('numpy')
+pdfplumber = LazyModule('pdfplumber')
+openpyxl = LazyModule('openpyxl')
 
 # Setup logging
 logging.basicConfig(
@@ -40,91 +82,2460 @@ else:
 cache_dir = Path('cache')
 cache_dir.mkdir(exist_ok=True)
 
+# Jumlah proses worker untuk konversi (default: semua core CPU)
+CONVERT_WORKERS = int(os.getenv('CONVERT_WORKERS', os.cpu_count() or 1))
+
+# Warm-up worker: 'pool' (default) memuat pandas dan engine format sekali di proses forkserver, lalu menyalakan
+# worker di latar belakang saat bot mulai; 'off' menunda semuanya sampai job pertama
+WARMUP = os.getenv('WARMUP', 'pool')
+WARMUP_MODULES = ['pandas', 'openpyxl', 'pdfplumber', 'xlrd', 'pyxlsb', 'odf.opendocument']
+
+# Process pool untuk pekerjaan berat (parsing dan penulisan file) agar event loop bot tidak terblokir
+executor = None
+
+def get_executor() -> ProcessPoolExecutor:
+    global executor
+    if executor is None:
+        mp_context = multiprocessing.get_context('forkserver')
+        if WARMUP != 'off':
+            # Worker di-fork dari forkserver yang sudah memuat modul ini, jadi tidak ada worker yang mengimport ulang
+            mp_context.set_forkserver_preload(['__main__'] + WARMUP_MODULES)
+        executor = ProcessPoolExecutor(max_workers=CONVERT_WORKERS, mp_context=mp_context)
+    return executor
+
+def warm_up_worker(_=None) -> int:
+    for name in WARMUP_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    return os.getpid()
+
+# Nyalakan forkserver dari thread terpisah, karena proses worker pertama baru jalan setelah preload selesai.
+# Worker berikutnya di-fork dari forkserver yang sudah siap, sehingga hanya butuh beberapa milidetik.
+async def warm_up() -> None:
+    started = time.perf_counter()
+    try:
+        await asyncio.to_thread(lambda: get_executor().submit(warm_up_worker).result())
+        logger.info(f"Warm-up worker selesai dalam {time.perf_counter() - started:.1f} detik")
+    except Exception as e:
+        logger.error(f"Error warming up workers: {e}")
+
+# Dijalankan di proses worker: catat kapan job mulai dan berapa lama berjalan, agar waktu antre di pool terpisah
+def timed_call(func, *args):
+    started = time.time()
+    run_started = time.perf_counter()
+    result = func(*args)
+    return started, time.perf_counter() - run_started, result
+
+async def run_job(func, *args):
+    submitted = time.time()
+    if warmup_task is not None and not warmup_task.done():
+        # Tunggu warm-up tanpa memblokir event loop saat worker pertama dibuat
+        await asyncio.shield(warmup_task)
+    metrics.pool_jobs += 1
+    future = get_executor().submit(timed_call, func, *args)
+    workspace = current_workspace.get()
+    if workspace is not None:
+        # Folder kerja dan slot job baru dilepas setelah job ini selesai di pool, walaupun job-nya dibatalkan
+        workspace.pool_futures.append(future)
+    try:
+        started, seconds, result = await asyncio.wrap_future(future)
+    finally:
+        metrics.pool_jobs -= 1
+    metrics.observe('pool_wait', max(0.0, started - submitted))
+    metrics.observe(func.__name__.removesuffix('_job'), seconds)
+    return result
+
+# Metrik performa: durasi per tahap, byte yang diproses, kedalaman antrean dan jumlah error per jenis
+METRICS_WINDOW = int(os.getenv('METRICS_WINDOW', 3600))  # rentang data (detik) untuk persentil di /stats
+METRICS_PORT = int(os.getenv('METRICS_PORT', 0))  # port endpoint Prometheus, 0 = tidak dijalankan
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+SLOW_JOB_SECONDS = float(os.getenv('SLOW_JOB_SECONDS', 30))  # job yang lebih lama dari ini dicatat di log, 0 = tidak
+
+# Username yang boleh melihat /stats
+admin_usernames = set(filter(None, os.getenv('ADMIN_USERNAMES', '').split(',')))
+
+HISTOGRAM_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+# Histogram kumulatif (untuk Prometheus) ditambah sampel terbaru dalam rentang METRICS_WINDOW (untuk persentil)
+class Histogram:
+    def __init__(self, buckets: tuple = HISTOGRAM_BUCKETS, window: int = METRICS_WINDOW, max_samples: int = 10000):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.window = window
+        self.samples = deque(maxlen=max_samples)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+                break
+        self.samples.append((time.monotonic(), value))
+
+    def recent(self) -> list:
+        expire_before = time.monotonic() - self.window
+        while self.samples and self.samples[0][0] < expire_before:
+            self.samples.popleft()
+        return sorted(value for _, value in self.samples)
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+class Metrics:
+    def __init__(self):
+        self.stages = defaultdict(Histogram)  # tahap -> durasi
+        self.stage_bytes = Counter()  # tahap -> byte yang diproses
+        self.jobs = defaultdict(Histogram)  # perintah -> durasi total job
+        self.errors = Counter()  # jenis exception -> jumlah
+        self.events = Counter()  # cache_hit, cache_miss, retry_after, slow_job, file_id_reuse, job_rejected, job_cancelled,
+        # job_enqueued, job_retried, job_failed
+        self.pool_jobs = 0  # job yang sedang antre atau berjalan di process pool
+        self.started = time.time()
+        # Rincian tahap milik job yang sedang berjalan; ikut terbawa ke task yang dibuat di dalam job (asyncio.gather)
+        self.current_job = contextvars.ContextVar('current_job', default=None)
+
+    def observe(self, stage: str, seconds: float, nbytes: int = 0) -> None:
+        self.stages[stage].observe(seconds)
+        if nbytes:
+            self.stage_bytes[stage] += nbytes
+        job = self.current_job.get()
+        if job is not None:
+            job['stages'][stage] = job['stages'].get(stage, 0.0) + seconds
+            job['bytes'] += nbytes
+
+    @contextmanager
+    def timed(self, stage: str):
+        stats = {'bytes': 0}
+        started = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            self.observe(stage, time.perf_counter() - started, stats['bytes'])
+
+    @contextmanager
+    def job(self, command: str, username: str):
+        job = {'stages': {}, 'bytes': 0}
+        token = self.current_job.set(job)
+        started = time.perf_counter()
+        try:
+            yield job
+        finally:
+            self.current_job.reset(token)
+            elapsed = time.perf_counter() - started
+            self.jobs[command].observe(elapsed)
+            if SLOW_JOB_SECONDS and elapsed >= SLOW_JOB_SECONDS:
+                self.events['slow_job'] += 1
+                breakdown = ', '.join(f"{stage} {seconds:.2f}s" for stage, seconds in sorted(job['stages'].items(), key=lambda item: -item[1]))
+                logger.warning(f"Job lambat: /{command} oleh {username} selama {elapsed:.2f}s, {job['bytes']} byte ({breakdown})")
+
+    def record_error(self, error: BaseException) -> None:
+        self.errors[type(error).__name__] += 1
+
+    def gauges(self) -> dict:
+        return {
+            'send_queue_depth': send_queue.qsize(),
+            'jobs_running': scheduler.active(),
+            'jobs_queued': len(scheduler.waiting),
+            'pool_jobs': self.pool_jobs,
+            'cache_bytes': cache_index.total_bytes,
+            'cache_entries': len(cache_index.entries),
+            'uptime_seconds': time.time() - self.started,
+        }
+
+    def render_stats(self) -> str:
+        lines = [f"Statistik {METRICS_WINDOW // 60} menit terakhir (detik: p50 / p95 / p99 / maks)"]
+        for title, histograms in (("Job per perintah", self.jobs), ("Tahap", self.stages)):
+            lines.append(f"\n{title}:")
+            for name, histogram in sorted(histograms.items()):
+                values = histogram.recent()
+                if not values:
+                    continue
+                line = (f"{name}: n={len(values)} {percentile(values, 0.5):.2f} / {percentile(values, 0.95):.2f} / "
+                        f"{percentile(values, 0.99):.2f} / {values[-1]:.2f}")
+                if self.stage_bytes.get(name) and histograms is self.stages:
+                    line += f", total {self.stage_bytes[name] / 1e6:.1f} MB"
+                lines.append(line)
+        lines.append("\nAntrean dan cache:")
+        lines.extend(f"{name}: {value:.0f}" for name, value in self.gauges().items())
+        if self.events:
+            lines.append("\nKejadian:")
+            lines.extend(f"{name}: {count}" for name, count in sorted(self.events.items()))
+        if self.errors:
+            lines.append("\nError per jenis:")
+            lines.extend(f"{name}: {count}" for name, count in self.errors.most_common())
+        return "\n".join(lines)
+
+    # Format teks Prometheus (https://prometheus.io/docs/instrumenting/exposition_formats/)
+    def render_prometheus(self) -> str:
+        lines = []
+        for metric, label, histograms in (('bot_job_seconds', 'command', self.jobs), ('bot_stage_seconds', 'stage', self.stages)):
+            lines.append(f"# TYPE {metric} histogram")
+            for name, histogram in sorted(histograms.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.bucket_counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{{label}="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_bucket{{{label}="{name}",le="+Inf"}} {histogram.count}')
+                lines.append(f'{metric}_sum{{{label}="{name}"}} {histogram.sum}')
+                lines.append(f'{metric}_count{{{label}="{name}"}} {histogram.count}')
+        for metric, label, counter in (('bot_stage_bytes_total', 'stage', self.stage_bytes),
+                                       ('bot_events_total', 'event', self.events),
+                                       ('bot_errors_total', 'type', self.errors)):
+            lines.append(f"# TYPE {metric} counter")
+            lines.extend(f'{metric}{{{label}="{name}"}} {count}' for name, count in sorted(counter.items()))
+        for name, value in self.gauges().items():
+            lines.append(f"# TYPE bot_{name} gauge")
+            lines.append(f"bot_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+# Endpoint HTTP minimal untuk Prometheus: GET /metrics
+async def serve_metrics(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), 10)
+        while (await asyncio.wait_for(reader.readline(), 10)) not in (b'\r\n', b'\n', b''):
+            pass
+        parts = request_line.split()
+        if len(parts) > 1 and parts[1].split(b'?')[0] == b'/metrics':
+            status, body = '200 OK', metrics.render_prometheus().encode()
+        else:
+            status, body = '404 Not Found', b'Not Found\n'
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+# Jumlah maksimum file_id output yang diingat (0 = nonaktif, setiap output selalu diupload)
+FILE_ID_REGISTRY_SIZE = int(os.getenv('FILE_ID_REGISTRY_SIZE', 100000))
+
+def content_digest(file_path: Path | MemoryFile) -> str:
+    if isinstance(file_path, MemoryFile):
+        return hashlib.sha256(file_path.data).hexdigest()
+    with open(file_path, 'rb') as f:
+        return hashlib.file_digest(f, 'sha256').hexdigest()
+
+# Registry file_id Telegram untuk output yang sudah pernah diupload, dengan kunci (hash isi, nama file):
+# output yang sama dikirim ulang lewat file_id tanpa upload ulang. Nama file ikut jadi kunci karena dokumen
+# yang dikirim lewat file_id tetap memakai nama saat pertama diupload. Disimpan sebagai log append-only di
+# cache_dir agar tetap berlaku setelah restart, dan dipadatkan saat log jauh lebih besar dari isinya.
+class FileIdRegistry:
+    def __init__(self, path: Path, max_entries: int = FILE_ID_REGISTRY_SIZE):
+        self.path = path
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # (hash isi, nama file) -> file_id, dari yang paling lama tidak dipakai
+        self.log = None
+        self.log_lines = 0
+
+    def load(self) -> None:
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    self.log_lines += 1
+                    try:
+                        record = json.loads(line)
+                        key = (record['hash'], record['name'])
+                    except (ValueError, KeyError):
+                        continue  # Baris terakhir bisa terpotong jika bot berhenti saat menulis
+                    self.entries.pop(key, None)
+                    if record.get('file_id'):
+                        self.entries[key] = record['file_id']
+        except FileNotFoundError:
+            pass
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        self.compact()
+
+    # Tulis ulang log hanya dengan entri yang masih berlaku
+    def compact(self) -> None:
+        if self.log is not None:
+            self.log.close()
+        tmp_file_path = tmp_path(self.path)
+        with open(tmp_file_path, 'w', encoding='utf-8') as f:
+            for (digest, name), file_id in self.entries.items():
+                f.write(json.dumps({'hash': digest, 'name': name, 'file_id': file_id}) + '\n')
+        tmp_file_path.replace(self.path)
+        self.log_lines = len(self.entries)
+        self.log = open(self.path, 'a', encoding='utf-8', buffering=1)
+
+    def _append(self, digest: str, name: str, file_id: str | None) -> None:
+        if self.log is None:
+            return
+        self.log.write(json.dumps({'hash': digest, 'name': name, 'file_id': file_id}) + '\n')
+        self.log_lines += 1
+        if self.log_lines > 2 * self.max_entries:
+            self.compact()
+
+    def get(self, digest: str, name: str) -> str | None:
+        file_id = self.entries.get((digest, name))
+        if file_id is not None:
+            self.entries.move_to_end((digest, name))
+        return file_id
+
+    def set(self, digest: str, name: str, file_id: str) -> None:
+        if self.entries.get((digest, name)) == file_id:
+            return
+        self.entries[(digest, name)] = file_id
+        self.entries.move_to_end((digest, name))
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        self._append(digest, name, file_id)
+
+    def discard(self, digest: str, name: str) -> None:
+        if self.entries.pop((digest, name), None) is not None:
+            self._append(digest, name, None)
+
+    def close(self) -> None:
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+
+file_ids = FileIdRegistry(cache_dir / 'file_ids.jsonl')
+
+# Batas laju upload dokumen keluar (upload per detik) dan jumlah upload yang berjalan bersamaan
+SEND_RATE = float(os.getenv('SEND_RATE', 20))
+SEND_CONCURRENCY = int(os.getenv('SEND_CONCURRENCY', 4))
+# Jumlah dokumen per album (sendMediaGroup) saat mengirim hasil berupa beberapa bagian; batas Telegram 10
+MEDIA_GROUP_SIZE = max(1, min(int(os.getenv('MEDIA_GROUP_SIZE', 10)), 10))
+
+# Antrean upload bersama: upload dari chat atau job yang berbeda dikirim secara paralel sampai batas laju
+class SendQueue:
+    def __init__(self, rate: float = SEND_RATE, concurrency: int = SEND_CONCURRENCY):
+        self.interval = 1 / rate if rate > 0 else 0
+        self.concurrency = concurrency
+        self.queue = None
+        self.workers = []
+        self.next_slot = 0.0
+
+    def start(self, bot) -> None:
+        self.bot = bot
+        self.queue = asyncio.Queue()
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    def qsize(self) -> int:
+        return self.queue.qsize() if self.queue is not None else 0
+
+    # Satu item antrean = satu panggilan API: satu dokumen atau satu album berisi beberapa dokumen
+    async def _send(self, chat_id: int, documents: list) -> list:
+        future = asyncio.get_running_loop().create_future()
+        with metrics.timed('send') as stage:
+            stage['bytes'] = sum(output_size(file_path) for file_path, _ in documents)
+            await self.queue.put((chat_id, documents, future, time.perf_counter()))
+            return await future
+
+    async def send_document(self, chat_id: int, file_path: Path | MemoryFile, filename: str = None):
+        messages = await self._send(chat_id, [(file_path, filename or file_path.name)])
+        return messages[0]
+
+    # Di Telegram upload dan pesan adalah satu panggilan. Bagian-bagian satu job dikirim sebagai album
+    # (sendMediaGroup): semua dokumen satu album diupload dalam satu request dan muncul di chat sesuai urutan
+    async def send_documents(self, chat_id: int, file_paths: list, filenames: list = None) -> list:
+        filenames = filenames or [None] * len(file_paths)
+        documents = [(file_path, filename or file_path.name) for file_path, filename in zip(file_paths, filenames)]
+        messages = []
+        for start in range(0, len(documents), MEDIA_GROUP_SIZE):
+            messages.extend(await self._send(chat_id, documents[start:start + MEDIA_GROUP_SIZE]))
+        return messages
+
+    async def _throttle(self) -> None:
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        slot = max(now, self.next_slot)
+        self.next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    # Dokumen yang file_id-nya sudah dikenal dikirim ulang tanpa upload; output di memori diupload langsung
+    # dari buffer, file di disk ditutup lagi setelah upload
+    async def _upload(self, chat_id: int, documents: list, known_ids: list) -> list:
+        with ExitStack() as stack:
+            contents = []
+            for (file_path, filename), file_id in zip(documents, known_ids):
+                if file_id is not None:
+                    contents.append(file_id)
+                elif isinstance(file_path, MemoryFile):
+                    contents.append(file_path.data)
+                else:
+                    contents.append(stack.enter_context(open(file_path, 'rb')))
+            if len(documents) == 1:
+                if known_ids[0] is not None:
+                    return [await self.bot.send_document(chat_id=chat_id, document=contents[0])]
+                return [await self.bot.send_document(chat_id=chat_id, document=contents[0], filename=documents[0][1])]
+            media = [InputMediaDocument(content) if file_id is not None else InputMediaDocument(content, filename=filename)
+                     for content, (_, filename), file_id in zip(contents, documents, known_ids)]
+            return list(await self.bot.send_media_group(chat_id=chat_id, media=media))
+
+    async def _worker(self) -> None:
+        while True:
+            chat_id, documents, future, queued = await self.queue.get()
+            metrics.observe('send_wait', time.perf_counter() - queued)
+            if future.cancelled():
+                # Job sudah dibatalkan (/batal) sebelum gilirannya upload
+                self.queue.task_done()
+                continue
+            names = ', '.join(filename for _, filename in documents)
+            try:
+                digests = [None] * len(documents)
+                known_ids = [None] * len(documents)
+                if FILE_ID_REGISTRY_SIZE:
+                    with metrics.timed('hash'):
+                        digests = await asyncio.gather(*(asyncio.to_thread(content_digest, file_path) for file_path, _ in documents))
+                    known_ids = await asyncio.gather(*(asyncio.to_thread(file_ids.get, digest, filename) for digest, (_, filename) in zip(digests, documents)))
+                while True:
+                    await self._throttle()
+                    try:
+                        try:
+                            messages = await self._upload(chat_id, documents, known_ids)
+                        except BadRequest as e:
+                            if not any(known_ids):
+                                raise
+                            # file_id tidak berlaku lagi: hapus dari registry dan upload ulang
+                            logger.warning(f"file_id untuk {names} ditolak ({e}), upload ulang")
+                            for digest, (_, filename), file_id in zip(digests, documents, known_ids):
+                                if file_id is not None:
+                                    await asyncio.to_thread(file_ids.discard, digest, filename)
+                            known_ids = [None] * len(documents)
+                            continue
+                        for digest, (_, filename), file_id, message in zip(digests, documents, known_ids, messages):
+                            if file_id is not None:
+                                metrics.events['file_id_reuse'] += 1
+                            elif digest is not None and message.document is not None:
+                                await asyncio.to_thread(file_ids.set, digest, filename, message.document.file_id)
+                        break
+                    except RetryAfter as e:
+                        # Kena flood limit Telegram: tunda semua upload sesuai permintaan server lalu ulangi
+                        retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else e.retry_after
+                        metrics.events['retry_after'] += 1
+                        logger.warning(f"Flood limit saat mengirim {names}, coba lagi dalam {retry_after} detik")
+                        self.next_slot = max(self.next_slot, asyncio.get_running_loop().time() + retry_after)
+                if not future.done():
+                    future.set_result(messages)
+            except Exception as e:
+                metrics.record_error(e)
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self.queue.task_done()
+
+send_queue = SendQueue()
+cache_task = None
+pins_task = None
+warmup_task = None
+metrics_server = None
+
+# Task latar belakang yang hasilnya tidak ditunggu; referensinya disimpan sampai selesai agar tidak dibuang
+# garbage collector di tengah jalan
+background_tasks = set()
+
+def run_in_background(coroutine) -> asyncio.Task:
+    task = asyncio.create_task(coroutine)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+async def post_init(application: Application) -> None:
+    global cache_task, pins_task, warmup_task, metrics_server
+    if FILE_ID_REGISTRY_SIZE:
+        await asyncio.to_thread(file_ids.load)
+    for stale_dir in retire_workspaces():
+        run_in_background(asyncio.to_thread(shutil.rmtree, stale_dir, True))
+    send_queue.start(application.bot)
+    # Di mode antrean hanya proses bot yang menghapus entri cache; pin entri dibagi dengan worker lewat antrean job
+    cache_task = asyncio.create_task(manage_cache())
+    if QUEUE_MODE == 'queue':
+        pins_task = asyncio.create_task(renew_cache_pins())
+    if WARMUP != 'off':
+        warmup_task = asyncio.create_task(warm_up())
+    if METRICS_PORT:
+        metrics_server = await asyncio.start_server(serve_metrics, METRICS_HOST, METRICS_PORT)
+        logger.info(f"Endpoint metrik Prometheus di http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+
+async def post_shutdown(application: Application) -> None:
+    global executor, metrics_server
+    if cache_task is not None:
+        cache_task.cancel()
+    if pins_task is not None:
+        pins_task.cancel()
+    if warmup_task is not None:
+        await asyncio.gather(warmup_task, return_exceptions=True)
+    if background_tasks:
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+    if metrics_server is not None:
+        metrics_server.close()
+        metrics_server = None
+    await send_queue.stop()
+    file_ids.close()
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+        executor = None
+
 def get_custom_keyboard():
     keyboard = [
         [KeyboardButton("/start"), KeyboardButton("/sisa")],
         [KeyboardButton("/jumlah"), KeyboardButton("/pecah")],
-        [KeyboardButton("/excel"), KeyboardButton("/text")]
+        [KeyboardButton("/excel"), KeyboardButton("/text")],
+        [KeyboardButton("/gabung"), KeyboardButton("/batal")]
     ]
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
 
-# Function to manage cache if there are more than 50 files
-def manage_cache():
+# Batas total ukuran cache (byte), umur maksimum entri cache (detik, 0 = tanpa batas) dan interval pengecekan
+CACHE_MAX_BYTES = int(os.getenv('CACHE_MAX_BYTES', 2 * 1024 * 1024 * 1024))
+CACHE_TTL = int(os.getenv('CACHE_TTL', 0))
+CACHE_EVICT_INTERVAL = int(os.getenv('CACHE_EVICT_INTERVAL', 60))
+
+def path_size(path: Path) -> int:
+    if not path.is_dir():
+        return path.stat().st_size
+    return sum(f.stat().st_size for f in path.rglob('*') if f.is_file())
+
+def remove_path(path: Path) -> None:
+    if path.is_dir():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        path.unlink(missing_ok=True)
+
+# Index cache di memori: ukuran dan waktu akses setiap entri (file di folder cache atau folder hasil konversi),
+# diurutkan dari yang paling lama tidak dipakai (LRU)
+class CacheIndex:
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES, ttl: int = CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()  # path -> (ukuran, waktu akses terakhir)
+        self.total_bytes = 0
+        self.pins = Counter()  # path -> jumlah job yang sedang memakai entri ini
+        self.wakeup = None
+        self.scanned_at = None  # waktu scan folder cache terakhir dimulai
+
+    def scan(self) -> list:
+        self.scanned_at = time.time()
+        paths = [f for f in cache_dir.iterdir() if f not in (results_dir, uploads_dir, queue_dir, JOB_TMP_DIR, file_ids.path)]
+        paths += list(results_dir.iterdir()) + list(uploads_dir.iterdir())
+        # Nama yang diawali titik adalah file sementara (.tmp-, .part, entri yang sedang dihapus)
+        paths = [f for f in paths if not f.name.startswith('.')]
+        entries = []
+        for path in paths:
+            try:
+                entries.append((path, path_size(path), path.stat().st_mtime))
+            except OSError:
+                continue
+        return sorted(entries, key=lambda entry: entry[2])
+
+    # Bangun ulang index dari isi folder cache saat bot dijalankan
+    def rebuild(self, entries: list) -> None:
+        self.entries.clear()
+        self.total_bytes = 0
+        for path, size, last_access in entries:
+            self.entries[path] = (size, last_access)
+            self.total_bytes += size
+
+    def add(self, path: Path) -> None:
+        try:
+            size = path_size(path)
+        except OSError:
+            return
+        if QUEUE_MODE == 'queue':
+            self.mark_changed()
+        self.discard(path)
+        self.entries[path] = (size, time.time())
+        self.total_bytes += size
+        if self.total_bytes > self.max_bytes and self.wakeup is not None:
+            self.wakeup.set()
+
+    def touch(self, path: Path) -> None:
+        if QUEUE_MODE == 'queue':
+            # Proses bot membangun index dari mtime, jadi akses oleh worker dicatat di mtime entri
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        if path in self.entries:
+            size, _ = self.entries[path]
+            self.entries[path] = (size, time.time())
+            self.entries.move_to_end(path)
+        else:
+            self.add(path)
+
+    def discard(self, path: Path) -> None:
+        entry = self.entries.pop(path, None)
+        if entry is not None:
+            self.total_bytes -= entry[0]
+
+    # Di mode antrean entri baru dari proses mana pun ditandai lewat mtime CACHE_GENERATION_PATH, agar proses bot
+    # hanya memindai ulang folder cache jika ada entri yang ditambahkan sejak scan terakhir
+    def mark_changed(self) -> None:
+        try:
+            CACHE_GENERATION_PATH.parent.mkdir(parents=True, exist_ok=True)
+            CACHE_GENERATION_PATH.touch()
+        except OSError:
+            pass
+
+    def changed_since_scan(self) -> bool:
+        if self.scanned_at is None:
+            return True
+        try:
+            # Selisih 1 detik untuk resolusi mtime filesystem yang lebih kasar dari time.time()
+            return CACHE_GENERATION_PATH.stat().st_mtime > self.scanned_at - 1
+        except FileNotFoundError:
+            return False
+        except OSError:
+            return True
+
+    # Pemakaian entri oleh worker hanya tercatat di mtime-nya: sebelum entri dipilih untuk dihapus,
+    # waktu akses terakhirnya dicek lagi di disk
+    def used_since_scan(self, path: Path) -> bool:
+        if QUEUE_MODE != 'queue':
+            return False
+        size, last_access = self.entries[path]
+        try:
+            mtime = path.stat().st_mtime
+        except OSError:
+            return False
+        if mtime <= last_access:
+            return False
+        self.entries[path] = (size, mtime)
+        self.entries.move_to_end(path)
+        return True
+
+    # Entri yang di-pin sedang dipakai job dan tidak akan dipilih untuk dihapus
+    def pin(self, path: Path) -> None:
+        self.pins[path] += 1
+
+    def unpin(self, path: Path) -> None:
+        self.pins[path] -= 1
+        if self.pins[path] <= 0:
+            del self.pins[path]
+
+    # Pilih entri yang harus dihapus: yang kedaluwarsa (TTL) lalu yang paling lama tidak dipakai sampai di bawah batas
+    def select_victims(self) -> list:
+        victims = []
+        if self.ttl:
+            expire_before = time.time() - self.ttl
+            victims = [path for path, (_, last_access) in list(self.entries.items())
+                       if last_access < expire_before and path not in self.pins and not self.used_since_scan(path)]
+            for path in victims:
+                self.discard(path)
+        for path in list(self.entries):
+            if self.total_bytes <= self.max_bytes:
+                break
+            if path in self.pins or self.used_since_scan(path):
+                continue
+            self.discard(path)
+            victims.append(path)
+        return victims
+
+cache_index = CacheIndex()
+
+# Kunci entri cache yang sama di semua node: path relatif terhadap folder cache
+def cache_key(path: Path) -> str:
+    return path.relative_to(cache_dir).as_posix()
+
+# Rename entri ke nama sementara (diawali titik) sebelum isinya dihapus; None jika entri sudah tidak ada
+def retire_entry(path: Path) -> Path | None:
+    try:
+        return path.rename(path.with_name(f".evict-{secrets.token_hex(4)}-{path.name}"))
+    except OSError:
+        return None
+
+# Task latar belakang yang menjaga ukuran cache, di luar jalur request
+async def manage_cache() -> None:
+    cache_index.wakeup = asyncio.Event()
     try:
-        files = list(cache_dir.glob('*'))
-        if len(files) > 50:
-            files.sort(key=lambda f: f.stat().st_mtime)
-            for file in files[:len(files) - 50]:
-                file.unlink()
+        cache_index.rebuild(await asyncio.to_thread(cache_index.scan))
+        logger.info(f"Index cache: {len(cache_index.entries)} entri, {cache_index.total_bytes} byte")
     except Exception as e:
-        logger.error(f"Error managing cache: {e}")
-
-async def convert_to_xlsx(file_path: Path, file_name: str) -> Path:
-    try:
-        df = None
-        if file_name.endswith('.xlsb'):
-            df = pd.read_excel(file_path, engine='pyxlsb')
-        elif file_name.endswith('.xls'):
-            df = pd.read_excel(file_path, engine='xlrd')
-        elif file_name.endswith(('.xlsx', '.xlsm')):
-            df = pd.read_excel(file_path, engine='openpyxl')
-        elif file_name.endswith('.csv'):
-            df = pd.read_csv(file_path)
-        elif file_name.endswith('.txt'):
-            df = pd.read_csv(file_path, delimiter='\t')
-        elif file_name.endswith('.xml'):
-            df = pd.read_xml(file_path)
-        elif file_name.endswith('.ods'):
-            df = pd.read_excel(file_path, engine='odf')
-        elif file_name.endswith('.pdf'):
-            with pdfplumber.open(file_path) as pdf:
-                first_page = pdf.pages[0]
-                table = first_page.extract_table()
-            df = pd.DataFrame(table[1:], columns=table[0])
+        logger.error(f"Error rebuilding cache index: {e}")
+
+    while True:
+        try:
+            await asyncio.wait_for(cache_index.wakeup.wait(), CACHE_EVICT_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        cache_index.wakeup.clear()
+        try:
+            with metrics.timed('cache_evict') as stage:
+                if QUEUE_MODE == 'queue' and cache_index.changed_since_scan():
+                    # Worker juga menambah entri: index dibangun ulang dari isi folder hanya jika ada entri baru
+                    cache_index.rebuild(await asyncio.to_thread(cache_index.scan))
+                total_bytes = cache_index.total_bytes
+                victims = cache_index.select_victims()
+                stage['bytes'] = total_bytes - cache_index.total_bytes
+                if QUEUE_MODE == 'queue':
+                    # Pin dari semua proses dicek dan entri di-rename dalam satu transaksi antrean job
+                    evicted = await asyncio.to_thread(job_queue.evict_cache, victims, retire_entry)
+                else:
+                    # Rename dulu (tanpa await, jadi tidak bisa diselingi job yang baru mulai memakai entri ini),
+                    # baru hapus isinya di thread
+                    evicted = [path for path in map(retire_entry, victims) if path is not None]
+                for path in evicted:
+                    await asyncio.to_thread(remove_path, path)
+            if evicted:
+                logger.info(f"{len(evicted)} entri cache dihapus, sisa {cache_index.total_bytes} byte")
+        except Exception as e:
+            logger.error(f"Error managing cache: {e}")
+
+# Cache hasil konversi: satu folder per (file_unique_id Telegram, operasi) berisi file output dan meta.json
+results_dir = cache_dir / 'results'
+results_dir.mkdir(exist_ok=True)
+
+# File upload disimpan per file_unique_id, agar upload dengan nama sama dari pengguna lain tidak saling menimpa
+uploads_dir = cache_dir / 'uploads'
+uploads_dir.mkdir(exist_ok=True)
+
+# Antrean job untuk worker terpisah (QUEUE_MODE=queue), lihat JobQueue
+queue_dir = cache_dir / 'queue'
+CACHE_GENERATION_PATH = queue_dir / 'cache-generation'  # mtime-nya berubah setiap ada entri cache baru, lihat CacheIndex
+
+# Folder kerja sementara untuk setiap job, misalnya di tmpfs (JOB_TMP_DIR=/dev/shm/bot-jobs) agar file antara tidak ke disk
+JOB_TMP_DIR = Path(os.getenv('JOB_TMP_DIR', cache_dir / 'jobs'))
+
+# Folder kerja milik satu job: output ditulis di sini sebelum dipindahkan ke cache hasil, dan entri cache yang
+# dipakai job di-pin agar tidak dihapus di tengah jalan. Folder dihapus dan pin dilepas saat job selesai.
+# Di mode antrean pin juga dicatat di antrean job atas nama workspace ini, agar terlihat oleh proses bot yang
+# menjalankan eviksi.
+class Workspace:
+    def __init__(self, name: str, user: int = None):
+        self.name = name
+        self.user = user
+        self.path = None
+        self.pinned = []
+        self.shared_pins = False
+        self.memory_entries = {}  # id(entry) -> dokumen yang datanya disimpan di memori selama job berjalan
+        self.pool_futures = []  # job process pool yang dijalankan untuk workspace ini (lihat run_job)
+        self.finished = None  # task pembersihan jika masih ada job pool yang berjalan saat workspace ditutup
+        self.token = None
+
+    def __enter__(self) -> Workspace:
+        JOB_TMP_DIR.mkdir(parents=True, exist_ok=True)
+        self.path = Path(tempfile.mkdtemp(dir=JOB_TMP_DIR, prefix=f"{self.name}-"))
+        self.token = current_workspace.set(self)
+        return self
+
+    # Job di process pool tidak bisa dihentikan di tengah jalan (misalnya setelah /batal) dan masih menulis ke folder
+    # kerja serta membaca entri cache yang di-pin; pembersihan ditunda sampai semua job tersebut selesai
+    def __exit__(self, *exc_info) -> None:
+        current_workspace.reset(self.token)
+        pending = [future for future in self.pool_futures if not future.done()]
+        if pending:
+            self.finished = run_in_background(self.cleanup_after(pending))
+            draining_workspaces.add(self.finished)
+            self.finished.add_done_callback(draining_workspaces.discard)
         else:
-            raise ValueError("Format file tidak didukung untuk konversi ke .xlsx")
+            self.cleanup()
+
+    async def cleanup_after(self, pending: list) -> None:
+        try:
+            await asyncio.gather(*map(asyncio.wrap_future, pending), return_exceptions=True)
+        finally:
+            self.cleanup()
+
+    def cleanup(self) -> None:
+        for path in self.pinned:
+            cache_index.unpin(path)
+        self.pinned.clear()
+        for entry in self.memory_entries.values():
+            entry['data'] = None
+            memory_budget.release(self.user, entry['size'])
+        self.memory_entries.clear()
+        if self.shared_pins:
+            # Dilepas di latar belakang; jika proses berhenti lebih dulu, pin kedaluwarsa sendiri
+            run_in_background(asyncio.to_thread(job_queue.unpin_cache, self.owner()))
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def owner(self) -> str:
+        return f"{WORKER_NAME}/{self.path.name}"
+
+    # Dokumen kecil diproses di memori selama anggaran memori pengguna dan total masih cukup
+    def in_memory(self, entry: dict) -> bool:
+        if id(entry) in self.memory_entries:
+            return True
+        if not in_memory(entry) or not memory_budget.reserve(self.user, entry['size']):
+            return False
+        self.memory_entries[id(entry)] = entry
+        return True
+
+    # Pin dicatat sebelum entri dibaca, jadi eviksi yang berjalan bersamaan selalu melihatnya atau sudah selesai lebih dulu
+    async def pin(self, path: Path) -> None:
+        cache_index.pin(path)
+        self.pinned.append(path)
+        if QUEUE_MODE == 'queue':
+            self.shared_pins = True
+            await asyncio.to_thread(job_queue.pin_cache, cache_key(path), self.owner())
+
+current_workspace = contextvars.ContextVar('current_workspace', default=None)
+draining_workspaces = set()  # task pembersihan workspace yang menunggu job pool dari job yang sudah dibatalkan
+
+# Batas total byte dokumen di memori untuk semua job yang berjalan dan untuk job satu pengguna; dokumen kecil
+# di atas batas ini didownload ke disk seperti dokumen besar
+INMEMORY_TOTAL_BYTES = int(os.getenv('INMEMORY_TOTAL_BYTES', 64 * 1024 * 1024))
+INMEMORY_USER_BYTES = int(os.getenv('INMEMORY_USER_BYTES', 8 * 1024 * 1024))
+
+class MemoryBudget:
+    def __init__(self, max_bytes: int = INMEMORY_TOTAL_BYTES, max_user_bytes: int = INMEMORY_USER_BYTES):
+        self.max_bytes = max_bytes
+        self.max_user_bytes = max_user_bytes
+        self.used_bytes = 0
+        self.users = Counter()  # user id -> byte yang sedang dipakai
+
+    def reserve(self, user: int, size: int) -> bool:
+        if self.used_bytes + size > self.max_bytes or self.users[user] + size > self.max_user_bytes:
+            return False
+        self.used_bytes += size
+        self.users[user] += size
+        return True
+
+    def release(self, user: int, size: int) -> None:
+        self.used_bytes -= size
+        self.users[user] -= size
+        if self.users[user] <= 0:
+            del self.users[user]
+
+memory_budget = MemoryBudget()
+
+# Folder kerja yang tertinggal dari proses sebelumnya (misalnya karena crash) di-rename saat bot mulai,
+# lalu dihapus di latar belakang
+def retire_workspaces() -> list:
+    stale_dirs = list(JOB_TMP_DIR.parent.glob(f".{JOB_TMP_DIR.name}.stale-*"))
+    if JOB_TMP_DIR.exists():
+        stale_dirs.append(JOB_TMP_DIR.rename(JOB_TMP_DIR.with_name(f".{JOB_TMP_DIR.name}.stale-{secrets.token_hex(4)}")))
+    JOB_TMP_DIR.mkdir(parents=True, exist_ok=True)
+    return stale_dirs
+
+# Format kanonik nomor hasil /sisa: '+62' (+62812...), '62' (62812...), '0' (0812...) atau 'asli' (hanya dibersihkan)
+NOMOR_FORMAT = os.getenv('NOMOR_FORMAT', '+62')
+
+# Nama operasi di cache untuk setiap perintah yang menunggu file; hasil konversi juga dibedakan menurut cara
+# memproses workbook dengan beberapa sheet
+CACHE_OPERATIONS = {'convert': 'xlsx', 'convert_to_txt': 'txt', 'sisa': f"sisa{NOMOR_FORMAT}"}
+COUNT_OPERATION = 'count-rows'  # Hasil hitungan lama (dari dimensi sheet) tidak dipakai lagi
+
+def cache_operation(user_data: dict) -> str:
+    waiting_for = user_data.get('waiting_for')
+    operation = CACHE_OPERATIONS[waiting_for]
+    if waiting_for == 'convert' and user_data.get('xlsx_rollover', XLSX_ROLLOVER) == 'file':
+        operation = 'xlsx-file'
+    if waiting_for in ('convert', 'convert_to_txt'):
+        operation += f"-{user_data.get('sheet_mode', SHEET_MODE)}"
+    return operation
+
+def result_entry(file_unique_id: str, operation: str) -> Path:
+    return results_dir / f"{file_unique_id}-{operation}"
+
+def read_result(file_unique_id: str, operation: str):
+    entry = result_entry(file_unique_id, operation)
+    try:
+        with open(entry / 'meta.json') as f:
+            result = json.load(f)
+        os.utime(entry)  # Tandai sebagai baru dipakai
+    except (OSError, ValueError):
+        return None
+    cache_index.touch(entry)
+    result['files'] = [entry / name for name in result['files']]
+    return result
+
+def get_cached_result(file_unique_id: str, operation: str):
+    result = read_result(file_unique_id, operation)
+    metrics.events['cache_hit' if result is not None else 'cache_miss'] += 1
+    return result
+
+# Pindahkan output ke cache secara atomik; False jika job lain sudah menyimpan hasil yang sama lebih dulu
+def move_result(entry: Path, output_files: list, meta: dict) -> bool:
+    tmp_entry = Path(tempfile.mkdtemp(dir=results_dir, prefix='.tmp-'))
+    for file_path in output_files:
+        # shutil.move juga bisa memindahkan dari folder kerja di tmpfs (filesystem lain), jadi dijalankan di thread
+        shutil.move(file_path, tmp_entry / file_path.name)
+    meta['files'] = [file_path.name for file_path in output_files]
+    with open(tmp_entry / 'meta.json', 'w') as f:
+        json.dump(meta, f)
 
-        new_file_name = file_path.stem + '.xlsx'
-        new_file_path = file_path.parent / new_file_name
-        df.to_excel(new_file_path, index=False)
-        return new_file_path
+    try:
+        tmp_entry.rename(entry)
+        return True
+    except OSError:
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+        return False
+
+# Simpan hasil ke cache; jika job lain sudah menyimpan hasil yang sama, pakai yang sudah ada.
+# Index cache hanya diubah dari event loop
+async def store_result(file_unique_id: str, operation: str, output_files: list, **meta) -> dict:
+    entry = result_entry(file_unique_id, operation)
+    if await asyncio.to_thread(move_result, entry, output_files, meta):
+        cache_index.add(entry)
+
+    result = read_result(file_unique_id, operation)
+    if result is None:
+        raise ValueError("Hasil konversi tidak dapat disimpan ke cache.")
+    return result
+
+# Nama file saat dikirim mengikuti nama upload terbaru, walaupun hasilnya diambil dari cache
+def result_filenames(result: dict, stem: str) -> list:
+    old_stem = result.get('stem')
+    filenames = []
+    for file_path in result['files']:
+        if old_stem and file_path.name.startswith(old_stem):
+            filenames.append(stem + file_path.name[len(old_stem):])
+        else:
+            filenames.append(file_path.name)
+    return filenames
+
+def document_entry(document) -> dict:
+    return {
+        'file_id': document.file_id,
+        'unique_id': document.file_unique_id,
+        'name': document.file_name,
+        'size': document.file_size,
+        'path': None,
+        'data': None,
+    }
+
+# Dokumen sampai INMEMORY_MAX_BYTES didownload ke memori dan diproses tanpa menyentuh disk (0 = nonaktif)
+INMEMORY_MAX_BYTES = int(os.getenv('INMEMORY_MAX_BYTES', 1024 * 1024))
+
+def in_memory(entry: dict) -> bool:
+    return entry.get('size') is not None and entry['size'] <= INMEMORY_MAX_BYTES
+
+# Download dokumen hanya jika belum ada di disk (misalnya karena hasilnya sudah ada di cache).
+# Dokumen kecil yang masih muat di anggaran memori job dikembalikan sebagai bytes dan disimpan di entry
+# sampai job selesai; tanpa workspace dokumen selalu didownload ke disk.
+async def download_document(bot, entry: dict, workspace: Workspace = None) -> Path | bytes:
+    if workspace is not None and workspace.in_memory(entry):
+        if entry.get('data') is None:
+            file = await bot.get_file(entry['file_id'])
+            buffer = io.BytesIO()
+            with metrics.timed('download') as stage:
+                await file.download_to_memory(buffer)
+                stage['bytes'] = buffer.tell()
+            entry['data'] = buffer.getvalue()
+        return entry['data']
+
+    upload_dir = uploads_dir / entry['unique_id']
+    if workspace is not None:
+        await workspace.pin(upload_dir)
+    if entry['path'] is None or not entry['path'].exists():
+        file = await bot.get_file(entry['file_id'])
+        upload_dir.mkdir(exist_ok=True)
+        file_path = upload_dir / Path(entry['name']).name
+        # Download ke file sementara lalu rename, agar job lain tidak membaca file yang belum lengkap
+        part_path = upload_dir / f".{file_path.name}.{secrets.token_hex(4)}.part"
+        with metrics.timed('download') as stage:
+            await file.download_to_drive(part_path)
+            stage['bytes'] = part_path.stat().st_size
+        part_path.replace(file_path)
+        cache_index.add(upload_dir)
+        entry['path'] = file_path
+    return entry['path']
+
+# Batas ukuran file yang diterima (dicek sebelum download; Bot API resmi hanya bisa mendownload sampai 20 MB)
+# dan batas jumlah baris per file (dicek dengan penghitungan cepat sebelum job berat, 0 = tanpa batas)
+MAX_FILE_SIZE = int(os.getenv('MAX_FILE_SIZE', (2000 if os.getenv('BOT_API_BASE_URL') else 20) * 1024 * 1024))
+MAX_ROWS = int(os.getenv('MAX_ROWS', 0))
+
+# Jumlah kontak sebuah file beserta rincian per sheet; hasil untuk file di disk di-cache
+# (dipakai /jumlah dan pengecekan MAX_ROWS)
+async def count_document(entry: dict, file_path: Path | bytes) -> dict:
+    if isinstance(file_path, bytes):
+        # txt, csv dan vcf kecil cukup dihitung langsung dari buffer
+        if entry['name'].endswith(('.txt', '.csv', '.vcf')):
+            return count_job(file_path, entry['name'])
+        return await run_job(count_job, file_path, entry['name'])
+    result = read_result(entry['unique_id'], COUNT_OPERATION)
+    if result is None:
+        result = await store_result(entry['unique_id'], COUNT_OPERATION, [], **await run_job(count_job, file_path, entry['name']))
+    return result
+
+# Jumlah baris pdf hanya perkiraan dari baris teks, sehingga pdf yang mendekati batas bisa ikut ditolak
+async def check_rows(entry: dict, file_path: Path | bytes) -> None:
+    if not MAX_ROWS:
+        return
+    result = await count_document(entry, file_path)
+    if result['count'] > MAX_ROWS:
+        approx = "sekitar " if result.get('estimated') else ""
+        raise ValueError(f"File {entry['name']} berisi {approx}{result['count']} baris, melebihi batas {MAX_ROWS} baris per file.")
+
+# Batas job berat yang berjalan bersamaan (global dan per pengguna) dan panjang antrean sebelum permintaan ditolak
+MAX_ACTIVE_JOBS = int(os.getenv('MAX_ACTIVE_JOBS', CONVERT_WORKERS * 2))
+MAX_JOBS_PER_USER = int(os.getenv('MAX_JOBS_PER_USER', 1))
+MAX_QUEUED_JOBS = int(os.getenv('MAX_QUEUED_JOBS', 100))
+
+QUEUE_MESSAGE = "Permintaan Anda masuk antrean"
+
+class JobRejected(Exception):
+    pass
+
+# Penjadwal job berat: job menunggu di antrean FIFO sampai ada slot global dan slot pengguna yang kosong.
+# Job milik pengguna yang sudah mencapai batasnya dilewati, jadi tidak menahan job pengguna lain di belakangnya.
+class JobScheduler:
+    def __init__(self, max_active: int = MAX_ACTIVE_JOBS, max_per_user: int = MAX_JOBS_PER_USER, max_queued: int = MAX_QUEUED_JOBS):
+        self.max_active = max_active
+        self.max_per_user = max_per_user
+        self.max_queued = max_queued
+        self.running = Counter()  # user id -> job yang sedang berjalan
+        self.waiting = deque()  # (user id, future) sesuai urutan masuk
+        self.tasks = defaultdict(set)  # user id -> task job yang berjalan atau menunggu, untuk /batal
+
+    def active(self) -> int:
+        return sum(self.running.values())
+
+    def _can_start(self, user: int) -> bool:
+        return self.active() < self.max_active and self.running[user] < self.max_per_user
+
+    def _release(self, user: int) -> None:
+        self.running[user] -= 1
+        if self.running[user] <= 0:
+            del self.running[user]
+        for item in list(self.waiting):
+            waiting_user, waiter = item
+            # Future yang sudah dibatalkan dikeluarkan dari antrean oleh task pemiliknya
+            if not waiter.done() and self._can_start(waiting_user):
+                self.waiting.remove(item)
+                self.running[waiting_user] += 1
+                waiter.set_result(None)
+
+    # Slot job beserta metrik dan folder kerjanya; selama menunggu, pengguna diberi tahu posisinya di antrean
+    @asynccontextmanager
+    async def job(self, update: Update, command: str):
+        user = update.effective_user.id
+        task = asyncio.current_task()
+        self.tasks[user].add(task)
+        try:
+            queued = time.perf_counter()
+            if self._can_start(user):
+                self.running[user] += 1
+            else:
+                if len(self.waiting) >= self.max_queued:
+                    metrics.events['job_rejected'] += 1
+                    raise JobRejected("Bot sedang sibuk dan antrean sudah penuh. Silakan coba lagi beberapa saat lagi.")
+                waiter = asyncio.get_running_loop().create_future()
+                self.waiting.append((user, waiter))
+                try:
+                    await update.message.reply_text(f"{QUEUE_MESSAGE} di posisi {len(self.waiting)}. Ketik /batal untuk membatalkan.")
+                    await waiter
+                except BaseException:
+                    if waiter.done() and not waiter.cancelled():
+                        self._release(user)  # Slot sudah diberikan tepat sebelum job dibatalkan
+                    elif (user, waiter) in self.waiting:
+                        self.waiting.remove((user, waiter))
+                    raise
+            metrics.observe('queue_wait', time.perf_counter() - queued)
+            workspace = Workspace(command, user)
+            try:
+                with metrics.job(command, update.effective_user.username), workspace:
+                    yield workspace
+            finally:
+                if workspace.finished is not None:
+                    # Job pool dari job yang dibatalkan tetap dihitung sampai selesai
+                    workspace.finished.add_done_callback(lambda _: self._release(user))
+                else:
+                    self._release(user)
+        finally:
+            self.tasks[user].discard(task)
+            if not self.tasks[user]:
+                del self.tasks[user]
+
+    # Batalkan semua job pengguna yang sedang berjalan atau menunggu; folder kerjanya dihapus saat task selesai
+    async def cancel(self, user: int) -> int:
+        tasks = self.tasks.get(user, set()) - {asyncio.current_task()}
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            metrics.events['job_cancelled'] += len(tasks)
+            await asyncio.wait(tasks, timeout=10)
+        return len(tasks)
+
+scheduler = JobScheduler()
+
+# Mode pemrosesan job berat: 'local' menjalankan job di proses bot lewat penjadwal di atas, 'queue' hanya memasukkan
+# job ke antrean SQLite yang dikerjakan oleh proses worker terpisah (python contoh.py worker). Worker bisa berjalan
+# di node lain selama folder cache (beserta antreannya) dipakai bersama lewat storage yang mendukung file lock.
+QUEUE_MODE = os.getenv('QUEUE_MODE', 'local')
+JOB_QUEUE_PATH = Path(os.getenv('JOB_QUEUE_PATH', queue_dir / 'jobs.sqlite3'))
+JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', 60))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+JOB_RETRY_DELAY = int(os.getenv('JOB_RETRY_DELAY', 10))
+JOB_RETENTION = int(os.getenv('JOB_RETENTION', 7 * 24 * 3600))
+WORKER_JOBS = int(os.getenv('WORKER_JOBS', CONVERT_WORKERS))
+WORKER_POLL_INTERVAL = float(os.getenv('WORKER_POLL_INTERVAL', 1))
+WORKER_NAME = os.getenv('WORKER_NAME', f"{socket.gethostname()}-{os.getpid()}")
+
+JOB_QUEUE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    command TEXT NOT NULL,
+    chat_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    username TEXT,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',  -- queued, running, done, failed, cancelled
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    lease_until REAL,
+    worker TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+CREATE TABLE IF NOT EXISTS cache_pins (
+    path TEXT NOT NULL,  -- relatif terhadap folder cache
+    owner TEXT NOT NULL,  -- proses/workspace
+    process TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (path, owner)
+);
+CREATE TABLE IF NOT EXISTS file_ids (
+    hash TEXT NOT NULL,
+    name TEXT NOT NULL,
+    file_id TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (hash, name)
+);
+"""
+
+# Antrean job yang tahan restart. Worker mengambil job dengan lease yang terus diperpanjang selama job berjalan;
+# job yang lease-nya habis (worker crash atau node mati) diambil ulang oleh worker lain sampai JOB_MAX_ATTEMPTS kali.
+# Semua method sinkron dan dipanggil lewat asyncio.to_thread.
+class JobQueue:
+    def __init__(self, path: Path):
+        self.path = path
+        self.db = None
+        self.lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Journal bawaan (bukan WAL), karena WAL butuh shared memory sehingga tidak aman dipakai lintas node
+            self.db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self.db.row_factory = sqlite3.Row
+            self.db.executescript(JOB_QUEUE_SCHEMA)
+        return self.db
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            db = self._connect()
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                yield db
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+            db.execute('COMMIT')
+
+    # Masukkan job ke antrean; mengembalikan posisinya di antara job yang belum selesai
+    def enqueue(self, command: str, chat_id: int, user_id: int, username: str | None, payload: dict) -> int:
+        now = time.time()
+        with self.transaction() as db:
+            job_id = db.execute("INSERT INTO jobs (command, chat_id, user_id, username, payload, available_at, created_at) "
+                                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                (command, chat_id, user_id, username, json.dumps(payload), now, now)).lastrowid
+            return db.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running') AND id <= ?", (job_id,)).fetchone()[0]
+
+    # Ambil job tertua yang siap dikerjakan, termasuk job 'running' yang lease-nya sudah habis
+    def claim(self, worker: str) -> dict | None:
+        now = time.time()
+        with self.transaction() as db:
+            row = db.execute("SELECT * FROM jobs WHERE (status = 'queued' AND available_at <= ?) "
+                             "OR (status = 'running' AND lease_until < ?) ORDER BY id LIMIT 1", (now, now)).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, worker = ?, lease_until = ? WHERE id = ?",
+                       (worker, now + JOB_LEASE_SECONDS, row['id']))
+        job = dict(row)
+        job['attempts'] += 1
+        job['payload'] = json.loads(job['payload'])
+        return job
+
+    # Perpanjang lease; False jika job sudah dibatalkan atau diambil alih worker lain
+    def renew(self, job_id: int, worker: str) -> bool:
+        with self.transaction() as db:
+            return db.execute("UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                              (time.time() + JOB_LEASE_SECONDS, job_id, worker)).rowcount == 1
+
+    def finish(self, job_id: int, worker: str, status: str, error: str = None) -> None:
+        with self.transaction() as db:
+            db.execute("UPDATE jobs SET status = ?, error = ?, finished_at = ?, lease_until = NULL "
+                       "WHERE id = ? AND worker = ? AND status = 'running'", (status, error, time.time(), job_id, worker))
+
+    def retry(self, job_id: int, worker: str, delay: float, error: str) -> None:
+        with self.transaction() as db:
+            db.execute("UPDATE jobs SET status = 'queued', available_at = ?, error = ?, worker = NULL, lease_until = NULL "
+                       "WHERE id = ? AND worker = ? AND status = 'running'", (time.time() + delay, error, job_id, worker))
+
+    # Job yang terhenti karena worker dimatikan dikembalikan ke antrean tanpa dihitung sebagai percobaan
+    def release(self, job_id: int, worker: str) -> None:
+        with self.transaction() as db:
+            db.execute("UPDATE jobs SET status = 'queued', attempts = attempts - 1, worker = NULL, lease_until = NULL "
+                       "WHERE id = ? AND worker = ? AND status = 'running'", (job_id, worker))
+
+    # Batalkan semua job pengguna yang belum selesai; worker yang sedang mengerjakannya berhenti saat memperpanjang lease
+    def cancel(self, user_id: int) -> int:
+        with self.transaction() as db:
+            return db.execute("UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE user_id = ? AND status IN ('queued', 'running')",
+                              (time.time(), user_id)).rowcount
+
+    # Job lama, pin yang kedaluwarsa (prosesnya mati) dan file_id di luar batas registry dihapus
+    def prune(self, max_age: float) -> int:
+        with self.transaction() as db:
+            db.execute("DELETE FROM cache_pins WHERE expires_at < ?", (time.time(),))
+            db.execute("DELETE FROM file_ids WHERE rowid IN (SELECT rowid FROM file_ids ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                       (FILE_ID_REGISTRY_SIZE,))
+            return db.execute("DELETE FROM jobs WHERE status IN ('done', 'failed', 'cancelled') AND finished_at < ?",
+                              (time.time() - max_age,)).rowcount
+
+    # Pin entri cache berlaku selama JOB_LEASE_SECONDS dan diperpanjang oleh proses pemiliknya (renew_cache_pins)
+    def pin_cache(self, path: str, owner: str) -> None:
+        with self.transaction() as db:
+            db.execute("INSERT OR REPLACE INTO cache_pins (path, owner, process, expires_at) VALUES (?, ?, ?, ?)",
+                       (path, owner, WORKER_NAME, time.time() + JOB_LEASE_SECONDS))
+
+    def unpin_cache(self, owner: str) -> None:
+        with self.transaction() as db:
+            db.execute("DELETE FROM cache_pins WHERE owner = ?", (owner,))
+
+    def renew_pins(self, process: str) -> None:
+        with self.transaction() as db:
+            db.execute("UPDATE cache_pins SET expires_at = ? WHERE process = ?", (time.time() + JOB_LEASE_SECONDS, process))
+
+    # Hapus entri yang tidak di-pin proses mana pun; pengecekan pin dan rename berada dalam satu transaksi,
+    # sehingga tidak bisa diselingi proses lain yang baru mulai memakai entri tersebut
+    def evict_cache(self, paths: list, retire) -> list:
+        with self.transaction() as db:
+            pinned = {row[0] for row in db.execute("SELECT path FROM cache_pins WHERE expires_at >= ?", (time.time(),))}
+            retired = (retire(path) for path in paths if cache_key(path) not in pinned)
+            return [path for path in retired if path is not None]
+
+    def get_file_id(self, digest: str, name: str) -> str | None:
+        with self.lock:
+            row = self._connect().execute("SELECT file_id FROM file_ids WHERE hash = ? AND name = ?", (digest, name)).fetchone()
+        return row[0] if row is not None else None
+
+    def set_file_id(self, digest: str, name: str, file_id: str) -> None:
+        with self.transaction() as db:
+            db.execute("INSERT OR REPLACE INTO file_ids (hash, name, file_id, updated_at) VALUES (?, ?, ?, ?)",
+                       (digest, name, file_id, time.time()))
+
+    def discard_file_id(self, digest: str, name: str) -> None:
+        with self.transaction() as db:
+            db.execute("DELETE FROM file_ids WHERE hash = ? AND name = ?", (digest, name))
+
+    def close(self) -> None:
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+job_queue = JobQueue(JOB_QUEUE_PATH)
+
+# Registry file_id untuk mode antrean: log append-only milik FileIdRegistry tidak aman ditulis dan dipadatkan oleh
+# beberapa proses sekaligus, jadi file_id disimpan di tabel antrean job yang dipakai bersama bot dan semua worker.
+# Entri yang sudah pernah dibaca juga disimpan di memori.
+class SharedFileIdRegistry:
+    path = None
+
+    def __init__(self, queue: JobQueue, max_entries: int = FILE_ID_REGISTRY_SIZE):
+        self.queue = queue
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # (hash isi, nama file) -> file_id
+
+    def load(self) -> None:
+        pass
+
+    def _remember(self, digest: str, name: str, file_id: str) -> None:
+        self.entries[(digest, name)] = file_id
+        self.entries.move_to_end((digest, name))
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def get(self, digest: str, name: str) -> str | None:
+        file_id = self.entries.get((digest, name)) or self.queue.get_file_id(digest, name)
+        if file_id is not None:
+            self._remember(digest, name, file_id)
+        return file_id
+
+    def set(self, digest: str, name: str, file_id: str) -> None:
+        self._remember(digest, name, file_id)
+        self.queue.set_file_id(digest, name, file_id)
+
+    def discard(self, digest: str, name: str) -> None:
+        self.entries.pop((digest, name), None)
+        self.queue.discard_file_id(digest, name)
+
+    def close(self) -> None:
+        pass
+
+if QUEUE_MODE == 'queue':
+    file_ids = SharedFileIdRegistry(job_queue)
+
+# Perpanjang pin entri cache milik proses ini selama prosesnya masih hidup
+async def renew_cache_pins() -> None:
+    while True:
+        await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+        try:
+            await asyncio.to_thread(job_queue.renew_pins, WORKER_NAME)
+        except Exception as e:
+            logger.error(f"Error renewing cache pins: {e}")
+
+# Jumlah baris per potongan data yang dibaca dan ditulis oleh pipeline konversi
+CHUNK_ROWS = int(os.getenv('CHUNK_ROWS', 50000))
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+# Sumber data job: Path (file di disk) atau bytes (dokumen kecil yang didownload langsung ke memori).
+# BytesIO dari bytes tidak menyalin isinya, jadi setiap pembaca mendapat posisi baca sendiri tanpa salinan data.
+def open_source(file_path: Path | bytes):
+    return io.BytesIO(file_path) if isinstance(file_path, bytes) else open(file_path, 'rb')
+
+# Untuk library yang menerima path atau file object (pandas, openpyxl, zipfile, pdfplumber)
+def source_file(file_path: Path | bytes):
+    return io.BytesIO(file_path) if isinstance(file_path, bytes) else file_path
+
+# Output yang dibuat di memori, dikirim langsung dari buffer tanpa ditulis ke disk
+MemoryFile = namedtuple('MemoryFile', ['name', 'data'])
+
+# Writer menulis ke file sementara dulu; nama akhir baru dipakai setelah file selesai ditulis
+def tmp_path(file_path: Path) -> Path:
+    return file_path.with_name(f".{file_path.name}.tmp")
+
+# Tujuan penulisan output: file di folder output, ditulis dengan nama sementara lalu di-rename saat selesai
+class PartFiles:
+    def __init__(self, output_dir: Path):
+        self.output_dir = output_dir
+        self.names = []
+
+    def open(self, name: str):
+        self.names.append(name)
+        return open(tmp_path(self.output_dir / name), 'wb', buffering=WRITE_BUFFER_SIZE)
+
+    def rename(self, name: str, new_name: str) -> None:
+        tmp_path(self.output_dir / name).replace(tmp_path(self.output_dir / new_name))
+        self.names[self.names.index(name)] = new_name
+
+    def close(self) -> list:
+        paths = [self.output_dir / name for name in self.names]
+        for path in paths:
+            tmp_path(path).replace(path)
+        return paths
+
+    def abort(self) -> None:
+        for name in self.names:
+            tmp_path(self.output_dir / name).unlink(missing_ok=True)
+        self.names = []
+
+class MemoryStream(io.BytesIO):
+    def __init__(self, files: dict, name: str):
+        super().__init__()
+        self.files = files
+        self.name = name
+
+    def close(self) -> None:
+        if not self.closed:
+            self.files[self.name] = self.getvalue()
+        super().close()
+
+# Tujuan penulisan output di memori: isi setiap file diambil saat stream-nya ditutup
+class MemoryFiles:
+    def __init__(self):
+        self.files = {}
+
+    def open(self, name: str):
+        self.files[name] = b''
+        return MemoryStream(self.files, name)
+
+    def rename(self, name: str, new_name: str) -> None:
+        self.files[new_name] = self.files.pop(name)
+
+    def close(self) -> list:
+        return [MemoryFile(name, data) for name, data in self.files.items()]
+
+    def abort(self) -> None:
+        self.files.clear()
+
+def output_size(file_path: Path | MemoryFile) -> int:
+    return len(file_path.data) if isinstance(file_path, MemoryFile) else file_path.stat().st_size
+
+# Deteksi format dari isi file (magic bytes), bukan dari nama file
+def detect_format(file_path: Path | bytes) -> str:
+    with open_source(file_path) as f:
+        head = f.read(8192)
+
+    if head.startswith(b'%PDF'):
+        return 'pdf'
+    if head.startswith(b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'):
+        return 'xls'
+    if head.startswith(b'PK\x03\x04'):
+        with zipfile.ZipFile(source_file(file_path)) as zf:
+            names = set(zf.namelist())
+            if 'xl/workbook.xml' in names:
+                return 'xlsx'
+            if 'xl/workbook.bin' in names:
+                return 'xlsb'
+            if 'mimetype' in names and zf.read('mimetype').startswith(b'application/vnd.oasis.opendocument.spreadsheet'):
+                return 'ods'
+        raise ValueError("Arsip ZIP bukan file spreadsheet yang didukung")
+
+    text = head.removeprefix(b'\xef\xbb\xbf').lstrip()
+    if text[:11].upper() == b'BEGIN:VCARD':
+        return 'vcf'
+    if text.startswith(b'<'):
+        return 'xml'
+    if b'\x00' in head:
+        raise ValueError("File biner dengan format yang tidak dikenali")
+    # Teks biasa: tab di baris pertama berarti txt (tab-separated), selain itu csv
+    return 'txt' if b'\t' in text.split(b'\n', 1)[0] else 'csv'
+
+# Ubah aliran baris (baris pertama = header) menjadi potongan DataFrame berukuran CHUNK_ROWS
+def rows_to_chunks(rows, chunk_rows: int = CHUNK_ROWS):
+    header = next(rows, None)
+    if header is None:
+        return
+    header = list(header)
+    while True:
+        batch = list(islice(rows, chunk_rows))
+        if not batch:
+            break
+        yield pd.DataFrame(batch, columns=header)
+
+def non_empty_rows(rows):
+    return (row for row in rows if any(cell is not None and cell != '' for cell in row))
+
+# Angka bulat yang disimpan sebagai float (xls, xlsb) dikembalikan ke int, seperti yang dilakukan pandas
+def integral_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+# Byte yang tidak valid sebagai UTF-8 diganti, agar file dengan encoding campuran tetap bisa dikonversi
+def read_csv_chunks(file_path: Path | bytes):
+    yield from pd.read_csv(source_file(file_path), chunksize=CHUNK_ROWS, encoding_errors='replace')
+
+def read_txt_chunks(file_path: Path | bytes):
+    yield from pd.read_csv(source_file(file_path), delimiter='\t', chunksize=CHUNK_ROWS, encoding_errors='replace')
+
+# Pembaca workbook membaca satu sheet menurut namanya (default: sheet pertama)
+def read_xlsx_chunks(file_path: Path | bytes, sheet: str | None = None):
+    wb = openpyxl.load_workbook(source_file(file_path), read_only=True, data_only=True)
+    try:
+        ws = wb[sheet] if sheet is not None else wb.worksheets[0]
+        yield from rows_to_chunks(non_empty_rows(ws.iter_rows(values_only=True)))
+    finally:
+        wb.close()
+
+def open_xls(file_path: Path | bytes):
+    import xlrd
+    if isinstance(file_path, bytes):
+        return xlrd.open_workbook(file_contents=file_path, on_demand=True)
+    return xlrd.open_workbook(file_path, on_demand=True)
+
+def read_xls_chunks(file_path: Path | bytes, sheet: str | None = None):
+    import xlrd
+    book = open_xls(file_path)
+    try:
+        ws = book.sheet_by_name(sheet) if sheet is not None else book.sheet_by_index(0)
+
+        def rows():
+            for index in range(ws.nrows):
+                row = []
+                for cell in ws.row(index):
+                    if cell.ctype == xlrd.XL_CELL_DATE:
+                        row.append(xlrd.xldate.xldate_as_datetime(cell.value, book.datemode))
+                    elif cell.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK):
+                        row.append(None)
+                    else:
+                        row.append(integral_value(cell.value))
+                yield row
+
+        yield from rows_to_chunks(non_empty_rows(rows()))
+    finally:
+        book.release_resources()
+
+def read_xlsb_chunks(file_path: Path | bytes, sheet: str | None = None):
+    import pyxlsb
+    with pyxlsb.open_workbook(source_file(file_path)) as wb:
+        with wb.get_sheet(sheet if sheet is not None else 1) as ws:
+            rows = ([integral_value(cell.v) for cell in row] for row in ws.rows(sparse=True))
+            yield from rows_to_chunks(non_empty_rows(rows))
+
+# ODS dan XML tidak punya pembaca streaming di pandas, jadi dibaca utuh lalu dipotong
+def frame_chunks(df: pd.DataFrame):
+    for start in range(0, len(df), CHUNK_ROWS):
+        yield df.iloc[start:start + CHUNK_ROWS]
+
+def read_ods_chunks(file_path: Path | bytes, sheet: str | None = None):
+    yield from frame_chunks(pd.read_excel(source_file(file_path), engine='odf', sheet_name=sheet if sheet is not None else 0))
+
+def read_xml_chunks(file_path: Path | bytes):
+    yield from frame_chunks(pd.read_xml(source_file(file_path)))
+
+def read_pdf_chunks(file_path: Path | bytes):
+    with pdfplumber.open(source_file(file_path)) as pdf:
+        def tables():
+            for page in pdf.pages:
+                yield from (table for table in page.extract_tables() if table)
+                page.close()
+        yield from rows_to_chunks(merge_pdf_tables(tables()))
+
+# Batas baris per sheet Excel, dan perilaku saat batas tercapai: 'sheet' (sheet baru) atau 'file' (file baru)
+EXCEL_MAX_ROWS = 1048576
+XLSX_ROLLOVER = os.getenv('XLSX_ROLLOVER', 'sheet')
+
+# Penulis xlsx dengan mode write-only: baris langsung di-stream ke file, tidak disimpan di memori.
+# Jika batas baris Excel tercapai, penulisan dilanjutkan di sheet baru atau file baru ("nama 2.xlsx", ...)
+class XlsxChunkWriter:
+    def __init__(self, output, name: str, rollover: str = XLSX_ROLLOVER, max_rows: int = EXCEL_MAX_ROWS):
+        self.output = output
+        self.name = name
+        self.rollover = rollover
+        self.max_rows = max_rows
+        self.header = None
+        self.names = []
+        self._new_file()
+
+    def _new_file(self) -> None:
+        number = len(self.names) + 1
+        if number == 1:
+            self.names.append(self.name)
+        else:
+            stem, suffix = os.path.splitext(self.name)
+            self.names.append(f"{stem} {number}{suffix}")
+        self.wb = openpyxl.Workbook(write_only=True)
+        self._new_sheet()
+
+    def _save(self) -> None:
+        with self.output.open(self.names[-1]) as f:
+            self.wb.save(f)
+
+    def _new_sheet(self) -> None:
+        self.ws = self.wb.create_sheet()
+        self.sheet_rows = 0
+        if self.header is not None:
+            self.ws.append(self.header)
+            self.sheet_rows = 1
+
+    def write(self, chunk: pd.DataFrame) -> None:
+        if self.header is None:
+            self.header = list(chunk.columns)
+            self.ws.append(self.header)
+            self.sheet_rows = 1
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        for row in chunk.itertuples(index=False, name=None):
+            if self.sheet_rows >= self.max_rows:
+                if self.rollover == 'file':
+                    self._save()
+                    self._new_file()
+                else:
+                    self._new_sheet()
+            self.ws.append(row)
+            self.sheet_rows += 1
+
+    def close(self) -> list:
+        self._save()
+        return self.output.close()
+
+    def abort(self) -> None:
+        self.output.abort()
+
+class TxtChunkWriter:
+    def __init__(self, output, name: str, rollover: str = XLSX_ROLLOVER):
+        self.output = output
+        self.file = io.TextIOWrapper(output.open(name), encoding='utf-8', newline='')
+        self.header_written = False
+
+    def write(self, chunk: pd.DataFrame) -> None:
+        chunk.to_csv(self.file, sep='\t', index=False, header=not self.header_written)
+        self.header_written = True
+
+    def close(self) -> list:
+        self.file.close()
+        return self.output.close()
+
+    def abort(self) -> None:
+        self.file.close()
+        self.output.abort()
+
+# Registry format: format baru cukup ditambahkan di sini
+READERS = {
+    'csv': read_csv_chunks,
+    'txt': read_txt_chunks,
+    'xlsx': read_xlsx_chunks,
+    'xls': read_xls_chunks,
+    'xlsb': read_xlsb_chunks,
+    'ods': read_ods_chunks,
+    'xml': read_xml_chunks,
+    'pdf': read_pdf_chunks,
+}
+
+WRITERS = {
+    '.xlsx': XlsxChunkWriter,
+    '.txt': TxtChunkWriter,
+}
+
+# Tulis potongan data lewat writer sesuai ekstensi output ke folder output atau ke memori (output_dir None);
+# mengembalikan semua file yang dihasilkan (Path atau MemoryFile)
+def write_chunks(chunks, output_dir: Path | None, name: str, rollover: str = XLSX_ROLLOVER) -> list:
+    output = PartFiles(output_dir) if output_dir is not None else MemoryFiles()
+    writer = WRITERS[os.path.splitext(name)[1]](output, name, rollover)
+    try:
+        for chunk in chunks:
+            writer.write(chunk)
+        return writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+
+# Format workbook yang bisa berisi beberapa sheet; selain ods, setiap sheet bisa dibaca oleh worker sendiri
+WORKBOOK_FORMATS = ('xlsx', 'xls', 'xlsb', 'ods')
+SHEET_PARALLEL_FORMATS = ('xlsx', 'xls', 'xlsb')
+
+# Workbook dengan beberapa sheet: 'gabung' menyatukan semua sheet dalam satu output (kolom disamakan menurut nama),
+# 'pisah' membuat output terpisah per sheet ("nama - Sheet2.xlsx")
+SHEET_MODES = ('gabung', 'pisah')
+SHEET_MODE = os.getenv('SHEET_MODE', 'gabung')
+
+# Nama semua worksheet sesuai urutan di workbook; untuk xlsx hanya workbook.xml yang dibaca (chartsheet dilewati)
+def sheet_names(file_path: Path | bytes, file_format: str) -> list:
+    if file_format == 'xlsx':
+        from openpyxl.reader.workbook import WorkbookParser
+        with zipfile.ZipFile(source_file(file_path)) as archive:
+            parser = WorkbookParser(archive, 'xl/workbook.xml', keep_links=False)
+            parser.parse()
+            return [sheet.name for sheet, rel in parser.find_sheets() if 'chartsheet' not in rel.Type]
+    if file_format == 'xls':
+        book = open_xls(file_path)
+        try:
+            return book.sheet_names()
+        finally:
+            book.release_resources()
+    if file_format == 'xlsb':
+        import pyxlsb
+        with pyxlsb.open_workbook(source_file(file_path)) as wb:
+            return list(wb.sheets)
+    if file_format == 'ods':
+        return pd.ExcelFile(source_file(file_path), engine='odf').sheet_names
+    return []
+
+# (nama sheet, potongan) untuk setiap sheet; ods dibaca sekali untuk semua sheet karena tidak bisa di-stream
+def read_sheets(file_path: Path | bytes, file_format: str):
+    if file_format == 'ods':
+        for name, df in pd.read_excel(source_file(file_path), engine='odf', sheet_name=None).items():
+            yield name, frame_chunks(df)
+        return
+    for name in sheet_names(file_path, file_format):
+        yield name, READERS[file_format](file_path, name)
+
+# Header gabungan beberapa sheet: header yang sama dipakai apa adanya, selain itu semua kolom sesuai urutan kemunculannya
+def union_columns(headers) -> list:
+    headers = [list(header) for header in headers]
+    if all(header == headers[0] for header in headers):
+        return headers[0] if headers else []
+    columns = []
+    for header in headers:
+        for column in header:
+            if column not in columns:
+                columns.append(column)
+    return columns
+
+def align_columns(chunk: pd.DataFrame, columns: list) -> pd.DataFrame:
+    if list(chunk.columns) == columns:
+        return chunk
+    return chunk.loc[:, ~chunk.columns.duplicated()].reindex(columns=columns)
+
+# Dipakai di satu worker (dokumen kecil dan ods), jadi semua potongan ditahan di memori dulu agar header gabungan
+# sudah diketahui sebelum baris pertama ditulis
+def concat_sheets(sheets: list):
+    sheets = [list(chunks) for _, chunks in sheets]
+    columns = union_columns(list(chunks[0].columns) for chunks in sheets if chunks)
+    for chunks in sheets:
+        for chunk in chunks:
+            yield align_columns(chunk, columns)
+
+# Nama output per sheet: "nama - Sheet2"; karakter yang tidak boleh ada di nama file diganti '_'
+UNSAFE_FILENAME_CHARS = re.compile(r'[\\/:*?"<>|]')
+OUTPUT_NAME_CHARS = re.compile(r'[^\w .()+-]')
+
+# Nama file output yang diketik pengguna (/sisa, /gabung): hanya bagian nama tanpa folder, karakter di luar
+# huruf, angka, spasi dan . ( ) + - _ diganti '_'; string kosong jika tidak ada yang tersisa
+def output_stem(name: str) -> str:
+    stem = OUTPUT_NAME_CHARS.sub('_', Path(name.replace('\\', '/')).name)
+    return stem.strip(' .')[:100]
+
+def sheet_stem(stem: str, sheet: str) -> str:
+    return f"{stem} - {UNSAFE_FILENAME_CHARS.sub('_', sheet)}"
+
+# Tulis satu sheet sebagai output sendiri; sheet kosong tidak menghasilkan file
+def write_sheet(chunks, output_dir: Path | None, name: str, rollover: str = XLSX_ROLLOVER) -> list:
+    first = next(chunks, None)
+    if first is None:
+        return []
+    return write_chunks(chain([first], chunks), output_dir, name, rollover)
+
+# Konversi workbook di satu worker: semua sheet digabung, atau ditulis per sheet jika ada lebih dari satu sheet
+def write_workbook(file_path: Path | bytes, file_format: str, output_dir: Path | None, name: str, rollover: str = XLSX_ROLLOVER, sheets: str = SHEET_MODE) -> list:
+    sheet_list = list(read_sheets(file_path, file_format))
+    if len(sheet_list) == 1:
+        return write_chunks(sheet_list[0][1], output_dir, name, rollover)
+    if sheets == 'pisah':
+        stem, suffix = os.path.splitext(name)
+        output_files = []
+        for sheet, chunks in sheet_list:
+            output_files += write_sheet(chunks, output_dir, sheet_stem(stem, sheet) + suffix, rollover)
+        # Semua sheet kosong: tetap kirim satu file kosong seperti workbook satu sheet
+        return output_files or write_chunks(iter(()), output_dir, name, rollover)
+    return write_chunks(concat_sheets(sheet_list), output_dir, name, rollover)
+
+# Jalur cepat csv -> txt tanpa pandas (tanpa inferensi tipe, jadi angka 0 di depan tetap utuh)
+CSV_FAST_PATH = os.getenv('CSV_FAST_PATH', '1') == '1'
+COPY_BLOCK_SIZE = 4 * 1024 * 1024
+BLANK_LINES = re.compile(rb'\n{2,}')
+
+# Ganti delimiter di level byte; hanya aman jika tidak ada tanda kutip atau tab di dalam data
+def csv_to_txt_bytes(src, dst) -> bool:
+    first_block = True
+    pending_cr = b''
+    last_byte = b'\n'
+    while block := src.read(COPY_BLOCK_SIZE):
+        if first_block:
+            block = block.removeprefix(b'\xef\xbb\xbf')
+            first_block = False
+        if b'"' in block or b'\t' in block:
+            return False
+        block = pending_cr + block
+        pending_cr = b''
+        if block.endswith(b'\r'):
+            pending_cr = b'\r'
+            block = block[:-1]
+        block = block.replace(b'\r\n', b'\n').replace(b',', b'\t')
+        # Baris kosong dilewati seperti di jalur csv dan pandas, juga yang terpotong di batas blok
+        block = BLANK_LINES.sub(b'\n', block)
+        if last_byte == b'\n':
+            block = block.lstrip(b'\n')
+        if block:
+            dst.write(block)
+            last_byte = block[-1:]
+    if pending_cr:
+        dst.write(pending_cr)
+        last_byte = pending_cr
+    if last_byte != b'\n':
+        dst.write(b'\n')
+    return True
+
+# Data dengan tanda kutip: csv reader/writer bawaan Python secara streaming
+def csv_to_txt_stream(src, dst) -> None:
+    with io.TextIOWrapper(src, encoding='utf-8-sig', newline='') as src, io.TextIOWrapper(dst, encoding='utf-8', newline='') as dst:
+        csv.writer(dst, delimiter='\t', lineterminator='\n').writerows(row for row in csv.reader(src) if row)
+
+# Mengembalikan jalur yang dipakai ('bytes' atau 'csv'), atau None jika harus kembali ke pandas
+def csv_to_txt(file_path: Path | bytes, output, name: str):
+    try:
+        with open_source(file_path) as src, output.open(name) as dst:
+            if csv_to_txt_bytes(src, dst):
+                return 'bytes'
+        output.abort()
+        try:
+            with open_source(file_path) as src, output.open(name) as dst:
+                csv_to_txt_stream(src, dst)
+            return 'csv'
+        except (UnicodeDecodeError, csv.Error) as e:
+            logger.info(f"Jalur cepat csv tidak bisa dipakai untuk {name}: {e}")
+            output.abort()
+            return None
+    except BaseException:
+        output.abort()
+        raise
+
+# Output ditulis ke output_dir, atau dibuat di memori jika output_dir None (dokumen kecil)
+def convert_job(file_path: Path | bytes, file_name: str, extension: str, output_dir: Path | None, rollover: str = XLSX_ROLLOVER, sheets: str = SHEET_MODE) -> list:
+    try:
+        file_format = detect_format(file_path)
+        if file_format not in READERS:
+            raise ValueError(f"Format file tidak didukung untuk konversi ke {extension}")
+        new_name = Path(file_name).stem + extension
+
+        if CSV_FAST_PATH and file_format == 'csv' and extension == '.txt':
+            output = PartFiles(output_dir) if output_dir is not None else MemoryFiles()
+            route = csv_to_txt(file_path, output, new_name)
+            if route:
+                logger.info(f"{file_name}: csv ke {extension} lewat jalur {route}")
+                return output.close()
+
+        logger.info(f"{file_name}: {file_format} ke {extension} lewat jalur pandas")
+        if file_format in WORKBOOK_FORMATS:
+            return write_workbook(file_path, file_format, output_dir, new_name, rollover, sheets)
+        return write_chunks(READERS[file_format](file_path), output_dir, new_name, rollover)
     except ValueError as e:
-        logger.error(f"Error reading file {file_path}: {e}")
+        logger.error(f"Error reading file {file_name}: {e}")
         raise ValueError(f"File {file_name} tidak dapat dibaca karena format tidak didukung atau file rusak.")
     except Exception as e:
-        logger.error(f"Error converting to XLSX: {e}")
+        logger.error(f"Error converting to {extension}: {e}")
         raise ValueError(f"Terjadi kesalahan saat mengonversi file: {e}")
 
-async def convert_to_txt(file_path: Path, file_name: str) -> Path:
-    try:
-        df = None
-        if file_name.endswith('.xlsb'):
-            df = pd.read_excel(file_path, engine='pyxlsb')
-        elif file_name.endswith('.xls'):
-            df = pd.read_excel(file_path, engine='xlrd')
-        elif file_name.endswith(('.xlsx', '.xlsm', '.ods')):
-            df = pd.read_excel(file_path, engine='openpyxl')
-        elif file_name.endswith('.csv') or file_name.endswith('.xml'):
-            df = pd.read_csv(file_path)
-        elif file_name.endswith('.pdf'):
-            with pdfplumber.open(file_path) as pdf:
-                first_page = pdf.pages[0]
-                table = first_page.extract_table()
-            df = pd.DataFrame(table[1:], columns=table[0])
-        else:
-            raise ValueError("Format file tidak didukung untuk konversi ke .txt")
+# Jumlah halaman PDF maksimum yang diproses oleh satu worker sekaligus
+PDF_PAGES_PER_JOB = int(os.getenv('PDF_PAGES_PER_JOB', 20))
+
+def pdf_page_count(file_path: Path) -> int:
+    with pdfplumber.open(file_path) as pdf:
+        return len(pdf.pages)
+
+# Ekstrak semua tabel dari halaman [start, end) ke rows_path (satu pickle per tabel), mengembalikan jumlah tabel
+def extract_pdf_tables_job(file_path: Path, start: int, end: int, rows_path: Path) -> int:
+    table_count = 0
+    with pdfplumber.open(file_path, pages=range(start + 1, end + 1)) as pdf, open(rows_path, 'wb') as f:
+        for page in pdf.pages:
+            for table in page.extract_tables():
+                if table:
+                    pickle.dump(table, f, protocol=pickle.HIGHEST_PROTOCOL)
+                    table_count += 1
+            page.close()
+    return table_count
+
+# Baca kembali semua objek yang di-pickle berurutan ke file antara (tabel PDF atau potongan sheet)
+def iter_pickled(rows_paths: list):
+    for rows_path in rows_paths:
+        with open(rows_path, 'rb') as f:
+            while True:
+                try:
+                    yield pickle.load(f)
+                except EOFError:
+                    break
+
+# Gabungkan tabel dari semua halaman: header diambil dari tabel pertama, header yang diulang di halaman
+# berikutnya dibuang, dan setiap baris disesuaikan dengan jumlah kolom header
+def merge_pdf_tables(tables):
+    header = None
+    for table in tables:
+        if header is None:
+            header = table[0]
+            yield header
+            table = table[1:]
+        elif table[0] == header:
+            table = table[1:]
+        for row in table:
+            row = list(row[:len(header)]) + [None] * (len(header) - len(row))
+            yield row
+
+def write_pdf_rows_job(rows_paths: list, output_dir: Path, name: str, rollover: str = XLSX_ROLLOVER) -> list:
+    return write_chunks(rows_to_chunks(merge_pdf_tables(iter_pickled(rows_paths))), output_dir, name, rollover)
+
+# Konversi PDF dengan semua halamannya: rentang halaman dibagi ke beberapa worker, lalu hasilnya ditulis berurutan
+async def convert_pdf(file_path: Path, file_name: str, extension: str, output_dir: Path, rollover: str = XLSX_ROLLOVER) -> list:
+    rows_paths = []
+    try:
+        page_count = await run_job(pdf_page_count, file_path)
+        pages_per_job = max(1, min(PDF_PAGES_PER_JOB, -(-page_count // CONVERT_WORKERS)))
+        ranges = [(start, min(start + pages_per_job, page_count)) for start in range(0, page_count, pages_per_job)]
+        rows_paths = [output_dir / f"{file_path.stem}.{start}.rows" for start, _ in ranges]
+
+        table_counts = await asyncio.gather(*(
+            run_job(extract_pdf_tables_job, file_path, start, end, rows_path)
+            for (start, end), rows_path in zip(ranges, rows_paths)
+        ))
+        if not sum(table_counts):
+            raise ValueError(f"Tidak ada tabel yang ditemukan di file {file_name}.")
+
+        return await run_job(write_pdf_rows_job, rows_paths, output_dir, Path(file_name).stem + extension, rollover)
+    except ValueError:
+        raise
+    except Exception as e:
+        logger.error(f"Error converting PDF: {e}")
+        raise ValueError(f"Terjadi kesalahan saat mengonversi file: {e}")
+    finally:
+        for rows_path in rows_paths:
+            rows_path.unlink(missing_ok=True)
 
-        new_file_name = file_path.stem + '.txt'
-        new_file_path = file_path.parent / new_file_name
-        df.to_csv(new_file_path, sep='\t', index=False)
-        return new_file_path
+# Dijalankan di worker untuk workbook di disk: format dan daftar sheet yang bisa dibaca paralel.
+# File yang tidak bisa dibaca mengembalikan (None, []), agar kesalahannya dilaporkan convert_job seperti format lain
+def workbook_sheets(file_path: Path) -> tuple:
+    try:
+        file_format = detect_format(file_path)
+        if file_format in SHEET_PARALLEL_FORMATS:
+            return file_format, sheet_names(file_path, file_format)
     except Exception as e:
-        logger.error(f"Error converting to TXT: {e}")
+        logger.info(f"Daftar sheet {file_path.name} tidak bisa dibaca: {e}")
+    return None, []
+
+def convert_sheet_job(file_path: Path, file_format: str, sheet: str, output_dir: Path, name: str, rollover: str = XLSX_ROLLOVER) -> list:
+    return write_sheet(READERS[file_format](file_path, sheet), output_dir, name, rollover)
+
+# Baca satu sheet ke rows_path (satu pickle per potongan), mengembalikan header sheet atau None jika kosong
+def extract_sheet_job(file_path: Path, file_format: str, sheet: str, rows_path: Path) -> list | None:
+    columns = None
+    with open(rows_path, 'wb') as f:
+        for chunk in READERS[file_format](file_path, sheet):
+            if columns is None:
+                columns = list(chunk.columns)
+            pickle.dump(chunk, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return columns
+
+def write_sheet_rows_job(rows_paths: list, headers: list, output_dir: Path, name: str, rollover: str = XLSX_ROLLOVER) -> list:
+    columns = union_columns(header for header in headers if header is not None)
+    chunks = (align_columns(chunk, columns) for chunk in iter_pickled(rows_paths))
+    return write_chunks(chunks, output_dir, name, rollover)
+
+# Workbook dengan beberapa sheet: setiap sheet dibaca oleh worker sendiri secara paralel, lalu ditulis langsung
+# per sheet ('pisah') atau disatukan berurutan dalam satu output ('gabung')
+async def convert_workbook(file_path: Path, file_name: str, extension: str, output_dir: Path, file_format: str, names: list, rollover: str = XLSX_ROLLOVER, sheets: str = SHEET_MODE) -> list:
+    stem = Path(file_name).stem
+    rows_paths = []
+    try:
+        if sheets == 'pisah':
+            outputs = await asyncio.gather(*(
+                run_job(convert_sheet_job, file_path, file_format, sheet, output_dir, sheet_stem(stem, sheet) + extension, rollover)
+                for sheet in names
+            ))
+            output_files = [file for files in outputs for file in files]
+            return output_files or await run_job(write_chunks, iter(()), output_dir, stem + extension, rollover)
+
+        rows_paths = [output_dir / f"{file_path.stem}.sheet{index}.rows" for index in range(len(names))]
+        headers = await asyncio.gather(*(
+            run_job(extract_sheet_job, file_path, file_format, sheet, rows_path)
+            for sheet, rows_path in zip(names, rows_paths)
+        ))
+        return await run_job(write_sheet_rows_job, rows_paths, headers, output_dir, stem + extension, rollover)
+    except ValueError:
+        raise
+    except Exception as e:
+        logger.error(f"Error converting workbook: {e}")
         raise ValueError(f"Terjadi kesalahan saat mengonversi file: {e}")
+    finally:
+        for rows_path in rows_paths:
+            rows_path.unlink(missing_ok=True)
+
+# PDF diproses per rentang halaman dan workbook per sheet secara paralel; format lain lewat pipeline potongan di satu worker.
+# Dokumen kecil di memori cukup diproses satu worker (read_pdf_chunks, write_workbook)
+async def convert_file(file_path: Path | bytes, file_name: str, extension: str, output_dir: Path | None, rollover: str = XLSX_ROLLOVER, sheets: str = SHEET_MODE) -> list:
+    if not isinstance(file_path, bytes):
+        with open(file_path, 'rb') as f:
+            head = f.read(8)
+        if head.startswith(b'%PDF'):
+            return await convert_pdf(file_path, file_name, extension, output_dir, rollover)
+        if head.startswith((b'PK\x03\x04', b'\xd0\xcf\x11\xe0')):
+            file_format, names = await run_job(workbook_sheets, file_path)
+            if len(names) > 1:
+                return await convert_workbook(file_path, file_name, extension, output_dir, file_format, names, rollover, sheets)
+    return await run_job(convert_job, file_path, file_name, extension, output_dir, rollover, sheets)
+
+async def convert_to_xlsx(file_path: Path | bytes, file_name: str, output_dir: Path | None, rollover: str = XLSX_ROLLOVER, sheets: str = SHEET_MODE) -> list:
+    return await convert_file(file_path, file_name, '.xlsx', output_dir, rollover, sheets)
+
+async def convert_to_txt(file_path: Path | bytes, file_name: str, output_dir: Path | None, sheets: str = SHEET_MODE) -> list:
+    return await convert_file(file_path, file_name, '.txt', output_dir, sheets=sheets)
+
+# Ukuran buffer untuk menghitung kontak tanpa memuat seluruh file ke memori
+COUNT_BUFFER_SIZE = 4 * 1024 * 1024
+
+# Hitung baris dengan menghitung newline per blok; baris terakhir tanpa newline tetap dihitung
+def count_lines(file_path: Path | bytes) -> int:
+    if isinstance(file_path, bytes):
+        return file_path.count(b'\n') + (not file_path.endswith(b'\n') and len(file_path) > 0)
+    lines = 0
+    last_byte = b'\n'
+    with open(file_path, 'rb', buffering=0) as f:
+        while chunk := f.read(COUNT_BUFFER_SIZE):
+            lines += chunk.count(b'\n')
+            last_byte = chunk[-1:]
+    if last_byte != b'\n':
+        lines += 1
+    return lines
+
+# Awal satu kontak VCF, tidak peka huruf besar/kecil seperti VCF_TEL_PATTERN dan detect_format
+VCF_CARD_PATTERN = re.compile(rb'BEGIN:VCARD', re.IGNORECASE)
+
+# Hitung kemunculan pola (teks biasa, tanpa karakter khusus regex) secara streaming, dengan sisa blok sebelumnya
+# agar pola yang terpotong tetap terhitung
+def count_pattern(file_path: Path | bytes, pattern: re.Pattern) -> int:
+    if isinstance(file_path, bytes):
+        return len(pattern.findall(file_path))
+    count = 0
+    tail = b''
+    with open(file_path, 'rb', buffering=0) as f:
+        while chunk := f.read(COUNT_BUFFER_SIZE):
+            data = tail + chunk
+            count += len(pattern.findall(data))
+            tail = data[-(len(pattern.pattern) - 1):]
+    return count
+
+# Jumlah baris data (tanpa header), dihitung sama seperti pembaca konversi: baris kosong dilewati
+def count_rows(rows) -> int:
+    return max(sum(1 for _ in non_empty_rows(rows)) - 1, 0)
+
+# Baris di-stream tanpa membuat DataFrame. Dimensi sheet (<dimension>) tidak dipakai karena ikut menghitung
+# baris kosong dan sel yang hanya diberi format
+def count_worksheet_rows(ws) -> int:
+    ws.reset_dimensions()
+    return count_rows(ws.iter_rows(values_only=True))
+
+# (nama sheet, jumlah baris data) untuk setiap sheet
+def count_xlsx_sheets(file_path: Path | bytes) -> list:
+    wb = openpyxl.load_workbook(source_file(file_path), read_only=True, data_only=True)
+    try:
+        return [(ws.title, count_worksheet_rows(ws)) for ws in wb.worksheets]
+    finally:
+        wb.close()
+
+def count_xls_sheets(file_path: Path | bytes) -> list:
+    book = open_xls(file_path)
+    try:
+        sheets = []
+        for index in range(book.nsheets):
+            ws = book.sheet_by_index(index)
+            # row_values mengembalikan '' untuk sel kosong, jadi baris kosong dilewati seperti di read_xls_chunks
+            sheets.append((ws.name, count_rows(ws.row_values(row) for row in range(ws.nrows))))
+            book.unload_sheet(index)
+        return sheets
+    finally:
+        book.release_resources()
+
+def count_xlsb_sheets(file_path: Path | bytes) -> list:
+    import pyxlsb
+    sheets = []
+    with pyxlsb.open_workbook(source_file(file_path)) as wb:
+        for name in wb.sheets:
+            with wb.get_sheet(name) as ws:
+                sheets.append((name, count_rows([cell.v for cell in row] for row in ws.rows(sparse=True))))
+    return sheets
+
+ODS_TABLE_NS = 'urn:oasis:names:tc:opendocument:xmlns:table:1.0'
+ODS_OFFICE_NS = 'urn:oasis:names:tc:opendocument:xmlns:office:1.0'
+
+# content.xml di-parse secara streaming (read_ods_chunks memuat seluruh sheet, jadi tidak bisa dipakai untuk
+# pengecekan MAX_ROWS). Baris yang diulang (number-rows-repeated) dihitung sesuai jumlah ulangannya, dan baris
+# tanpa sel bernilai dilewati seperti baris kosong di pembaca lain
+def count_ods_sheets(file_path: Path | bytes) -> list:
+    table_tag = f"{{{ODS_TABLE_NS}}}table"
+    row_tag = f"{{{ODS_TABLE_NS}}}table-row"
+    sheets = []
+    rows = 0
+    parents = []
+    with zipfile.ZipFile(source_file(file_path)) as archive, archive.open('content.xml') as f:
+        for event, elem in ElementTree.iterparse(f, events=('start', 'end')):
+            if event == 'start':
+                if elem.tag == table_tag:
+                    rows = 0
+                parents.append(elem)
+                continue
+            parents.pop()
+            if elem.tag == row_tag:
+                if any(cell.get(f"{{{ODS_OFFICE_NS}}}value-type") is not None for cell in elem):
+                    rows += int(elem.get(f"{{{ODS_TABLE_NS}}}number-rows-repeated", 1))
+                # Baris yang sudah dihitung dibuang agar memori tidak bertambah seiring jumlah baris
+                parents[-1].remove(elem)
+            elif elem.tag == table_tag:
+                sheets.append((elem.get(f"{{{ODS_TABLE_NS}}}name"), max(rows - 1, 0)))
+                parents[-1].remove(elem)
+    return sheets
+
+# Jumlah baris hasil pd.read_xml (setiap anak langsung elemen root), dihitung secara streaming
+def count_xml_rows(file_path: Path | bytes) -> int:
+    rows = 0
+    parents = []
+    for event, elem in ElementTree.iterparse(source_file(file_path), events=('start', 'end')):
+        if event == 'start':
+            parents.append(elem)
+            continue
+        parents.pop()
+        if len(parents) == 1:
+            rows += 1
+            parents[0].remove(elem)
+    return rows
+
+# Perkiraan jumlah baris tabel pdf dari jumlah baris teks per halaman, tanpa satu baris header. Jauh lebih murah
+# daripada ekstraksi tabel, tapi biasanya sedikit lebih besar karena judul dan header di setiap halaman ikut terhitung
+def estimate_pdf_rows(file_path: Path | bytes) -> int:
+    rows = 0
+    with pdfplumber.open(source_file(file_path)) as pdf:
+        for page in pdf.pages:
+            rows += len(page.extract_text_lines())
+            page.close()
+    return max(rows - 1, 0)
+
+# Penghitung baris per sheet untuk setiap format workbook
+SHEET_COUNTERS = {
+    'xlsx': count_xlsx_sheets,
+    'xls': count_xls_sheets,
+    'xlsb': count_xlsb_sheets,
+    'ods': count_ods_sheets,
+}
+
+def count_contacts(file_path: Path | bytes, file_name: str) -> int:
+    if file_name.endswith('.txt'):
+        return count_lines(file_path)
+    if file_name.endswith('.csv'):
+        return max(count_lines(file_path) - 1, 0)  # Tanpa baris header
+    if file_name.endswith('.vcf'):
+        return count_pattern(file_path, VCF_CARD_PATTERN)
+    return count_job(file_path, file_name)['count']
+
+# Hasil /jumlah: total kontak, rincian per sheet (hanya untuk workbook dengan lebih dari satu sheet) dan 'estimated'
+# jika jumlahnya perkiraan (pdf). Selain txt, csv dan vcf, format dideteksi dari isi file seperti saat konversi
+def count_job(file_path: Path | bytes, file_name: str) -> dict:
+    if file_name.endswith(('.txt', '.csv', '.vcf')):
+        return {'count': count_contacts(file_path, file_name), 'sheets': []}
+    try:
+        file_format = detect_format(file_path)
+    except ValueError:
+        return {'count': 0, 'sheets': []}
+    if file_format in SHEET_COUNTERS:
+        sheets = SHEET_COUNTERS[file_format](file_path)
+        return {'count': sum(count for _, count in sheets), 'sheets': sheets if len(sheets) > 1 else []}
+    if file_format == 'xml':
+        return {'count': count_xml_rows(file_path), 'sheets': []}
+    if file_format == 'pdf':
+        return {'count': estimate_pdf_rows(file_path), 'sheets': [], 'estimated': True}
+    return {'count': count_contacts(file_path, f"{file_name}.{file_format}"), 'sheets': []}
+
+# Batas ukuran satu arsip ZIP hasil /pecah sebelum pindah ke arsip berikutnya (batas upload bot Telegram 50 MB)
+SPLIT_ZIP_MAX_BYTES = int(os.getenv('SPLIT_ZIP_MAX_BYTES', 45 * 1024 * 1024))
+
+# Tujuan penulisan file bagian: langsung di-stream ke dalam satu atau beberapa arsip ZIP di output
+class PartArchives:
+    def __init__(self, base_name: str, output, max_bytes: int = SPLIT_ZIP_MAX_BYTES):
+        self.base_name = base_name
+        self.output = output
+        self.max_bytes = max_bytes
+        self.names = []
+        self.fp = None
+        self.zf = None
+        self.entries = 0
+
+    def _next_archive(self):
+        self._close_archive()
+        name = f"{self.base_name} {len(self.names) + 1}.zip"
+        self.names.append(name)
+        self.fp = self.output.open(name)
+        self.zf = zipfile.ZipFile(self.fp, 'w', allowZip64=True)
+        self.entries = 0
+
+    def _close_archive(self):
+        if self.zf is not None:
+            self.zf.close()
+            self.fp.close()
+            self.zf = None
+
+    def open(self, name: str):
+        if self.zf is None or (self.entries and self.fp.tell() >= self.max_bytes):
+            self._next_archive()
+        self.entries += 1
+        info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+        # xlsx sudah terkompresi, jadi cukup disimpan tanpa kompresi ulang
+        info.compress_type = zipfile.ZIP_STORED if name.endswith('.xlsx') else zipfile.ZIP_DEFLATED
+        return self.zf.open(info, 'w', force_zip64=True)
+
+    def close(self) -> list:
+        self._close_archive()
+        # Jika hanya ada satu arsip, beri nama tanpa nomor urut
+        if len(self.names) == 1:
+            self.output.rename(self.names[0], f"{self.base_name}.zip")
+        return self.output.close()
+
+    def abort(self) -> None:
+        if self.zf is not None:
+            self.fp.close()
+            self.zf = None
+        self.output.abort()
+
+# Pecah file txt secara streaming: baca per baris dan ganti file bagian setiap N baris
+def split_txt(file_path: Path | bytes, base_name: str, num_per_file: int, parts) -> int:
+    part_count = 0
+
+    with open_source(file_path) as f:
+        for first_line in f:
+            part_count += 1
+            with parts.open(f"{base_name} {part_count}.txt") as part_file:
+                part_file.write(first_line)
+                part_file.writelines(islice(f, num_per_file - 1))
+
+    return part_count
+
+def xlsx_sheet_rows(ws):
+    return (row for row in ws.iter_rows(values_only=True) if any(cell is not None for cell in row))
+
+# Baris semua sheet di bawah satu header gabungan; baris dari sheet dengan header berbeda disusun ulang menurut nama kolom
+def concat_sheet_rows(sheets: list):
+    headers = [next(rows, None) for rows in sheets]
+    columns = union_columns(header for header in headers if header is not None)
+    if not columns:
+        return
+    yield tuple(columns)
+    for header, rows in zip(headers, sheets):
+        if header is None:
+            continue
+        if list(header) == columns:
+            yield from rows
+            continue
+        positions = [header.index(column) if column in header else None for column in columns]
+        for row in rows:
+            yield tuple(row[position] if position is not None and position < len(row) else None for position in positions)
+
+def split_xlsx_rows(rows, base_name: str, num_per_file: int, parts) -> int:
+    part_count = 0
+    header = next(rows, None)
+    if header is None:
+        return part_count
+
+    for first_row in rows:
+        part_count += 1
+        part_wb = openpyxl.Workbook(write_only=True)
+        part_ws = part_wb.create_sheet()
+        part_ws.append(header)
+        part_ws.append(first_row)
+        sheet_rows = 2
+        for row in islice(rows, num_per_file - 1):
+            # Bagian yang melebihi batas baris Excel dilanjutkan di sheet berikutnya
+            if sheet_rows >= EXCEL_MAX_ROWS:
+                part_ws = part_wb.create_sheet()
+                part_ws.append(header)
+                sheet_rows = 1
+            part_ws.append(row)
+            sheet_rows += 1
+        with parts.open(f"{base_name} {part_count}.xlsx") as part_file:
+            part_wb.save(part_file)
+
+    return part_count
+
+# Pecah file xlsx secara streaming: baca baris dengan mode read-only dan tulis dengan mode write-only.
+# Semua sheet dipecah sebagai satu rangkaian baris ('gabung'), atau masing-masing dengan nama sheet-nya ('pisah')
+def split_xlsx(file_path: Path | bytes, base_name: str, num_per_file: int, parts, sheets: str = SHEET_MODE, sheet: str | None = None) -> int:
+    wb = openpyxl.load_workbook(source_file(file_path), read_only=True, data_only=True)
+    try:
+        worksheets = [wb[sheet]] if sheet is not None else wb.worksheets
+        if sheets == 'pisah' and len(worksheets) > 1:
+            return sum(split_xlsx_rows(xlsx_sheet_rows(ws), sheet_stem(base_name, ws.title), num_per_file, parts) for ws in worksheets)
+        return split_xlsx_rows(concat_sheet_rows([xlsx_sheet_rows(ws) for ws in worksheets]), base_name, num_per_file, parts)
+    finally:
+        wb.close()
+
+# Mengembalikan (jumlah bagian, daftar file yang harus dikirim); bagian dibuat di memori jika output_dir None.
+# Jika sheet diisi, hanya sheet itu yang dipecah dan nama bagiannya diberi nama sheet
+def split_file_job(file_path: Path | bytes, file_name: str, num_per_file: int, output_dir: Path | None, as_zip: bool = False, sheets: str = SHEET_MODE, sheet: str | None = None) -> tuple:
+    output = PartFiles(output_dir) if output_dir is not None else MemoryFiles()
+    base_name = Path(file_name).stem
+    if sheet is not None:
+        base_name = sheet_stem(base_name, sheet)
+    parts = PartArchives(base_name, output) if as_zip else output
+    part_count = 0
+    try:
+        if file_name.endswith('.txt'):
+            part_count = split_txt(file_path, base_name, num_per_file, parts)
+        elif file_name.endswith('.xlsx'):
+            part_count = split_xlsx(file_path, base_name, num_per_file, parts, sheets, sheet)
+    except BaseException:
+        parts.abort()
+        raise
+    return part_count, parts.close()
+
+# Workbook di disk dengan mode 'pisah' dipecah per sheet secara paralel, masing-masing oleh worker sendiri
+async def split_document(file_path: Path | bytes, file_name: str, num_per_file: int, output_dir: Path | None, as_zip: bool = False, sheets: str = SHEET_MODE) -> tuple:
+    if sheets == 'pisah' and file_name.endswith('.xlsx') and not isinstance(file_path, bytes):
+        _, names = await run_job(workbook_sheets, file_path)
+        if len(names) > 1:
+            results = await asyncio.gather(*(
+                run_job(split_file_job, file_path, file_name, num_per_file, output_dir, as_zip, sheets, sheet)
+                for sheet in names
+            ))
+            return sum(part_count for part_count, _ in results), [file for _, files in results for file in files]
+    return await run_job(split_file_job, file_path, file_name, num_per_file, output_dir, as_zip, sheets)
+
+# Jumlah baris CSV / ukuran blok VCF yang diproses sekaligus, dan ukuran buffer penulisan output
+SISA_CHUNK_ROWS = int(os.getenv('SISA_CHUNK_ROWS', 200000))
+VCF_BLOCK_SIZE = 8 * 1024 * 1024
+
+PHONE_COLUMNS = ('NOMOR', '+NOMOR')
+VCF_TEL_PATTERN = re.compile(r'^(?:[\w-]+\.)?TEL[^:\r\n]*:([^\r\n]*)', re.MULTILINE | re.IGNORECASE)
+
+# Normalisasi nomor secara vektor: 08..., 8..., 0062... dan +62... menjadi satu bentuk sesuai NOMOR_FORMAT
+def normalize_numbers(numbers: pd.Series) -> pd.Series:
+    numbers = numbers.dropna().astype(str).str.strip()
+    if NOMOR_FORMAT == 'asli':
+        numbers = numbers.str.replace(r'[^\d+]', '', regex=True)
+        return numbers[numbers != '']
+
+    local = ~numbers.str.startswith(('+', '00'))
+    digits = numbers.str.replace(r'\D', '', regex=True)
+    digits = digits.mask(numbers.str.startswith('00'), digits.str[2:])
+    digits = digits.mask(local & digits.str.startswith('0'), '62' + digits.str[1:])
+    digits = digits.mask(local & digits.str.startswith('8'), '62' + digits)
+    digits = digits[digits != '']
+
+    if NOMOR_FORMAT == '62':
+        return digits
+    if NOMOR_FORMAT == '0':
+        indonesian = digits.str.startswith('62')
+        return ('0' + digits.str[2:]).where(indonesian, '+' + digits)
+    return '+' + digits
+
+# Baca hanya kolom nomor dari csv atau txt (tab), per potongan dan sebagai string (agar angka 0 di depan tidak
+# hilang). Tanpa kolom nomor, file satu kolom dianggap daftar nomor tanpa header (misalnya hasil /sisa)
+def iter_text_numbers(file_path: Path | bytes, sep: str = ','):
+    columns = pd.read_csv(source_file(file_path), sep=sep, nrows=0).columns
+    phone_column = next((column for column in PHONE_COLUMNS if column in columns), None)
+    if phone_column is not None:
+        chunks = pd.read_csv(source_file(file_path), sep=sep, usecols=[phone_column], dtype=str, chunksize=SISA_CHUNK_ROWS)
+    elif len(columns) == 1:
+        phone_column = 0
+        chunks = pd.read_csv(source_file(file_path), sep=sep, header=None, usecols=[0], dtype=str, chunksize=SISA_CHUNK_ROWS)
+    else:
+        raise ValueError("File tidak memiliki kolom 'NOMOR' atau '+NOMOR'")
+
+    for chunk in chunks:
+        yield chunk[phone_column]
+
+# Ambil nilai baris TEL dari VCF per blok besar dengan pola yang sudah dikompilasi
+def iter_vcf_numbers(file_path: Path | bytes):
+    remainder = ''
+    with io.TextIOWrapper(open_source(file_path), encoding='utf-8', errors='replace') as vcf_file:
+        while True:
+            block = vcf_file.read(VCF_BLOCK_SIZE)
+            if not block:
+                if remainder:
+                    yield pd.Series(VCF_TEL_PATTERN.findall(remainder), dtype=str)
+                break
+            block = remainder + block
+            cut = block.rfind('\n') + 1
+            remainder = block[cut:]
+            yield pd.Series(VCF_TEL_PATTERN.findall(block, 0, cut), dtype=str)
+
+# Ekstrak nomor dari satu file secara streaming ke numbers_path (atau ke memori jika None),
+# mengembalikan (jumlah kontak, file nomor)
+def extract_numbers_job(file_path: Path | bytes, file_name: str, numbers_path: Path | None) -> tuple:
+    suffix = os.path.splitext(file_name)[1]
+    if suffix == '.csv':
+        chunks = iter_text_numbers(file_path)
+    elif suffix == '.vcf':
+        chunks = iter_vcf_numbers(file_path)
+    else:
+        raise ValueError("Format file tidak didukung untuk konversi di perintah /sisa")
+
+    output = PartFiles(numbers_path.parent) if numbers_path is not None else MemoryFiles()
+    contacts_count = 0
+    try:
+        with io.TextIOWrapper(output.open(numbers_path.name if numbers_path is not None else 'nomor.txt'), encoding='utf-8', newline='') as f:
+            for numbers in chunks:
+                numbers = normalize_numbers(numbers)
+                if len(numbers):
+                    f.write('\n'.join(numbers))
+                    f.write('\n')
+                    contacts_count += len(numbers)
+    except BaseException:
+        output.abort()
+        raise
+    return contacts_count, output.close()[0]
+
+def merge_files_job(file_paths: list, new_file_path: Path) -> None:
+    with open(new_file_path, 'wb') as f:
+        for file_path in file_paths:
+            if isinstance(file_path, MemoryFile):
+                f.write(file_path.data)
+                continue
+            with open(file_path, 'rb') as part_file:
+                shutil.copyfileobj(part_file, f, 1024 * 1024)
+
+# Format lain dibaca lewat READERS seperti saat konversi (setiap sheet workbook), lalu hanya kolom nomornya yang
+# diambil. Angka yang terbaca sebagai float (kolom dengan sel kosong) dikembalikan ke int sebelum dijadikan string
+def iter_table_numbers(file_path: Path | bytes, file_format: str):
+    if file_format in WORKBOOK_FORMATS:
+        sheets = read_sheets(file_path, file_format)
+    else:
+        sheets = [(None, READERS[file_format](file_path))]
+    phone_sheets = 0
+    for _, chunks in sheets:
+        phone_column = None
+        for chunk in chunks:
+            if phone_column is None:
+                phone_column = next((column for column in PHONE_COLUMNS if column in chunk.columns), None)
+                if phone_column is None:
+                    break  # Sheet tanpa kolom nomor dilewati
+                phone_sheets += 1
+            yield chunk[phone_column].dropna().map(integral_value).astype(str)
+    if not phone_sheets:
+        raise ValueError(f"File {file_format} tidak memiliki kolom 'NOMOR' atau '+NOMOR'")
+
+# Nomor dari file apa pun yang bisa dikonversi; format ditentukan dari isi file dengan detect_format
+def iter_numbers(file_path: Path | bytes, file_format: str):
+    if file_format == 'vcf':
+        return iter_vcf_numbers(file_path)
+    if file_format in ('csv', 'txt'):
+        return iter_text_numbers(file_path, ',' if file_format == 'csv' else '\t')
+    if file_format in READERS:
+        return iter_table_numbers(file_path, file_format)
+    raise ValueError("Format file tidak didukung untuk perintah /gabung")
+
+# Index nomor untuk /gabung: setiap nomor disimpan sebagai hash uint64 (8 byte per nomor) di array numpy terurut.
+# Seperti LSM tree, hash baru masuk sebagai level kecil yang sudah terurut dan level yang ukurannya berdekatan
+# digabung, jadi penambahan tidak perlu mengurutkan ulang seluruh index dan pencarian cukup searchsorted per level.
+class NumberIndex:
+    def __init__(self):
+        self.levels = []
+
+    def __len__(self) -> int:
+        return sum(level.size for level in self.levels)
+
+    # Tambahkan hash satu potongan data, mengembalikan mask nomor yang baru pertama kali muncul (urutan asli tetap)
+    def add(self, hashes):
+        unique, first = np.unique(hashes, return_index=True)
+        new = np.ones(unique.size, dtype=bool)
+        for level in self.levels:
+            positions = np.minimum(np.searchsorted(level, unique), level.size - 1)
+            new &= level[positions] != unique
+
+        mask = np.zeros(hashes.size, dtype=bool)
+        mask[first[new]] = True
+        if new.any():
+            self.levels.append(unique[new])
+            while len(self.levels) > 1 and self.levels[-2].size <= 2 * self.levels[-1].size:
+                merged = np.concatenate((self.levels.pop(-2), self.levels.pop()))
+                merged.sort(kind='stable')  # Gabungan dua array terurut: timsort cukup satu kali merge
+                self.levels.append(merged)
+        return mask
+
+def hash_numbers(numbers: pd.Series):
+    return pd.util.hash_pandas_object(numbers, index=False).to_numpy()
+
+# Gabungkan nomor dari beberapa file (dinormalisasi seperti /sisa) ke satu daftar tanpa duplikat; kemunculan
+# pertama yang dipertahankan. Mengembalikan (statistik per file, file hasil); hasil dibuat di memori jika output_dir None.
+def merge_numbers_job(sources: list, output_dir: Path | None, name: str) -> tuple:
+    index = NumberIndex()
+    output = PartFiles(output_dir) if output_dir is not None else MemoryFiles()
+    stats = []
+    try:
+        with io.TextIOWrapper(output.open(name), encoding='utf-8', newline='') as f:
+            for file_path, file_name in sources:
+                file_stats = {'name': file_name, 'total': 0, 'unique': 0}
+                stats.append(file_stats)
+                try:
+                    for numbers in iter_numbers(file_path, detect_format(file_path)):
+                        numbers = normalize_numbers(numbers)
+                        if not len(numbers):
+                            continue
+                        new_numbers = numbers.to_numpy()[index.add(hash_numbers(numbers))]
+                        if len(new_numbers):
+                            f.write('\n'.join(new_numbers))
+                            f.write('\n')
+                        file_stats['total'] += len(numbers)
+                        file_stats['unique'] += len(new_numbers)
+                except Exception as e:
+                    # File yang tidak bisa dibaca dilaporkan per file, file lain tetap digabung
+                    file_stats['error'] = str(e)
+    except BaseException:
+        output.abort()
+        raise
+    logger.info(f"Index /gabung: {len(index)} nomor unik dalam {len(index.levels)} level")
+    return stats, output.close()[0]
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     try:
-        manage_cache()
         username = update.message.from_user.username
         if username not in allowed_usernames:
             await update.message.reply_text(f"{username} tidak diizinkan menggunakan bot ini. Hubungi @KazuhaID0 untuk meminta izin.")
@@ -140,7 +2551,11 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             "/pecah - Untuk memecah file menjadi beberapa bagian\n"
             "/excel - Untuk mengubah format file menjadi .xlsx\n"
             "/text - Untuk mengubah format file menjadi .txt\n"
-            "/sisa - Untuk mengubah file CSV menjadi .txt\n\n"
+            "/sisa - Untuk mengubah file CSV menjadi .txt\n"
+            "/gabung - Untuk menggabungkan beberapa file dan menghapus nomor duplikat\n"
+            "/batal - Untuk membatalkan proses yang sedang berjalan atau menunggu\n\n"
+            "Workbook dengan beberapa sheet digabung menjadi satu hasil. Tambahkan 'pisah' (contoh: /excel pisah) "
+            "agar setiap sheet menjadi file tersendiri.\n\n"
             "Dibuat oleh @KazuhaID0"
         )
         
@@ -149,9 +2564,14 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         logger.error(f"Error in start command: {e}")
         await update.message.reply_text(f"Terjadi kesalahan: {e}")
 
+# "pisah" atau "gabung" di argumen /excel, /text dan /pecah menentukan cara memproses workbook dengan beberapa sheet
+def read_sheet_mode(context: ContextTypes.DEFAULT_TYPE) -> None:
+    for arg in context.args or []:
+        if arg.lower() in SHEET_MODES:
+            context.user_data['sheet_mode'] = arg.lower()
+
 async def pecah(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     try:
-        manage_cache()
         username = update.message.from_user.username
         if username not in allowed_usernames:
             await update.message.reply_text(f"{username} tidak diizinkan menggunakan bot ini. Hubungi @KazuhaID0 untuk meminta izin.")
@@ -160,6 +2580,8 @@ async def pecah(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         # Bersihkan data terkait perintah lain yang mungkin ada di user_data
         context.user_data.clear()
 
+        read_sheet_mode(context)
+
         await update.message.reply_text("Silakan kirim file txt atau xlsx yang ingin Anda pecah.")
         context.user_data['waiting_for'] = 'split'
     except Exception as e:
@@ -168,7 +2590,6 @@ async def pecah(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
 async def jumlah(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     try:
-        manage_cache()
         username = update.message.from_user.username
         if username not in allowed_usernames:
             await update.message.reply_text(f"{username} tidak diizinkan menggunakan bot ini. Hubungi @KazuhaID0 untuk meminta izin.")
@@ -177,17 +2598,16 @@ async def jumlah(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         # Bersihkan data terkait perintah lain yang mungkin ada di user_data
         context.user_data.clear()
 
-        await update.message.reply_text("Silakan kirim file txt atau xlsx yang ingin Anda cek jumlahnya. Ketik /done setelah semua file dikirim.")
+        await update.message.reply_text("Silakan kirim file txt, csv, xlsx atau vcf yang ingin Anda cek jumlahnya. Ketik /done setelah semua file dikirim.")
         context.user_data['waiting_for'] = 'count'
         context.user_data['total_contacts'] = 0  # Untuk menyimpan jumlah total kontak dari semua file
-        context.user_data['file_paths'] = []  # Untuk menyimpan file yang sudah diterima
+        context.user_data['files'] = []  # Untuk menyimpan file yang sudah diterima
     except Exception as e:
         logger.error(f"Error in jumlah command: {e}")
         await update.message.reply_text(f"Terjadi kesalahan: {e}")
 
 async def excel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     try:
-        manage_cache()
         username = update.message.from_user.username
         if username not in allowed_usernames:
             await update.message.reply_text(f"{username} tidak diizinkan menggunakan bot ini. Hubungi @KazuhaID0 untuk meminta izin.")
@@ -195,6 +2615,12 @@ async def excel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
         context.user_data.clear()  # Bersihkan data sebelumnya
 
+        # "/excel file" memecah hasil yang melebihi batas baris Excel ke file baru, "/excel sheet" ke sheet baru
+        for arg in context.args or []:
+            if arg.lower() in ('sheet', 'file'):
+                context.user_data['xlsx_rollover'] = arg.lower()
+        read_sheet_mode(context)
+
         await update.message.reply_text("Silakan kirim file yang ingin Anda ubah formatnya ke .xlsx.")
         context.user_data['waiting_for'] = 'convert'
     except Exception as e:
@@ -203,13 +2629,13 @@ async def excel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
 async def text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     try:
-        manage_cache()
         username = update.message.from_user.username
         if username not in allowed_usernames:
             await update.message.reply_text(f"{username} tidak diizinkan menggunakan bot ini. Hubungi @KazuhaID0 untuk meminta izin.")
             return
 
         context.user_data.clear()  # Bersihkan data sebelumnya
+        read_sheet_mode(context)
 
         await update.message.reply_text("Silakan kirim file yang ingin Anda ubah formatnya ke .txt.")
         context.user_data['waiting_for'] = 'convert_to_txt'
@@ -219,7 +2645,6 @@ async def text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
 async def sisa(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     try:
-        manage_cache()
         username = update.message.from_user.username
         if username not in allowed_usernames:
             await update.message.reply_text(f"{username} tidak diizinkan menggunakan bot ini. Hubungi @KazuhaID0 untuk meminta izin.")
@@ -234,6 +2659,46 @@ async def sisa(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         logger.error(f"Error in sisa command: {e}")
         await update.message.reply_text(f"Terjadi kesalahan: {e}")
 
+# /batal diproses di luar urutan update per pengguna (lihat UserOrderedUpdateProcessor), jadi bisa menghentikan job yang sedang berjalan
+async def batal(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    try:
+        username = update.message.from_user.username
+        if username not in allowed_usernames:
+            await update.message.reply_text(f"{username} tidak diizinkan menggunakan bot ini. Hubungi @KazuhaID0 untuk meminta izin.")
+            return
+
+        cancelled = await scheduler.cancel(update.effective_user.id)
+        if QUEUE_MODE == 'queue':
+            cancelled += await asyncio.to_thread(job_queue.cancel, update.effective_user.id)
+        waiting_for = context.user_data.get('waiting_for')
+        context.user_data.clear()
+
+        if cancelled:
+            await update.message.reply_text("Proses dibatalkan dan file sementara sudah dihapus.")
+        elif waiting_for:
+            await update.message.reply_text("Perintah dibatalkan.")
+        else:
+            await update.message.reply_text("Tidak ada proses yang sedang berjalan.")
+    except Exception as e:
+        logger.error(f"Error in batal command: {e}")
+        await update.message.reply_text(f"Terjadi kesalahan: {e}")
+
+async def gabung(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    try:
+        username = update.message.from_user.username
+        if username not in allowed_usernames:
+            await update.message.reply_text(f"{username} tidak diizinkan menggunakan bot ini. Hubungi @KazuhaID0 untuk meminta izin.")
+            return
+
+        # Reset previous commands
+        context.user_data.clear()
+
+        await update.message.reply_text("Silakan kirim file txt, csv, xlsx atau vcf yang ingin digabung. Nomor yang sama hanya diambil sekali. Ketik /done setelah semua file dikirim.")
+        context.user_data['waiting_for'] = 'gabung'
+    except Exception as e:
+        logger.error(f"Error in gabung command: {e}")
+        await update.message.reply_text(f"Terjadi kesalahan: {e}")
+
 async def handle_file(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     try:
         waiting_for = context.user_data.get('waiting_for')
@@ -242,19 +2707,26 @@ async def handle_file(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
             await update.message.reply_text("Silakan masukkan perintah terlebih dahulu sebelum mengirimkan file.")
             return
 
-        manage_cache()
         username = update.message.from_user.username
         if username not in allowed_usernames:
             await update.message.reply_text(f"{username} tidak diizinkan menggunakan bot ini. Hubungi @KazuhaID0 untuk meminta izin.")
             return
 
-        file = await update.message.document.get_file()
-        file_name = update.message.document.file_name
-        file_path = cache_dir / file_name
-        await file.download_to_drive(file_path)
+        entry = document_entry(update.message.document)
+        file_name = entry['name']
+
+        if entry['size'] is not None and entry['size'] > MAX_FILE_SIZE:
+            await update.message.reply_text(f"File {file_name} terlalu besar ({entry['size'] / 1024 / 1024:.1f} MB). Ukuran maksimum {MAX_FILE_SIZE / 1024 / 1024:.0f} MB.")
+            return
 
-        if waiting_for in ['convert_to_txt', 'convert', 'sisa']:
-            context.user_data['file_paths'] = context.user_data.get('file_paths', []) + [file_path]
+        if waiting_for in ['convert_to_txt', 'convert', 'sisa', 'gabung']:
+            # File hanya didownload jika hasil konversinya belum ada di cache. Dokumen kecil baru didownload ke
+            # memori saat job berjalan, agar isinya tidak tertahan di user_data. Hasil /gabung bergantung pada
+            # semua file sekaligus, jadi tidak di-cache. Di mode antrean file didownload oleh worker.
+            if QUEUE_MODE == 'local' and not in_memory(entry) and (
+                    waiting_for == 'gabung' or read_result(entry['unique_id'], cache_operation(context.user_data)) is None):
+                await download_document(context.bot, entry)
+            context.user_data['files'] = context.user_data.get('files', []) + [entry]
 
             if not context.user_data.get('file_received'):
                 # Pesan hanya dikirim saat file pertama diterima
@@ -262,31 +2734,38 @@ async def handle_file(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
                 context.user_data['file_received'] = True
 
         elif waiting_for == 'split':
-            context.user_data['file_name'] = file_name
-            context.user_data['file_path'] = file_path
-            await update.message.reply_text("Berapa kontak yang ingin Anda pecah per file?")
+            # Download ditunda sampai jumlah per file diketahui, karena hasil pecahan di-cache per ukuran
+            context.user_data['file'] = entry
+            await update.message.reply_text("Berapa kontak yang ingin Anda pecah per file? Tambahkan 'zip' (contoh: 100 zip) untuk menerima semua bagian dalam arsip ZIP.")
             context.user_data['waiting_for'] = 'split_confirm'
 
         elif waiting_for == 'count':
-            contacts_count = 0
-            if file_name.endswith('.txt'):
-                with open(file_path, 'r') as f:
-                    lines = f.readlines()
-                contacts_count = len(lines)
-            elif file_name.endswith('.xlsx') or file_name.endswith('.xls'):
-                df = pd.read_excel(file_path)
-                contacts_count = len(df)
+            async with scheduler.job(update, 'jumlah') as workspace:
+                if workspace.in_memory(entry):
+                    result = await count_document(entry, await download_document(context.bot, entry, workspace))
+                else:
+                    await workspace.pin(result_entry(entry['unique_id'], COUNT_OPERATION))
+                    result = get_cached_result(entry['unique_id'], COUNT_OPERATION)
+                if result is None:
+                    file_path = await download_document(context.bot, entry, workspace)
+                    result = await count_document(entry, file_path)
+            contacts_count = result['count']
+            approx = "sekitar " if result.get('estimated') else ""
 
             context.user_data['total_contacts'] = context.user_data.get('total_contacts', 0) + contacts_count
             file_details = context.user_data.get('file_details', [])
-            file_details.append(f"Jumlah kontak {file_name}: {contacts_count}")
+            first_file = not file_details
+            file_details.append(f"Jumlah kontak {file_name}: {approx}{contacts_count}")
+            # Workbook dengan beberapa sheet juga dirinci per sheet
+            file_details.extend(f"  - Sheet {sheet}: {count}" for sheet, count in result.get('sheets', []))
             context.user_data['file_details'] = file_details
 
-            if len(file_details) == 1:
+            if first_file:
                 # Pesan hanya dikirim saat file pertama diterima
                 await update.message.reply_text(f"File telah diterima. Silakan kirim file lain atau ketik /done jika selesai.")
 
     except Exception as e:
+        metrics.record_error(e)
         logger.error(f"Error handling file: {e}")
         await update.message.reply_text(f"Terjadi kesalahan: {e}")
 
@@ -318,15 +2797,73 @@ async def done(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     elif waiting_for == 'sisa':
         await convert_files_to_sisa(update, context)
 
+    elif waiting_for == 'gabung':
+        await merge_contact_files(update, context)
+
     else:
         await update.message.reply_text("Tidak ada tindakan yang sedang berlangsung.")
 
 
 
+# Ekstrak nomor telepon dari semua file lalu gabungkan ke satu file .txt bernama options['file_name']
+async def sisa_command(bot, chat_id: int, files: list, options: dict, workspace: Workspace, reply) -> None:
+    async def extract(index, entry):
+        if workspace.in_memory(entry):
+            data = await download_document(bot, entry, workspace)
+            await check_rows(entry, data)
+            contacts_count, numbers_file = await run_job(extract_numbers_job, data, entry['name'], None)
+            return {'count': contacts_count, 'files': [numbers_file]}
+
+        await workspace.pin(result_entry(entry['unique_id'], CACHE_OPERATIONS['sisa']))
+        result = get_cached_result(entry['unique_id'], CACHE_OPERATIONS['sisa'])
+        if result is None:
+            file_path = await download_document(bot, entry, workspace)
+            await check_rows(entry, file_path)
+            numbers_path = workspace.path / f"{index}.nomor.txt"
+            contacts_count, numbers_path = await run_job(extract_numbers_job, file_path, entry['name'], numbers_path)
+            result = await store_result(entry['unique_id'], CACHE_OPERATIONS['sisa'], [numbers_path], count=contacts_count)
+        return result
+
+    # Setiap file diekstrak secara paralel; hasil per file di-cache
+    results = await asyncio.gather(*(extract(index, entry) for index, entry in enumerate(files)), return_exceptions=True)
+
+    total_contacts = 0
+    numbers_files = []
+    message_text = ""  # String untuk menyimpan semua informasi
+
+    for entry, result in zip(files, results):
+        if isinstance(result, ValueError):
+            metrics.record_error(result)
+            logger.error(f"Error reading file {entry['name']}: {result}")
+            await reply(f"File {entry['name']} tidak dapat diproses: {result}")
+            continue
+        if isinstance(result, BaseException):
+            raise result
+        total_contacts += result['count']
+        numbers_files.extend(result['files'])
+        message_text += f"File '{entry['name']}' memiliki {result['count']} kontak.\n"
+
+    if total_contacts:
+        file_name = output_stem(options['file_name']) or 'nomor'
+        if all(isinstance(numbers_file, MemoryFile) for numbers_file in numbers_files):
+            new_file_path = MemoryFile(f"{file_name}.txt", b''.join(numbers_file.data for numbers_file in numbers_files))
+        else:
+            new_file_path = workspace.path / f"{file_name}.txt"
+            await run_job(merge_files_job, numbers_files, new_file_path)
+
+        # Kirim file txt yang dihasilkan terlebih dahulu
+        await send_queue.send_document(chat_id, new_file_path)
+
+        # Tambahkan informasi akhir tentang file yang dihasilkan
+        message_text += f"\nSemua nomor telepon berhasil diubah ke format .txt dengan nama file '{file_name}.txt'. Jumlah kontak: {total_contacts}."
+
+        # Kirim pesan yang berisi semua informasi setelah file
+        await reply(message_text)
+
 async def convert_files_to_sisa(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     try:
-        file_paths = context.user_data.get('file_paths', [])
-        if not file_paths:
+        files = context.user_data.get('files', [])
+        if not files:
             await update.message.reply_text("Tidak ada file CSV atau VCF yang ditemukan untuk dikonversi.")
             return
 
@@ -335,195 +2872,231 @@ async def convert_files_to_sisa(update: Update, context: ContextTypes.DEFAULT_TY
             context.user_data['waiting_for'] = 'file_name'
             return
 
-        all_numbers = []
-        total_contacts = 0
-        message_text = ""  # String untuk menyimpan semua informasi
+        await submit_job(update, context, 'sisa', files)
 
-        for file_path in file_paths:
-            try:
-                if file_path.suffix == '.csv':
-                    df = pd.read_csv(file_path)
-                    if 'NOMOR' in df.columns:
-                        numbers = df['NOMOR'].dropna().astype(str).tolist()
-                    elif '+NOMOR' in df.columns:  
-                        numbers = df['+NOMOR'].dropna().astype(str).tolist()
-                    else:
-                        raise ValueError("File CSV tidak memiliki kolom 'NOMOR' atau '+NOMOR'")
-                
-                elif file_path.suffix == '.vcf':
-                    # Parse VCF file to extract phone numbers
-                    numbers = []
-                    with open(file_path, 'r', encoding='utf-8') as vcf_file:
-                        for line in vcf_file:
-                            # Look for lines that contain phone numbers
-                            if line.startswith("TEL"):
-                                phone_number = re.search(r'(\+?\d+)', line)
-                                if phone_number:
-                                    numbers.append(phone_number.group(1))
+        context.user_data['files'] = []
+        context.user_data['waiting_for'] = None
 
-                else:
-                    raise ValueError("Format file tidak didukung untuk konversi di perintah /sisa")
+    except Exception as e:
+        metrics.record_error(e)
+        logger.error(f"Error converting files to TXT: {e}")
+        await update.message.reply_text(f"Terjadi kesalahan saat mengonversi file: {e}")
 
-                contacts_count = len(numbers)
-                total_contacts += contacts_count
-                all_numbers.extend(numbers)
-                message_text += f"File '{file_path.name}' memiliki {contacts_count} kontak.\n"
 
-            except ValueError as e:
-                logger.error(f"Error reading file {file_path}: {e}")
-                await update.message.reply_text(f"File {file_path.name} tidak dapat diproses: {e}")
 
-        if all_numbers:
-            file_name = context.user_data['file_name']
-            new_file_path = cache_dir / f"{file_name}.txt"
-            with open(new_file_path, 'w') as f:
-                for number in all_numbers:
-                    f.write(number + '\n')
+# Gabungkan nomor dari semua file ke satu file .txt bernama options['file_name'], nomor yang sama hanya diambil sekali
+async def gabung_command(bot, chat_id: int, files: list, options: dict, workspace: Workspace, reply) -> None:
+    sources = await asyncio.gather(*(download_document(bot, entry, workspace) for entry in files))
+    for source, entry in zip(sources, files):
+        await check_rows(entry, source)
+    file_name = output_stem(options['file_name']) or 'gabungan'
+    # Jika semua file kecil dan muat di anggaran memori, hasil gabungan juga dibuat di memori
+    output_dir = None if all(isinstance(source, bytes) for source in sources) else workspace.path
+    stats, merged_file = await run_job(merge_numbers_job, [(source, entry['name']) for source, entry in zip(sources, files)],
+                                       output_dir, f"{file_name}.txt")
+
+    message_text = ""
+    for file_stats in stats:
+        if 'error' in file_stats:
+            message_text += f"File '{file_stats['name']}' tidak dapat diproses: {file_stats['error']}\n"
+            continue
+        duplicates = file_stats['total'] - file_stats['unique']
+        message_text += f"File '{file_stats['name']}': {file_stats['total']} nomor, {file_stats['unique']} unik, {duplicates} duplikat.\n"
+
+    total_numbers = sum(file_stats['total'] for file_stats in stats)
+    unique_numbers = sum(file_stats['unique'] for file_stats in stats)
+    if unique_numbers:
+        await send_queue.send_document(chat_id, merged_file)
+        message_text += (f"\nSemua nomor digabung ke file '{file_name}.txt'. Jumlah nomor unik: {unique_numbers}, "
+                         f"duplikat yang dihapus: {total_numbers - unique_numbers}.")
+    else:
+        message_text += "\nTidak ada nomor yang dapat digabung."
+    await reply(message_text)
 
-            # Kirim file txt yang dihasilkan terlebih dahulu
-            await context.bot.send_document(chat_id=update.effective_chat.id, document=open(new_file_path, 'rb'))
+async def merge_contact_files(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    try:
+        files = context.user_data.get('files', [])
+        if not files:
+            await update.message.reply_text("Tidak ada file yang ditemukan untuk digabung.")
+            return
 
-            # Tambahkan informasi akhir tentang file yang dihasilkan
-            message_text += f"\nSemua nomor telepon berhasil diubah ke format .txt dengan nama file '{file_name}.txt'. Jumlah kontak: {total_contacts}."
+        if 'file_name' not in context.user_data:
+            await update.message.reply_text("Silakan masukkan nama file output yang diinginkan (tanpa ekstensi .txt):")
+            context.user_data['waiting_for'] = 'gabung_file_name'
+            return
 
-            # Kirim pesan yang berisi semua informasi setelah file
-            await update.message.reply_text(message_text)
+        await submit_job(update, context, 'gabung', files)
 
-        context.user_data['file_paths'] = []
+        context.user_data['files'] = []
         context.user_data['waiting_for'] = None
 
     except Exception as e:
-        logger.error(f"Error converting files to TXT: {e}")
-        await update.message.reply_text(f"Terjadi kesalahan saat mengonversi file: {e}")
+        metrics.record_error(e)
+        logger.error(f"Error merging files: {e}")
+        await update.message.reply_text(f"Terjadi kesalahan saat menggabungkan file: {e}")
+
+# Ambil hasil konversi dari cache, atau download dan konversi lalu simpan ke cache.
+# Dokumen kecil dikonversi di memori dan hasilnya tidak di-cache.
+async def convert_cached(bot, entry: dict, operation: str, converter, workspace: Workspace) -> dict:
+    if workspace.in_memory(entry):
+        data = await download_document(bot, entry, workspace)
+        await check_rows(entry, data)
+        return {'files': await converter(data, entry['name'], None)}
+
+    await workspace.pin(result_entry(entry['unique_id'], operation))
+    result = get_cached_result(entry['unique_id'], operation)
+    if result is None:
+        file_path = await download_document(bot, entry, workspace)
+        await check_rows(entry, file_path)
+        new_file_paths = await converter(file_path, entry['name'], workspace.path)
+        result = await store_result(entry['unique_id'], operation, new_file_paths, stem=file_path.stem)
+    return result
+
+# Konversi semua file ke .xlsx (options['waiting_for'] == 'convert') atau .txt ('convert_to_txt')
+async def convert_command(bot, chat_id: int, files: list, options: dict, workspace: Workspace, reply) -> None:
+    sheets = options.get('sheet_mode', SHEET_MODE)
+    if options['waiting_for'] == 'convert':
+        extension = '.xlsx'
+        converter = functools.partial(convert_to_xlsx, rollover=options.get('xlsx_rollover', XLSX_ROLLOVER), sheets=sheets)
+    else:
+        extension = '.txt'
+        converter = functools.partial(convert_to_txt, sheets=sheets)
+
+    successful_files = []
+    successful_names = []
+    failed_files = []
+
+    for entry in files:
+        try:
+            result = await convert_cached(bot, entry, cache_operation(options), converter, workspace)
+            successful_files.extend(result['files'])
+            successful_names.extend(result_filenames(result, Path(entry['name']).stem))
+        except ValueError as e:
+            metrics.record_error(e)
+            failed_files.append((entry['name'], str(e)))
 
+    await send_queue.send_documents(chat_id, successful_files, successful_names)
 
+    if successful_files:
+        await reply(f"Semua file berhasil diubah ke format {extension}.")
+
+    if failed_files:
+        error_messages = "\n".join([f"File {name}: {error}" for name, error in failed_files])
+        await reply(f"Terjadi kesalahan pada file berikut:\n{error_messages}")
 
 async def convert_files_to_xlsx(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     try:
-        file_paths = context.user_data.get('file_paths', [])
-        if not file_paths:
+        files = context.user_data.get('files', [])
+        if not files:
             await update.message.reply_text("Tidak ada file yang ditemukan untuk dikonversi.")
             return
 
-        successful_files = []
-        failed_files = []
+        await submit_job(update, context, 'excel', files)
 
-        for file_path in file_paths:
-            file_name = file_path.name
-            try:
-                new_file_path = await convert_to_xlsx(file_path, file_name)
-                successful_files.append(new_file_path)
-            except ValueError as e:
-                failed_files.append((file_name, str(e)))
-
-        for file_path in successful_files:
-            await context.bot.send_document(chat_id=update.effective_chat.id, document=open(file_path, 'rb'))
-
-        if successful_files:
-            await update.message.reply_text("Semua file berhasil diubah ke format .xlsx.")
-
-        if failed_files:
-            error_messages = "\n".join([f"File {name}: {error}" for name, error in failed_files])
-            await update.message.reply_text(f"Terjadi kesalahan pada file berikut:\n{error_messages}")
-
-        context.user_data['file_paths'] = []
+        context.user_data['files'] = []
         context.user_data['waiting_for'] = None
 
     except Exception as e:
+        metrics.record_error(e)
         logger.error(f"Error converting files to XLSX: {e}")
         await update.message.reply_text(f"Terjadi kesalahan saat mengonversi file: {e}")
 
 async def convert_files_to_txt(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     try:
-        file_paths = context.user_data.get('file_paths', [])
-        if not file_paths:
+        files = context.user_data.get('files', [])
+        if not files:
             await update.message.reply_text("Tidak ada file yang ditemukan untuk dikonversi.")
             return
 
-        successful_files = []
-        failed_files = []
-        
-        for file_path in file_paths:
-            file_name = file_path.name
-            try:
-                new_file_path = await convert_to_txt(file_path, file_name)
-                successful_files.append(new_file_path)
-            except ValueError as e:
-                failed_files.append((file_name, str(e)))
-        
-        for file_path in successful_files:
-            await context.bot.send_document(chat_id=update.effective_chat.id, document=open(file_path, 'rb'))
-        
-        if successful_files:
-            await update.message.reply_text("Semua file berhasil diubah ke format .txt.")
-        
-        if failed_files:
-            error_messages = "\n".join([f"File {name}: {error}" for name, error in failed_files])
-            await update.message.reply_text(f"Terjadi kesalahan pada file berikut:\n{error_messages}")
-        
-        context.user_data['file_paths'] = []
+        await submit_job(update, context, 'text', files)
+
+        context.user_data['files'] = []
         context.user_data['waiting_for'] = None
 
     except Exception as e:
+        metrics.record_error(e)
         logger.error(f"Error converting files to TXT: {e}")
         await update.message.reply_text(f"Terjadi kesalahan saat mengonversi file: {e}")
 
+# Pecah satu file menjadi beberapa bagian berisi options['num_per_file'] kontak, opsional dalam arsip ZIP
+async def split_command(bot, chat_id: int, files: list, options: dict, workspace: Workspace, reply) -> None:
+    entry = files[0]
+    file_name = entry['name']
+    num_per_file = options['num_per_file']
+    as_zip = options.get('split_as_zip', False)
+    sheets = options.get('sheet_mode', SHEET_MODE)
+    operation = f"split{num_per_file}{'zip' if as_zip else ''}-{sheets}"
+
+    if workspace.in_memory(entry):
+        data = await download_document(bot, entry, workspace)
+        await check_rows(entry, data)
+        part_count, output_files = await split_document(data, file_name, num_per_file, None, as_zip, sheets)
+        result = {'files': output_files, 'part_count': part_count}
+    else:
+        await workspace.pin(result_entry(entry['unique_id'], operation))
+        result = get_cached_result(entry['unique_id'], operation)
+    if result is None:
+        file_path = await download_document(bot, entry, workspace)
+        await check_rows(entry, file_path)
+        part_count, output_files = await split_document(file_path, file_name, num_per_file, workspace.path, as_zip, sheets)
+        result = await store_result(entry['unique_id'], operation, output_files, stem=file_path.stem, part_count=part_count)
+
+    part_count = result['part_count']
+    await send_queue.send_documents(chat_id, result['files'], result_filenames(result, Path(file_name).stem))
+
+    if as_zip:
+        await reply(f"File '{file_name}' telah dipecah menjadi {part_count} bagian dalam {len(result['files'])} arsip ZIP.")
+    else:
+        await reply(f"File '{file_name}' telah dipecah menjadi {part_count} bagian.")
+
 async def split_file(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     try:
-        manage_cache()
         username = update.message.from_user.username
         if username not in allowed_usernames:
             await update.message.reply_text(f"{username} tidak diizinkan menggunakan bot ini. Hubungi @KazuhaID0 untuk meminta izin.")
             return
-        
-        num_per_file = context.user_data['num_per_file']
-        file_name = context.user_data['file_name']
-        file_path = context.user_data['file_path']
-        
-        part_number = 1
-
-        if file_name.endswith('.txt'):
-            with open(file_path, 'r') as f:
-                lines = f.readlines()
-            total_contacts = len(lines)
-            base_name = file_path.stem
-
-            for i in range(0, total_contacts, num_per_file):
-                part_lines = lines[i:i + num_per_file]
-                if not part_lines:
-                    break
-                part_file_name = cache_dir / f"{base_name} {part_number}.txt"
-                with open(part_file_name, 'w') as part_file:
-                    part_file.writelines(part_lines)
-
-                await context.bot.send_document(chat_id=update.effective_chat.id, document=open(part_file_name, 'rb'))
-                part_number += 1
-
-        elif file_name.endswith('.xlsx'):
-            df = pd.read_excel(file_path)
-            total_contacts = len(df)
-            base_name = file_path.stem
 
-            for i in range(0, total_contacts, num_per_file):
-                part_df = df.iloc[i:i + num_per_file]
-                if part_df.empty:
-                    break
-                part_file_name = cache_dir / f"{base_name} {part_number}.xlsx"
-                part_df.to_excel(part_file_name, index=False)
-
-                await context.bot.send_document(chat_id=update.effective_chat.id, document=open(part_file_name, 'rb'))
-                part_number += 1
-
-        await update.message.reply_text(f"File '{file_name}' telah dipecah menjadi {part_number - 1} bagian.")
+        await submit_job(update, context, 'pecah', [context.user_data['file']])
     except Exception as e:
+        metrics.record_error(e)
         logger.error(f"Error splitting file: {e}")
         await update.message.reply_text(f"Terjadi kesalahan: {e}")
     finally:
         context.user_data.clear()
 
+# Fungsi job untuk setiap perintah berat: (bot, chat_id, files, options, workspace, reply)
+JOB_COMMANDS = {
+    'excel': convert_command,
+    'text': convert_command,
+    'pecah': split_command,
+    'sisa': sisa_command,
+    'gabung': gabung_command,
+}
+
+# Nilai user_data yang dipakai fungsi job; di mode antrean disimpan bersama job
+JOB_OPTION_KEYS = ('waiting_for', 'xlsx_rollover', 'sheet_mode', 'num_per_file', 'split_as_zip', 'file_name')
+
+# Jalankan job langsung di proses bot lewat penjadwal, atau di mode antrean masukkan ke antrean worker.
+# Job di antrean hanya membawa file_id dan metadata file; worker yang mendownload file dan mengirim hasilnya.
+async def submit_job(update: Update, context: ContextTypes.DEFAULT_TYPE, command: str, files: list) -> None:
+    options = {key: context.user_data[key] for key in JOB_OPTION_KEYS if key in context.user_data}
+    if QUEUE_MODE == 'queue':
+        payload = {
+            'files': [{key: entry[key] for key in ('file_id', 'unique_id', 'name', 'size')} for entry in files],
+            'options': options,
+        }
+        position = await asyncio.to_thread(job_queue.enqueue, command, update.effective_chat.id, update.effective_user.id,
+                                           update.effective_user.username, payload)
+        metrics.events['job_enqueued'] += 1
+        await update.message.reply_text(f"{QUEUE_MESSAGE} di posisi {position}. Hasil akan dikirim setelah selesai diproses. "
+                                        "Ketik /batal untuk membatalkan.")
+        return
+
+    async with scheduler.job(update, command) as workspace:
+        await JOB_COMMANDS[command](context.bot, update.effective_chat.id, files, options, workspace, update.message.reply_text)
+
 async def jumlah(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     try:
-        manage_cache()
         username = update.message.from_user.username
         if username not in allowed_usernames:
             await update.message.reply_text(f"{username} tidak diizinkan menggunakan bot ini. Hubungi @KazuhaID0 untuk meminta izin.")
@@ -532,59 +3105,356 @@ async def jumlah(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         # Reset previous commands
         context.user_data.clear()
 
-        await update.message.reply_text("Silakan kirim file txt atau xlsx yang ingin Anda cek jumlahnya.")
+        await update.message.reply_text("Silakan kirim file txt, csv, xlsx atau vcf yang ingin Anda cek jumlahnya.")
         context.user_data['waiting_for'] = 'count'
         context.user_data['total_contacts'] = 0  # Untuk menyimpan jumlah total kontak dari semua file
-        context.user_data['file_paths'] = []  # Untuk menyimpan file yang sudah diterima
+        context.user_data['files'] = []  # Untuk menyimpan file yang sudah diterima
     except Exception as e:
         logger.error(f"Error in jumlah command: {e}")
         await update.message.reply_text(f"Terjadi kesalahan: {e}")
 
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    try:
+        username = update.message.from_user.username
+        if username not in admin_usernames:
+            await update.message.reply_text(f"{username} tidak diizinkan melihat statistik bot.")
+            return
+
+        await update.message.reply_text(metrics.render_stats())
+    except Exception as e:
+        logger.error(f"Error in stats command: {e}")
+        await update.message.reply_text(f"Terjadi kesalahan: {e}")
+
 async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     try:
         waiting_for = context.user_data.get('waiting_for')
 
         if waiting_for == 'split_confirm':
-            if not update.message.text.isdigit():
+            # Format input: "<jumlah>" atau "<jumlah> zip"
+            parts = update.message.text.lower().split()
+            if not (parts and parts[0].isdigit() and int(parts[0]) >= 1 and parts[1:] in ([], ['zip'])):
                 await update.message.reply_text("Input tidak valid. Mohon masukkan angka.")
                 return
 
-            context.user_data['num_per_file'] = int(update.message.text)
+            context.user_data['num_per_file'] = int(parts[0])
+            context.user_data['split_as_zip'] = parts[1:] == ['zip']
             await split_file(update, context)
 
         elif waiting_for == 'file_name':
-            file_name = update.message.text.strip()
+            file_name = output_stem(update.message.text)
             if file_name:
                 context.user_data['file_name'] = file_name
                 await convert_files_to_sisa(update, context)
             else:
                 await update.message.reply_text("Nama file tidak boleh kosong. Silakan masukkan nama file yang valid.")
 
+        elif waiting_for == 'gabung_file_name':
+            file_name = output_stem(update.message.text)
+            if file_name:
+                context.user_data['file_name'] = file_name
+                await merge_contact_files(update, context)
+            else:
+                await update.message.reply_text("Nama file tidak boleh kosong. Silakan masukkan nama file yang valid.")
+
         else:
             await update.message.reply_text("Silakan masukkan perintah terlebih dahulu sebelum mengirimkan input.")
     
     except Exception as e:
+        metrics.record_error(e)
         logger.error(f"Error handling text input: {e}")
         await update.message.reply_text(f"Terjadi kesalahan: {e}")
 
 
+# URL Bot API alternatif, misalnya server Bot API lokal atau server tiruan untuk uji beban (loadtest.py)
+BOT_API_BASE_URL = os.getenv('BOT_API_BASE_URL')
+BOT_API_FILE_URL = os.getenv('BOT_API_FILE_URL')
+
+# Mode menerima update: 'polling' (default) atau 'webhook'
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+# Jumlah update yang diproses bersamaan (update dari pengguna yang sama tetap diproses berurutan)
+CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', 128))
+
+# URL publik yang didaftarkan ke Telegram, alamat server webhook lokal dan secret token untuk memverifikasi request
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '127.0.0.1')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', 8080))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET') or secrets.token_urlsafe(32)
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', 40))
+
+# Update dari pengguna berbeda diproses paralel, tetapi update dari satu pengguna (file, /done, nama file)
+# diproses sesuai urutan kedatangan karena semuanya memakai user_data yang sama.
+# Update yang masih menunggu giliran penggunanya tidak memegang slot global, sehingga antrean panjang
+# satu pengguna tidak menahan update pengguna lain
+class UserOrderedUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates: int = CONCURRENT_UPDATES):
+        super().__init__(max_concurrent_updates)
+        self.slots = asyncio.Semaphore(max_concurrent_updates)  # slot global, diambil saat giliran update tiba
+        self.user_queues = {}  # user id -> deque coroutine update yang menunggu giliran
+        self.user_tasks = set()
+
+    @staticmethod
+    def update_key(update: object):
+        if not isinstance(update, Update):
+            return None
+        if update.effective_user is not None:
+            return update.effective_user.id
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+        return None
+
+    # /batal tidak ikut antre di belakang job pengguna yang sedang berjalan
+    @staticmethod
+    def bypasses_order(update: object) -> bool:
+        message = update.message if isinstance(update, Update) else None
+        return bool(message and message.text and message.text.split()[0].split('@')[0].lower() == '/batal')
+
+    # Hanya memasukkan update ke antrean penggunanya lalu langsung kembali, jadi slot semaphore PTB cepat dilepas
+    async def do_process_update(self, update: object, coroutine) -> None:
+        key = self.update_key(update)
+        if key is None or self.bypasses_order(update):
+            await coroutine
+            return
+
+        queue = self.user_queues.get(key)
+        if queue is not None:
+            queue.append(coroutine)
+            return
+        self.user_queues[key] = deque([coroutine])
+        task = asyncio.create_task(self.run_user_updates(key))
+        self.user_tasks.add(task)
+        task.add_done_callback(self.user_tasks.discard)
+
+    # Satu task per pengguna yang sedang aktif; update dijalankan satu per satu, masing-masing dengan slot global
+    async def run_user_updates(self, key) -> None:
+        queue = self.user_queues[key]
+        try:
+            while queue:
+                coroutine = queue.popleft()
+                try:
+                    async with self.slots:
+                        await coroutine
+                except Exception:
+                    logger.exception("Gagal memproses update pengguna %s", key)
+        finally:
+            del self.user_queues[key]
+            for coroutine in queue:
+                coroutine.close()
+
+    async def initialize(self) -> None:
+        pass
+
+    # Update yang sudah diterima tetap diselesaikan sebelum aplikasi berhenti
+    async def shutdown(self) -> None:
+        if self.user_tasks:
+            await asyncio.gather(*self.user_tasks, return_exceptions=True)
+
+def build_application() -> Application:
+    builder = Application.builder().token(API_TOKEN).post_init(post_init).post_shutdown(post_shutdown)
+    builder = builder.concurrent_updates(UserOrderedUpdateProcessor(CONCURRENT_UPDATES))
+    if BOT_API_BASE_URL:
+        builder = builder.base_url(BOT_API_BASE_URL)
+    if BOT_API_FILE_URL:
+        builder = builder.base_file_url(BOT_API_FILE_URL)
+
+    application = builder.build()
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("pecah", pecah))
+    application.add_handler(CommandHandler("jumlah", jumlah))
+    application.add_handler(CommandHandler("excel", excel))
+    application.add_handler(CommandHandler("text", text))
+    application.add_handler(CommandHandler("sisa", sisa))
+    application.add_handler(CommandHandler("gabung", gabung))
+    application.add_handler(CommandHandler("batal", batal))
+    application.add_handler(CommandHandler("done", done))
+    application.add_handler(CommandHandler("stats", stats))
+    application.add_handler(MessageHandler(filters.Document.ALL, handle_file))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
+    return application
+
+# Server webhook lokal (aiohttp): update dari Telegram langsung dimasukkan ke antrean update aplikasi
+async def start_webhook(application: Application):
+    from aiohttp import web
+
+    async def receive_update(request: web.Request) -> web.Response:
+        if request.headers.get('X-Telegram-Bot-Api-Secret-Token') != WEBHOOK_SECRET:
+            return web.Response(status=403)
+        try:
+            update = Update.de_json(await request.json(), application.bot)
+        except ValueError:
+            return web.Response(status=400)
+        await application.update_queue.put(update)
+        return web.Response()
+
+    web_app = web.Application()
+    web_app.router.add_post(WEBHOOK_PATH, receive_update)
+    runner = web.AppRunner(web_app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_LISTEN, WEBHOOK_PORT).start()
+
+    webhook_url = WEBHOOK_URL or f"http://{WEBHOOK_LISTEN}:{WEBHOOK_PORT}{WEBHOOK_PATH}"
+    await application.bot.set_webhook(webhook_url, secret_token=WEBHOOK_SECRET, allowed_updates=Update.ALL_TYPES,
+                                      max_connections=WEBHOOK_MAX_CONNECTIONS)
+    logger.info(f"Webhook aktif di {WEBHOOK_LISTEN}:{WEBHOOK_PORT}{WEBHOOK_PATH} untuk {webhook_url}")
+    return runner
+
+async def run_webhook(application: Application) -> None:
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop_event.set)
+
+    await application.initialize()
+    await post_init(application)
+    await application.start()
+    runner = await start_webhook(application)
+    try:
+        await stop_event.wait()
+    finally:
+        await runner.cleanup()
+        await application.stop()
+        await application.shutdown()
+        await post_shutdown(application)
+
+# Folder kerja worker terpisah dari milik proses bot (yang di-rename setiap kali bot mulai) dan diawali titik agar
+# tidak dianggap entri cache. Folder worker lain di host ini yang prosesnya sudah mati dihapus.
+def worker_workspaces() -> Path:
+    prefix = f".{JOB_TMP_DIR.name}.worker-{socket.gethostname()}-"
+    for path in JOB_TMP_DIR.parent.glob(f"{prefix}*"):
+        try:
+            os.kill(int(path.name[len(prefix):]), 0)
+        except ProcessLookupError:
+            shutil.rmtree(path, ignore_errors=True)
+        except (ValueError, PermissionError):
+            pass
+    path = JOB_TMP_DIR.with_name(f"{prefix}{os.getpid()}")
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+# Kerjakan satu job dari antrean. Selama berjalan lease diperpanjang secara berkala; jika gagal diperpanjang
+# (job dibatalkan lewat /batal atau sudah diambil alih worker lain) job dihentikan. Kesalahan pada file
+# (ValueError) tidak dicoba ulang, kesalahan lain dicoba ulang sampai JOB_MAX_ATTEMPTS kali.
+async def process_queued_job(bot, job: dict) -> None:
+    job_id = job['id']
+    command = job['command']
+    reply = functools.partial(bot.send_message, job['chat_id'])
+    if job['attempts'] > JOB_MAX_ATTEMPTS:
+        metrics.events['job_failed'] += 1
+        error = job['error'] or "worker berhenti saat memproses job"
+        await asyncio.to_thread(job_queue.finish, job_id, WORKER_NAME, 'failed', error)
+        await reply(f"Terjadi kesalahan saat memproses /{command}: {error}")
+        return
+
+    task = asyncio.current_task()
+    lease_lost = False
+
+    async def heartbeat():
+        nonlocal lease_lost
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            if not await asyncio.to_thread(job_queue.renew, job_id, WORKER_NAME):
+                lease_lost = True
+                task.cancel()
+                return
+
+    heartbeat_task = asyncio.create_task(heartbeat())
+    try:
+        # Payload hanya berisi data dokumen Telegram; lokasi hasil download diisi ulang oleh worker ini
+        files = [dict(entry, path=None, data=None) for entry in job['payload']['files']]
+        with metrics.job(command, job['username']), Workspace(command, job['user_id']) as workspace:
+            await JOB_COMMANDS[command](bot, job['chat_id'], files, job['payload']['options'], workspace, reply)
+        await asyncio.to_thread(job_queue.finish, job_id, WORKER_NAME, 'done')
+    except asyncio.CancelledError:
+        if lease_lost:
+            logger.info(f"Job {job_id} dihentikan: dibatalkan atau diambil alih worker lain")
+            return
+        # Worker dimatikan: job dikembalikan ke antrean untuk worker lain
+        await asyncio.to_thread(job_queue.release, job_id, WORKER_NAME)
+        raise
+    except ValueError as e:
+        metrics.record_error(e)
+        metrics.events['job_failed'] += 1
+        await asyncio.to_thread(job_queue.finish, job_id, WORKER_NAME, 'failed', str(e))
+        await reply(f"Terjadi kesalahan: {e}")
+    except Exception as e:
+        metrics.record_error(e)
+        logger.error(f"Error processing job {job_id} (/{command}, percobaan {job['attempts']}): {e}")
+        if job['attempts'] < JOB_MAX_ATTEMPTS:
+            metrics.events['job_retried'] += 1
+            await asyncio.to_thread(job_queue.retry, job_id, WORKER_NAME, JOB_RETRY_DELAY * job['attempts'], str(e))
+        else:
+            metrics.events['job_failed'] += 1
+            await asyncio.to_thread(job_queue.finish, job_id, WORKER_NAME, 'failed', str(e))
+            await reply(f"Terjadi kesalahan saat memproses /{command}: {e}")
+    finally:
+        heartbeat_task.cancel()
+
+# Proses worker: ambil job dari antrean dan kerjakan paling banyak WORKER_JOBS sekaligus. Saat dihentikan,
+# job yang masih berjalan dikembalikan ke antrean.
+async def run_worker() -> None:
+    global JOB_TMP_DIR, pins_task, warmup_task
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop_event.set)
+
+    JOB_TMP_DIR = await asyncio.to_thread(worker_workspaces)
+    bot = build_application().bot
+    await bot.initialize()
+    if FILE_ID_REGISTRY_SIZE:
+        await asyncio.to_thread(file_ids.load)
+    send_queue.start(bot)
+    # Eviksi cache hanya dijalankan proses bot; worker cukup menjaga pin entri yang sedang dipakainya
+    pins_task = asyncio.create_task(renew_cache_pins())
+    if WARMUP != 'off':
+        warmup_task = asyncio.create_task(warm_up())
+    logger.info(f"Worker {WORKER_NAME} mengambil job dari {JOB_QUEUE_PATH}")
+
+    running = set()
+    last_prune = 0.0
+    try:
+        while not stop_event.is_set():
+            job = None
+            # Job yang dibatalkan tetap memakai slot sampai job pool-nya selesai
+            if len(running) + len(draining_workspaces) < WORKER_JOBS:
+                job = await asyncio.to_thread(job_queue.claim, WORKER_NAME)
+            if job is not None:
+                task = asyncio.create_task(process_queued_job(bot, job))
+                running.add(task)
+                task.add_done_callback(running.discard)
+                continue
+
+            if time.time() - last_prune > 3600:
+                last_prune = time.time()
+                await asyncio.to_thread(job_queue.prune, JOB_RETENTION)
+            # Tunggu sampai ada job yang selesai, worker dihentikan, atau interval polling berikutnya
+            stop_wait = asyncio.create_task(stop_event.wait())
+            await asyncio.wait(running | draining_workspaces | {stop_wait}, timeout=WORKER_POLL_INTERVAL, return_when=asyncio.FIRST_COMPLETED)
+            stop_wait.cancel()
+    finally:
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+        await post_shutdown(None)
+        job_queue.close()
+        await bot.shutdown()
+        shutil.rmtree(JOB_TMP_DIR, ignore_errors=True)
+
 def main():
+    if sys.argv[1:] == ['worker']:
+        asyncio.run(run_worker())
+        return
+
     try:
-        application = Application.builder().token(API_TOKEN).build()
-        application.add_handler(CommandHandler("start", start))
-        application.add_handler(CommandHandler("pecah", pecah))
-        application.add_handler(CommandHandler("jumlah", jumlah))
-        application.add_handler(CommandHandler("excel", excel))
-        application.add_handler(CommandHandler("text", text))
-        application.add_handler(CommandHandler("sisa", sisa))
-        application.add_handler(CommandHandler("done", done))
-        application.add_handler(MessageHandler(filters.Document.ALL, handle_file))
-        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
+        application = build_application()
 
         logger.info("Bot sedang berjalan...")
-        application.run_polling()
+        if BOT_MODE == 'webhook':
+            asyncio.run(run_webhook(application))
+        else:
+            application.run_polling()
     except Exception as e:
         logger.error(f"Error starting bot: {e}")
 
 if __name__ == '__main__':
-    main()
+    main()
\ No newline at end of file
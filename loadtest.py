@@ -0,0 +1,429 @@
+# Uji beban offline: server tiruan Bot API Telegram di localhost dan pengguna simulasi yang menjalankan
+# perintah bot secara bersamaan dengan file sungguhan. Tidak butuh koneksi internet.
+#
+# Contoh:
+#   python loadtest.py --users 50 --rows 10000
+#   python loadtest.py --users 20 --commands excel,text --rounds 3
+#   python loadtest.py --users 10 --reuse-files        # upload file yang sama (menguji cache hasil)
+#   python loadtest.py --users 30 --webhook --burst     # update dikirim lewat webhook, semua langkah sekaligus
+#   python loadtest.py --users 20 --queue-workers 2     # job dikerjakan proses worker lewat antrean (QUEUE_MODE=queue)
+import os
+import sys
+import json
+import time
+import asyncio
+import socket
+import argparse
+import itertools
+import subprocess
+import threading
+from collections import defaultdict, Counter
+from pathlib import Path
+
+import aiohttp
+from aiohttp import web
+
+TOKEN = '123456:loadtest'
+# Awalan pesan posisi antrean dari penjadwal job bot (contoh.QUEUE_MESSAGE; contoh.py baru diimport setelah konfigurasi diatur)
+QUEUE_MESSAGE = "Permintaan Anda masuk antrean"
+BOT_USER = {'id': 123456, 'is_bot': True, 'first_name': 'Bot Pecah File', 'username': 'loadtest_bot',
+            'can_join_groups': False, 'can_read_all_group_messages': False, 'supports_inline_queries': False}
+
+# Dijawab sebagai error 400, seperti Bot API untuk parameter yang tidak valid (bot menerimanya sebagai BadRequest)
+class APIError(Exception):
+    pass
+
+# Server tiruan untuk method Bot API yang dipakai bot: getMe, getUpdates, getFile, download file,
+# sendDocument, sendMediaGroup dan sendMessage. Method lain dijawab dengan True.
+class StandInBotAPI:
+    def __init__(self, token: str = TOKEN):
+        self.token = token
+        self.updates = []
+        self.update_event = asyncio.Event()
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+        self.file_ids = itertools.count(1)
+        self.files = {}  # file_id -> (path, file_unique_id)
+        self.outputs = {}  # file_id -> (nama file, ukuran) untuk dokumen yang diupload bot
+        self.outbox = defaultdict(asyncio.Queue)  # chat_id -> pesan dan dokumen dari bot
+        self.calls = Counter()
+        self.uploaded_bytes = 0
+        self.queue_messages = 0  # pemberitahuan posisi antrean dari penjadwal job bot
+        self.webhook = None  # (url, secret token) jika bot memakai mode webhook
+        self.session = None
+
+    def web_app(self) -> web.Application:
+        app = web.Application(client_max_size=2 * 1024 ** 3)
+        app.router.add_route('*', f"/bot{self.token}/{{method}}", self.handle_method)
+        app.router.add_get(f"/file/bot{self.token}/{{file_path:.*}}", self.handle_download)
+        return app
+
+    async def read_params(self, request: web.Request) -> dict:
+        if request.content_type == 'application/json':
+            return await request.json()
+        params = {}
+        for name, value in (await request.post()).items():
+            if isinstance(value, str):
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    pass
+            params[name] = value
+        return params
+
+    async def handle_method(self, request: web.Request) -> web.Response:
+        method = request.match_info['method'].lower()
+        self.calls[method] += 1
+        params = await self.read_params(request)
+        handler = getattr(self, f"api_{method}", None)
+        try:
+            result = await handler(params) if handler else True
+        except APIError as e:
+            return web.json_response({'ok': False, 'error_code': 400, 'description': f"Bad Request: {e}"}, status=400)
+        return web.json_response({'ok': True, 'result': result})
+
+    async def handle_download(self, request: web.Request) -> web.StreamResponse:
+        file_id = request.match_info['file_path'].rsplit('/', 1)[-1]
+        path, _ = self.files[file_id]
+        return web.FileResponse(path)
+
+    async def api_getme(self, params: dict) -> dict:
+        return BOT_USER
+
+    async def api_setwebhook(self, params: dict) -> bool:
+        self.webhook = (params['url'], params.get('secret_token'))
+        return True
+
+    async def api_deletewebhook(self, params: dict) -> bool:
+        self.webhook = None
+        return True
+
+    async def api_getupdates(self, params: dict) -> list:
+        offset = int(params.get('offset') or 0)
+        self.updates = [update for update in self.updates if update['update_id'] >= offset]
+        if not self.updates:
+            self.update_event.clear()
+            try:
+                await asyncio.wait_for(self.update_event.wait(), float(params.get('timeout') or 0))
+            except asyncio.TimeoutError:
+                pass
+        return self.updates[:100]
+
+    async def api_getfile(self, params: dict) -> dict:
+        file_id = params['file_id']
+        path, file_unique_id = self.files[file_id]
+        return {'file_id': file_id, 'file_unique_id': file_unique_id, 'file_size': path.stat().st_size,
+                'file_path': f"documents/{file_id}"}
+
+    def bot_message(self, chat_id: int, **fields) -> dict:
+        return dict(message_id=next(self.message_ids), date=int(time.time()), chat={'id': chat_id, 'type': 'private'},
+                    **{'from': BOT_USER}, **fields)
+
+    async def api_sendmessage(self, params: dict) -> dict:
+        chat_id = int(params['chat_id'])
+        await self.outbox[chat_id].put(('message', params['text']))
+        return self.bot_message(chat_id, text=params['text'])
+
+    # Menyimpan satu dokumen kiriman bot (upload baru atau file_id) dan mengembalikan objek Document-nya
+    def store_document(self, document) -> dict:
+        if isinstance(document, str):
+            # Dokumen dikirim ulang dengan file_id, tanpa upload
+            if document in self.outputs:
+                file_name, size = self.outputs[document]
+                file_id = file_unique_id = document
+            elif document in self.files:
+                path, file_unique_id = self.files[document]
+                file_id, file_name, size = document, path.name, path.stat().st_size
+            else:
+                # Misalnya file_id yang dicatat bot pada uji sebelumnya (cache di --data-dir tetap ada)
+                raise APIError("wrong file identifier/HTTP URL specified")
+        else:
+            size = len(document.file.read())
+            self.uploaded_bytes += size
+            file_id, file_name = f"out{next(self.file_ids)}", document.filename
+            file_unique_id = file_id
+            self.outputs[file_id] = (file_name, size)
+        return {'file_id': file_id, 'file_unique_id': file_unique_id, 'file_name': file_name, 'file_size': size}
+
+    async def api_senddocument(self, params: dict) -> dict:
+        chat_id = int(params['chat_id'])
+        document = self.store_document(params['document'])
+        await self.outbox[chat_id].put(('document', document['file_name']))
+        return self.bot_message(chat_id, document=document)
+
+    # Album dokumen: file yang diupload dirujuk dengan attach://<nama field> di daftar media
+    async def api_sendmediagroup(self, params: dict) -> list:
+        chat_id = int(params['chat_id'])
+        documents = []
+        for item in params['media']:
+            media = item['media']
+            if media.startswith('attach://'):
+                media = params[media[len('attach://'):]]
+            documents.append(self.store_document(media))
+        messages = []
+        for document in documents:
+            await self.outbox[chat_id].put(('document', document['file_name']))
+            messages.append(self.bot_message(chat_id, document=document))
+        return messages
+
+    async def push_message(self, chat_id: int, username: str, text: str = None, document: dict = None) -> None:
+        message = {'message_id': next(self.message_ids), 'date': int(time.time()),
+                   'chat': {'id': chat_id, 'type': 'private'},
+                   'from': {'id': chat_id, 'is_bot': False, 'first_name': username, 'username': username}}
+        if text is not None:
+            message['text'] = text
+            if text.startswith('/'):
+                message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        if document is not None:
+            message['document'] = document
+        update = {'update_id': next(self.update_ids), 'message': message}
+        if self.webhook is not None:
+            # Seperti Telegram: update dikirim ke webhook bot, request berikutnya menunggu jawaban request ini
+            url, secret_token = self.webhook
+            if self.session is None:
+                self.session = aiohttp.ClientSession()
+            async with self.session.post(url, json=update, headers={'X-Telegram-Bot-Api-Secret-Token': secret_token or ''}) as response:
+                response.raise_for_status()
+        else:
+            self.updates.append(update)
+            self.update_event.set()
+
+    def register_file(self, path: Path, file_unique_id: str) -> dict:
+        file_id = f"in{next(self.file_ids)}"
+        self.files[file_id] = (path, file_unique_id)
+        return {'file_id': file_id, 'file_unique_id': file_unique_id, 'file_name': path.name,
+                'file_size': path.stat().st_size}
+
+    async def next_message(self, chat_id: int, timeout: float) -> tuple:
+        documents = 0
+        while True:
+            kind, value = await asyncio.wait_for(self.outbox[chat_id].get(), timeout)
+            if kind == 'message' and value.startswith(QUEUE_MESSAGE):
+                # Pesan tambahan saat job menunggu slot, bukan jawaban atas langkah alur
+                self.queue_messages += 1
+                continue
+            if kind == 'message':
+                return value, documents
+            documents += 1
+
+# Alur setiap perintah: daftar langkah (teks atau file) dan jenis file yang diupload.
+# Setiap langkah dijawab bot dengan tepat satu pesan teks; langkah terakhir adalah pekerjaan beratnya.
+FLOWS = {
+    'excel': ('csv', ['/excel', 'FILE', '/done']),
+    'text': ('xlsx', ['/text', 'FILE', '/done']),
+    'jumlah': ('txt', ['/jumlah', 'FILE', '/done']),
+    'sisa': ('csv', ['/sisa', 'FILE', '/done', 'hasil_{user}']),
+    'pecah': ('txt', ['/pecah', 'FILE', '{split_size} zip']),
+    'gabung': ('txt', ['/gabung', 'FILE', '/done', 'gabung_{user}']),
+}
+
+# Balasan yang berarti update diproses tidak sesuai urutan pengiriman
+ORDER_ERRORS = ('Silakan masukkan perintah terlebih dahulu', 'Tidak ada tindakan', 'Tidak ada file')
+
+async def run_user(api: StandInBotAPI, index: int, commands: list, files: dict, args, results: list) -> None:
+    chat_id = 100000 + index
+    username = f"user{index}"
+    for round_number in range(args.rounds):
+        for command in commands:
+            file_format, steps = FLOWS[command]
+            flow_started = time.perf_counter()
+            step_seconds = 0.0
+            replies = []
+            documents = 0
+            try:
+                # Mode burst: semua langkah dikirim tanpa menunggu balasan, urutan dijaga oleh bot
+                for step_number, step in enumerate(steps):
+                    started = time.perf_counter()
+                    if step == 'FILE':
+                        source = files[file_format]
+                        file_unique_id = source.name if args.reuse_files else f"{source.name}-{username}-{round_number}"
+                        await api.push_message(chat_id, username, document=api.register_file(source, file_unique_id))
+                    else:
+                        await api.push_message(chat_id, username, text=step.format(user=username, split_size=args.split_size))
+                    if args.burst and step_number < len(steps) - 1:
+                        continue
+                    while len(replies) <= step_number:
+                        reply, documents = await api.next_message(chat_id, args.timeout)
+                        replies.append(reply)
+                    step_seconds = time.perf_counter() - started
+                reply = replies[-1]
+                ok = not reply.startswith('Terjadi kesalahan') and not any(r.startswith(ORDER_ERRORS) for r in replies)
+            except asyncio.TimeoutError:
+                ok, reply = False, 'timeout'
+            results.append({'user': username, 'command': command, 'ok': ok, 'reply': reply[:80],
+                            'job_seconds': step_seconds, 'flow_seconds': time.perf_counter() - flow_started,
+                            'documents': documents})
+
+async def drive_users(api: StandInBotAPI, files: dict, args) -> list:
+    commands = [command for command in args.commands.split(',') if command]
+    results = []
+    await asyncio.gather(*(run_user(api, index, commands, files, args, results) for index in range(1, args.users + 1)))
+    return results
+
+# Ukur keterlambatan event loop bot: selisih antara waktu bangun yang diharapkan dan yang sebenarnya
+async def monitor_event_loop(samples: list, interval: float = 0.01) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - started - interval))
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values) + 0.5)) - 1))]
+
+def print_report(results: list, stalls: list, elapsed: float, api: StandInBotAPI, stall_threshold: float) -> dict:
+    report = {'elapsed_seconds': elapsed, 'commands': {}, 'api_calls': dict(api.calls), 'uploaded_bytes': api.uploaded_bytes,
+              'queue_messages': api.queue_messages}
+    print(f"\n{'perintah':<10}{'n':>5}{'gagal':>7}{'p50 s':>9}{'p95 s':>9}{'p99 s':>9}{'alur p95 s':>12}")
+    by_command = defaultdict(list)
+    for result in results:
+        by_command[result['command']].append(result)
+    for command, items in by_command.items():
+        jobs = [item['job_seconds'] for item in items if item['ok']]
+        flows = [item['flow_seconds'] for item in items if item['ok']]
+        failed = sum(1 for item in items if not item['ok'])
+        summary = {'count': len(items), 'failed': failed, 'p50': percentile(jobs, 0.50), 'p95': percentile(jobs, 0.95),
+                   'p99': percentile(jobs, 0.99), 'flow_p95': percentile(flows, 0.95)}
+        report['commands'][command] = summary
+        print(f"{command:<10}{len(items):>5}{failed:>7}{summary['p50']:>9.3f}{summary['p95']:>9.3f}"
+              f"{summary['p99']:>9.3f}{summary['flow_p95']:>12.3f}")
+        for item in items:
+            if not item['ok']:
+                print(f"  {item['user']}: {item['reply']}")
+
+    stalled = [lag for lag in stalls if lag >= stall_threshold]
+    report['event_loop'] = {'max_lag': max(stalls, default=0.0), 'p99_lag': percentile(stalls, 0.99),
+                            'stalls': len(stalled), 'stall_seconds': sum(stalled)}
+    print(f"\nEvent loop: lag maks {report['event_loop']['max_lag'] * 1000:.1f} ms, p99 {report['event_loop']['p99_lag'] * 1000:.1f} ms, "
+          f"{len(stalled)} stall >= {stall_threshold * 1000:.0f} ms (total {sum(stalled):.2f} s)")
+    print(f"Waktu total {elapsed:.1f} s, upload {api.uploaded_bytes / 1e6:.1f} MB, {api.queue_messages} pesan antrean, "
+          f"panggilan API {dict(api.calls)}")
+    return report
+
+# Server tiruan dan pengguna simulasi berjalan di thread sendiri, agar pengukuran lag hanya mencakup event loop bot
+class ServerThread(threading.Thread):
+    def __init__(self, host: str, port: int):
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port
+        self.ready = threading.Event()
+
+    def run(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.api = StandInBotAPI()
+        self.runner = web.AppRunner(self.api.web_app(), access_log=None)
+        self.loop.run_until_complete(self.runner.setup())
+        site = web.TCPSite(self.runner, self.host, self.port)
+        self.loop.run_until_complete(site.start())
+        self.port = site._server.sockets[0].getsockname()[1]
+        self.ready.set()
+        self.loop.run_forever()
+        self.loop.run_until_complete(self.runner.cleanup())
+        self.loop.close()
+
+    def stop(self) -> None:
+        if self.api.session is not None:
+            asyncio.run_coroutine_threadsafe(self.api.session.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.join()
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+async def run_load_test(args) -> dict:
+    server = ServerThread('127.0.0.1', args.port)
+    server.start()
+    server.ready.wait()
+
+    # Konfigurasi bot harus diatur sebelum contoh.py diimport
+    os.environ['BOT_API_TOKEN'] = TOKEN
+    os.environ['ALLOWED_USERNAMES'] = ','.join(f"user{index}" for index in range(1, args.users + 1))
+    os.environ['BOT_API_BASE_URL'] = f"http://127.0.0.1:{server.port}/bot"
+    os.environ['BOT_API_FILE_URL'] = f"http://127.0.0.1:{server.port}/file/bot"
+    if args.webhook:
+        os.environ['WEBHOOK_LISTEN'] = '127.0.0.1'
+        os.environ['WEBHOOK_PORT'] = str(free_port())
+        os.environ.pop('WEBHOOK_URL', None)
+    if args.queue_workers:
+        os.environ['QUEUE_MODE'] = 'queue'
+    import contoh
+    import benchmark
+
+    formats = sorted({FLOWS[command][0] for command in args.commands.split(',') if command})
+    files = benchmark.generate_files(Path(args.data_dir), args.rows, formats)
+
+    application = contoh.build_application()
+    stalls = []
+    await application.initialize()
+    await contoh.post_init(application)
+    await application.start()
+    if args.webhook:
+        webhook_runner = await contoh.start_webhook(application)
+    else:
+        await application.updater.start_polling(poll_interval=0.0, timeout=5)
+    # Proses worker mewarisi konfigurasi di atas dan memakai folder cache (beserta antrean job) yang sama
+    workers = [subprocess.Popen([sys.executable, str(Path(contoh.__file__).resolve()), 'worker'])
+               for _ in range(args.queue_workers)]
+    monitor = asyncio.create_task(monitor_event_loop(stalls))
+    try:
+        started = time.perf_counter()
+        results = await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(drive_users(server.api, files, args), server.loop))
+        elapsed = time.perf_counter() - started
+    finally:
+        monitor.cancel()
+        if args.webhook:
+            await webhook_runner.cleanup()
+        else:
+            await application.updater.stop()
+        await application.stop()
+        await application.shutdown()
+        await contoh.post_shutdown(application)
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            await asyncio.to_thread(worker.wait)
+        server.stop()
+
+    report = print_report(results, stalls, elapsed, server.api, args.stall_threshold)
+    # Rincian waktu per tahap dari sisi bot (download, antrean pool, konversi, upload)
+    print(f"\n{contoh.metrics.render_stats()}")
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Uji beban bot dengan server Bot API tiruan di localhost")
+    parser.add_argument('--users', type=int, default=10, help="jumlah pengguna yang berjalan bersamaan")
+    parser.add_argument('--rounds', type=int, default=1, help="berapa kali setiap pengguna menjalankan semua perintah")
+    parser.add_argument('--commands', default=','.join(FLOWS), help="perintah yang dijalankan: excel,text,jumlah,sisa,pecah,gabung")
+    parser.add_argument('--rows', type=int, default=10000, help="jumlah kontak per file uji")
+    parser.add_argument('--split-size', type=int, default=100, help="jumlah kontak per bagian untuk /pecah")
+    parser.add_argument('--webhook', action='store_true', help="kirim update lewat webhook bot, bukan getUpdates")
+    parser.add_argument('--burst', action='store_true', help="kirim semua langkah perintah tanpa menunggu balasan bot")
+    parser.add_argument('--reuse-files', action='store_true', help="semua pengguna mengupload file yang sama (file_unique_id sama)")
+    parser.add_argument('--timeout', type=float, default=600, help="batas waktu menunggu balasan bot per langkah (detik)")
+    parser.add_argument('--stall-threshold', type=float, default=0.05, help="lag event loop yang dihitung sebagai stall (detik)")
+    parser.add_argument('--queue-workers', type=int, default=0, help="jalankan job di N proses worker lewat antrean job (0 = di proses bot)")
+    parser.add_argument('--port', type=int, default=0, help="port server tiruan (0 = pilih otomatis)")
+    parser.add_argument('--data-dir', default='bench_data', help="folder file uji dan cache bot")
+    parser.add_argument('--json', help="simpan laporan ke file JSON")
+    args = parser.parse_args()
+
+    data_dir = Path(args.data_dir).resolve()
+    data_dir.mkdir(parents=True, exist_ok=True)
+    json_path = Path(args.json).resolve() if args.json else None
+    args.data_dir = str(data_dir)
+    # Folder cache milik contoh.py dibuat relatif terhadap direktori kerja
+    os.chdir(data_dir)
+
+    report = asyncio.run(run_load_test(args))
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# contoh.py membaca token dan membuat folder cache/ di direktori kerja saat diimpor,
+# jadi tes dijalankan di folder sementara agar cache milik bot tidak tersentuh
+os.environ.setdefault('BOT_API_TOKEN', 'test-token')
+os.environ.setdefault('QUEUE_MODE', 'local')
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.chdir(tempfile.mkdtemp(prefix='contoh-tests-'))
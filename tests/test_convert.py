@@ -0,0 +1,78 @@
+import io
+
+import openpyxl
+import pandas as pd
+import pytest
+
+import contoh
+
+
+def workbook_rows(data: bytes) -> list:
+    wb = openpyxl.load_workbook(io.BytesIO(data))
+    return [[[cell.value for cell in row] for row in ws.iter_rows()] for ws in wb.worksheets]
+
+
+def write_rows(rollover: str) -> list:
+    writer = contoh.XlsxChunkWriter(contoh.MemoryFiles(), 'hasil.xlsx', rollover, max_rows=3)
+    writer.write(pd.DataFrame({'NOMOR': ['1', '2', '3']}))
+    writer.write(pd.DataFrame({'NOMOR': ['4', '5']}))
+    return writer.close()
+
+
+def test_xlsx_rollover_sheet_baru_dengan_header():
+    files = write_rows('sheet')
+    assert [file.name for file in files] == ['hasil.xlsx']
+    assert workbook_rows(files[0].data) == [
+        [['NOMOR'], ['1'], ['2']],
+        [['NOMOR'], ['3'], ['4']],
+        [['NOMOR'], ['5']],
+    ]
+
+
+def test_xlsx_rollover_file_baru_dengan_header():
+    files = write_rows('file')
+    assert [file.name for file in files] == ['hasil.xlsx', 'hasil 2.xlsx', 'hasil 3.xlsx']
+    assert [workbook_rows(file.data) for file in files] == [
+        [[['NOMOR'], ['1'], ['2']]],
+        [[['NOMOR'], ['3'], ['4']]],
+        [[['NOMOR'], ['5']]],
+    ]
+
+
+@pytest.fixture
+def multi_sheet_workbook() -> bytes:
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = 'Jakarta'
+    ws.append(['NAMA', 'NOMOR'])
+    ws.append(['Andi', '0812'])
+    ws.append(['Budi', '0813'])
+    ws = wb.create_sheet('Bandung')
+    ws.append(['NOMOR', 'KOTA'])
+    ws.append(['0814', 'BDG'])
+    wb.create_sheet('Kosong')
+    data = io.BytesIO()
+    wb.save(data)
+    return data.getvalue()
+
+
+def test_sheet_mode_gabung_menyatukan_kolom(multi_sheet_workbook):
+    files = contoh.convert_job(multi_sheet_workbook, 'kontak.xlsx', '.txt', None, sheets='gabung')
+    assert [(file.name, file.data) for file in files] == [
+        ('kontak.txt', b'NAMA\tNOMOR\tKOTA\nAndi\t0812\t\nBudi\t0813\t\n\t0814\tBDG\n'),
+    ]
+
+
+def test_sheet_mode_pisah_satu_file_per_sheet(multi_sheet_workbook):
+    files = contoh.convert_job(multi_sheet_workbook, 'kontak.xlsx', '.txt', None, sheets='pisah')
+    # Sheet kosong tidak menghasilkan file
+    assert [(file.name, file.data) for file in files] == [
+        ('kontak - Jakarta.txt', b'NAMA\tNOMOR\nAndi\t0812\nBudi\t0813\n'),
+        ('kontak - Bandung.txt', b'NOMOR\tKOTA\n0814\tBDG\n'),
+    ]
+
+
+def test_sheet_mode_pisah_ke_xlsx(multi_sheet_workbook):
+    files = contoh.convert_job(multi_sheet_workbook, 'kontak.xlsx', '.xlsx', None, sheets='pisah')
+    assert [file.name for file in files] == ['kontak - Jakarta.xlsx', 'kontak - Bandung.xlsx']
+    assert workbook_rows(files[1].data) == [[['NOMOR', 'KOTA'], ['0814', 'BDG']]]
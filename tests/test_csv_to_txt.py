@@ -0,0 +1,43 @@
+import io
+
+import pytest
+
+import contoh
+
+# BOM, CRLF dan LF campur, baris kosong di awal, di tengah dan di akhir file
+CSV_DATA = b'\xef\xbb\xbf\r\n\r\nNAMA,NOMOR\r\n\r\nAndi,812\r\n\r\n\r\nBudi,813\n\nCici,814\r\n\r\n\r\n'
+EXPECTED = b'NAMA\tNOMOR\nAndi\t812\nBudi\t813\nCici\t814\n'
+
+
+class KeptBytesIO(io.BytesIO):
+    # TextIOWrapper menutup buffer tujuan, isinya disimpan dulu
+    def close(self):
+        self.kept = self.getvalue()
+        super().close()
+
+
+def via_bytes(data):
+    dst = io.BytesIO()
+    assert contoh.csv_to_txt_bytes(io.BytesIO(data), dst)
+    return dst.getvalue()
+
+
+def via_csv(data):
+    dst = KeptBytesIO()
+    contoh.csv_to_txt_stream(io.BytesIO(data), dst)
+    return dst.kept
+
+
+def via_pandas(data):
+    files = contoh.write_chunks(contoh.READERS['csv'](data), None, 'hasil.txt', 'sheet')
+    return b''.join(file.data for file in files)
+
+
+@pytest.mark.parametrize('block_size', [contoh.COPY_BLOCK_SIZE, 3, 4, 5])
+def test_ketiga_jalur_menghasilkan_output_sama(monkeypatch, block_size):
+    monkeypatch.setattr(contoh, 'COPY_BLOCK_SIZE', block_size)
+    assert via_bytes(CSV_DATA) == via_csv(CSV_DATA) == via_pandas(CSV_DATA) == EXPECTED
+
+
+def test_jalur_bytes_menolak_tanda_kutip():
+    assert not contoh.csv_to_txt_bytes(io.BytesIO(b'NAMA,NOMOR\n"A, B",812\n'), io.BytesIO())
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+import contoh
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    queue = contoh.JobQueue(tmp_path / 'jobs.sqlite3')
+    monkeypatch.setattr(contoh, 'job_queue', queue)
+    yield queue
+    queue.close()
+
+
+def enqueue(queue, command='excel'):
+    queue.enqueue(command, 10, 1, 'pengguna', {'files': [], 'options': {}})
+
+
+def job_row(queue, job_id):
+    with queue.transaction() as db:
+        return dict(db.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone())
+
+
+def test_job_dengan_lease_habis_diambil_worker_lain(queue, monkeypatch):
+    enqueue(queue)
+    monkeypatch.setattr(contoh, 'JOB_LEASE_SECONDS', -1)  # lease langsung habis
+    first = queue.claim('worker-a')
+    monkeypatch.setattr(contoh, 'JOB_LEASE_SECONDS', 60)
+    second = queue.claim('worker-b')
+
+    assert second['id'] == first['id']
+    assert second['attempts'] == 2
+    # Worker lama kehilangan job: lease tidak bisa diperpanjang dan hasilnya tidak dicatat
+    assert not queue.renew(first['id'], 'worker-a')
+    queue.finish(first['id'], 'worker-a', 'done')
+    assert job_row(queue, first['id'])['status'] == 'running'
+    assert queue.renew(second['id'], 'worker-b')
+
+
+def test_job_dengan_lease_aktif_tidak_diambil_dua_kali(queue):
+    enqueue(queue)
+    assert queue.claim('worker-a') is not None
+    assert queue.claim('worker-b') is None
+
+
+def test_retry_menunggu_jeda_lalu_menambah_percobaan(queue):
+    enqueue(queue)
+    job = queue.claim('worker-a')
+    queue.retry(job['id'], 'worker-a', 60, 'gagal sementara')
+    assert queue.claim('worker-b') is None
+    assert job_row(queue, job['id'])['error'] == 'gagal sementara'
+
+    queue.retry(job['id'], 'worker-a', 60, 'bukan pemilik')  # job sudah tidak dipegang worker-a
+    with queue.transaction() as db:
+        db.execute('UPDATE jobs SET available_at = 0')
+    job = queue.claim('worker-b')
+    assert job['attempts'] == 2
+
+
+def test_release_tidak_dihitung_sebagai_percobaan(queue):
+    enqueue(queue)
+    job = queue.claim('worker-a')
+    queue.release(job['id'], 'worker-a')
+    assert queue.claim('worker-b')['attempts'] == 1
+
+
+class StandInBot:
+    def __init__(self):
+        self.messages = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.messages.append(text)
+
+
+def test_job_gagal_dicoba_ulang_sampai_batas_percobaan(queue, monkeypatch):
+    async def failing_command(bot, chat_id, files, options, workspace, reply):
+        raise RuntimeError("koneksi terputus")
+
+    monkeypatch.setitem(contoh.JOB_COMMANDS, 'excel', failing_command)
+    monkeypatch.setattr(contoh, 'JOB_MAX_ATTEMPTS', 2)
+    monkeypatch.setattr(contoh, 'JOB_RETRY_DELAY', 0)
+    monkeypatch.setattr(contoh, 'WORKER_NAME', 'worker-test')
+    enqueue(queue)
+    bot = StandInBot()
+
+    job = queue.claim('worker-test')
+    asyncio.run(contoh.process_queued_job(bot, job))
+    row = job_row(queue, job['id'])
+    assert (row['status'], row['error']) == ('queued', 'koneksi terputus')
+    assert bot.messages == []
+
+    job = queue.claim('worker-test')
+    asyncio.run(contoh.process_queued_job(bot, job))
+    assert job_row(queue, job['id'])['status'] == 'failed'
+    assert len(bot.messages) == 1 and 'koneksi terputus' in bot.messages[0]
+
+
+def test_job_dibatalkan_tidak_diambil_lagi(queue):
+    enqueue(queue)
+    enqueue(queue)
+    job = queue.claim('worker-a')
+    assert queue.cancel(1) == 2
+    assert not queue.renew(job['id'], 'worker-a')
+    assert queue.claim('worker-b') is None
@@ -0,0 +1,82 @@
+import io
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import pytest
+
+import contoh
+
+
+@pytest.mark.parametrize('nomor_format, expected', [
+    ('+62', ['+6281234', '+6281234', '+6281234', '+6281234', '+6581234']),
+    ('62', ['6281234', '6281234', '6281234', '6281234', '6581234']),
+    ('0', ['081234', '081234', '081234', '081234', '+6581234']),
+])
+def test_normalize_numbers_menyamakan_bentuk_nomor(monkeypatch, nomor_format, expected):
+    monkeypatch.setattr(contoh, 'NOMOR_FORMAT', nomor_format)
+    numbers = pd.Series(['0812-34', ' 81234 ', '+62 812 34', '006281234', '+6581234'])
+    assert contoh.normalize_numbers(numbers).tolist() == expected
+
+
+def test_normalize_numbers_membuang_nilai_kosong(monkeypatch):
+    monkeypatch.setattr(contoh, 'NOMOR_FORMAT', '+62')
+    numbers = pd.Series(['0812', None, '', 'tanpa nomor', float('nan')], dtype=object)
+    assert contoh.normalize_numbers(numbers).tolist() == ['+62812']
+
+
+def test_normalize_numbers_format_asli(monkeypatch):
+    monkeypatch.setattr(contoh, 'NOMOR_FORMAT', 'asli')
+    assert contoh.normalize_numbers(pd.Series(['0812-34', '+62 (812) 34', '-'])).tolist() == ['081234', '+6281234']
+
+
+def test_number_index_hanya_menandai_kemunculan_pertama():
+    index = contoh.NumberIndex()
+    assert index.add(np.array([5, 3, 5, 7], dtype=np.uint64)).tolist() == [True, True, False, True]
+    assert index.add(np.array([7, 8, 3, 9, 8], dtype=np.uint64)).tolist() == [False, True, False, True, False]
+    assert len(index) == 5
+
+
+def test_number_index_sama_dengan_set_untuk_banyak_potongan():
+    rng = np.random.default_rng(1)
+    index = contoh.NumberIndex()
+    seen = set()
+    for _ in range(50):
+        hashes = rng.integers(0, 5000, size=200).astype(np.uint64)
+        expected = []
+        for value in hashes.tolist():
+            expected.append(value not in seen)
+            seen.add(value)
+        assert index.add(hashes).tolist() == expected
+    assert len(index) == len(seen)
+    # Level digabung seperti LSM tree, jadi jumlahnya jauh lebih kecil dari jumlah potongan
+    assert len(index.levels) < 10
+    assert all(np.all(level[:-1] < level[1:]) for level in index.levels)
+
+
+def test_gabung_nomor_dari_beberapa_sheet_dan_format(tmp_path):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(['NAMA', 'NOMOR'])
+    ws.append(['Andi', 81200000001])
+    ws.append(['Kosong', None])
+    ws = wb.create_sheet('Kedua')
+    ws.append(['NOMOR'])
+    ws.append(['0812-0000-0002'])
+    ws = wb.create_sheet('Tanpa nomor')
+    ws.append(['CATATAN'])
+    ws.append([12345])
+    workbook = io.BytesIO()
+    wb.save(workbook)
+
+    sources = [
+        (workbook.getvalue(), 'kontak.xlsx'),
+        (b'NAMA,NOMOR\nAndi,0812 0000 0001\nCici,0812-0000-0003\n', 'kontak.csv'),
+        (b'+6281200000003\n+6281200000004\n', 'hasil sisa.txt'),
+        (b'\x00\x01biner', 'rusak.bin'),
+    ]
+    stats, merged = contoh.merge_numbers_job(sources, None, 'gabung.txt')
+
+    assert merged.data.decode().split() == ['+6281200000001', '+6281200000002', '+6281200000003', '+6281200000004']
+    assert [(s['total'], s['unique']) for s in stats] == [(2, 2), (2, 1), (2, 1), (0, 0)]
+    assert 'error' in stats[3]
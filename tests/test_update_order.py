@@ -0,0 +1,86 @@
+import asyncio
+
+from telegram import Chat, Message, Update, User
+
+import contoh
+
+
+def make_update(update_id, user_id, text='x'):
+    user = User(id=user_id, first_name='u', is_bot=False)
+    chat = Chat(id=user_id, type='private')
+    message = Message(message_id=update_id, date=None, chat=chat, from_user=user, text=text)
+    return Update(update_id=update_id, message=message)
+
+
+async def process_all(processor, updates):
+    tasks = [asyncio.create_task(processor.process_update(update, coroutine)) for update, coroutine in updates]
+    await asyncio.gather(*tasks)
+    await processor.shutdown()
+
+
+def test_update_satu_pengguna_berurutan():
+    async def run():
+        processor = contoh.UserOrderedUpdateProcessor(4)
+        order = []
+
+        async def handle(name, delay):
+            await asyncio.sleep(delay)
+            order.append(name)
+
+        updates = [(make_update(i, 1), handle(i, 0.03 - i * 0.01)) for i in range(3)]
+        await process_all(processor, updates)
+        return order
+
+    assert asyncio.run(run()) == [0, 1, 2]
+
+
+def test_antrean_pengguna_a_tidak_menahan_pengguna_b():
+    async def run():
+        processor = contoh.UserOrderedUpdateProcessor(2)
+        release_a = asyncio.Event()
+        done_b = asyncio.Event()
+
+        async def slow_a():
+            await release_a.wait()
+
+        async def fast_b():
+            done_b.set()
+
+        # Antrean A lebih panjang dari jumlah slot global, update B datang paling akhir
+        updates = [(make_update(i, 1), slow_a()) for i in range(5)]
+        updates.append((make_update(10, 2), fast_b()))
+        tasks = [asyncio.create_task(processor.process_update(update, coroutine)) for update, coroutine in updates]
+        try:
+            await asyncio.wait_for(done_b.wait(), 1)
+        finally:
+            release_a.set()
+            await asyncio.gather(*tasks)
+            await processor.shutdown()
+        return done_b.is_set()
+
+    assert asyncio.run(run())
+
+
+def test_batal_tidak_menunggu_antrean():
+    async def run():
+        processor = contoh.UserOrderedUpdateProcessor(2)
+        release = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def job():
+            await release.wait()
+
+        async def batal():
+            cancelled.set()
+
+        updates = [(make_update(1, 1), job()), (make_update(2, 1, '/batal'), batal())]
+        tasks = [asyncio.create_task(processor.process_update(update, coroutine)) for update, coroutine in updates]
+        try:
+            await asyncio.wait_for(cancelled.wait(), 1)
+        finally:
+            release.set()
+            await asyncio.gather(*tasks)
+            await processor.shutdown()
+        return cancelled.is_set()
+
+    assert asyncio.run(run())